@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import vyper
+from eth_account import Account
+from eth_tester import EthereumTester, PyEVMBackend
+from vyper.compiler.settings import Settings
+from web3 import EthereumTesterProvider, Web3
+
+
+CONTRACTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "contracts")
+
+CONTRACTS = ("MedicalRecords", "AccessControl", "Multicall3")
+
+# Ether sent to the backend wallet so it can pay for its writes
+BACKEND_FUNDING_WEI = 10 ** 21
+
+
+# ===============================
+# IN-PROCESS EVM
+# ===============================
+#
+# py-evm behind eth-tester, with the ABI-compatible Vyper stand-ins in
+# contracts/ deployed at startup. Every transaction is mined at once.
+# The chain is served over plain HTTP JSON-RPC (single and batch calls),
+# so the app talks to it through its normal RPC pool.
+
+def compile_contract(name):
+
+    with open(os.path.join(CONTRACTS_DIR, f"{name}.vy")) as f:
+        source = f.read()
+
+    out = vyper.compile_code(
+        source,
+        output_formats=["abi", "bytecode"],
+        settings=Settings(evm_version="paris")
+    )
+
+    return out["abi"], out["bytecode"]
+
+
+class LocalChain:
+
+    def __init__(self, latency=0.0):
+
+        # Added to every JSON-RPC request, to model a remote node
+        self.latency = latency
+
+        self.w3 = Web3(EthereumTesterProvider(EthereumTester(PyEVMBackend())))
+        self.funder = self.w3.eth.accounts[0]
+        self.backend = Account.create()
+        self.addresses = {}
+
+        # py-evm is not thread-safe
+        self._lock = threading.Lock()
+        self._server = None
+
+        self.w3.eth.send_transaction({
+            "from": self.funder,
+            "to": self.backend.address,
+            "value": BACKEND_FUNDING_WEI
+        })
+
+        for name in CONTRACTS:
+            abi, bytecode = compile_contract(name)
+
+            tx = self.w3.eth.contract(abi=abi, bytecode=bytecode).constructor().transact({
+                "from": self.funder
+            })
+
+            self.addresses[name] = self.w3.eth.get_transaction_receipt(tx).contractAddress
+
+    def _call(self, request):
+
+        params = request.get("params", [])
+
+        # eth-tester needs a sender for calls and estimates
+        if request["method"] in ("eth_call", "eth_estimateGas") and "from" not in params[0]:
+            params[0]["from"] = self.funder
+
+        try:
+            with self._lock:
+                reply = dict(self.w3.manager._make_request(request["method"], params))
+        except Exception as e:
+            reply = {"error": {"code": -32000, "message": str(e)}}
+
+        reply["id"] = request.get("id")
+        reply["jsonrpc"] = "2.0"
+
+        return reply
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+        Start the JSON-RPC server in a thread; returns its URL
+        """
+
+        chain = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+
+                if chain.latency:
+                    time.sleep(chain.latency)
+
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+                if isinstance(body, list):
+                    reply = [chain._call(r) for r in body]
+                else:
+                    reply = chain._call(body)
+
+                data = Web3.to_json(reply).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def env(self, url):
+        """
+        Backend settings pointing at this chain
+        """
+
+        return {
+            "RPC_URL": url,
+            "RPC_URLS": url,
+            "BACKEND_PRIVATE_KEY": self.backend.key.hex(),
+            "BACKEND_WALLET": self.backend.address,
+            "MEDICAL_RECORDS_ADDRESS": self.addresses["MedicalRecords"],
+            "ACCESS_CONTROL_ADDRESS": self.addresses["AccessControl"],
+            "MULTICALL_ADDRESS": self.addresses["Multicall3"]
+        }
+
+    def stop(self):
+
+        if self._server:
+            self._server.shutdown()
@@ -0,0 +1,100 @@
+# pragma version ^0.4.0
+# Stand-in for AccessControl (ABI-compatible, for local benchmarks only)
+
+event AccessGranted:
+    patient: indexed(address)
+    doctor: indexed(address)
+    permanent: bool
+    expiryTime: uint256
+
+
+event AccessRevoked:
+    patient: indexed(address)
+    doctor: indexed(address)
+
+
+struct Grant:
+    permanent: bool
+    expiryTime: uint256
+
+
+grants: HashMap[address, HashMap[address, Grant]]
+usedHashes: public(HashMap[bytes32, bool])
+
+
+@internal
+def _grant(patient: address, doctor: address, permanent: bool, expiryTime: uint256):
+    self.grants[patient][doctor] = Grant(permanent=permanent, expiryTime=expiryTime)
+    log AccessGranted(patient=patient, doctor=doctor, permanent=permanent, expiryTime=expiryTime)
+
+
+@internal
+def _revoke(patient: address, doctor: address):
+    self.grants[patient][doctor] = empty(Grant)
+    log AccessRevoked(patient=patient, doctor=doctor)
+
+
+@internal
+def _consume(digest: bytes32, signer: address, signature: Bytes[65]):
+    assert not self.usedHashes[digest], "signature already used"
+    eth_digest: bytes32 = keccak256(concat(b"\x19Ethereum Signed Message:\n32", digest))
+    r: bytes32 = extract32(signature, 0)
+    s: bytes32 = extract32(signature, 32)
+    v: uint256 = convert(convert(slice(signature, 64, 1), bytes1), uint256)
+    assert ecrecover(eth_digest, v, r, s) == signer, "bad signature"
+    self.usedHashes[digest] = True
+
+
+@external
+def grantPermanentAccess(doctor: address):
+    self._grant(msg.sender, doctor, True, 0)
+
+
+@external
+def grantTemporaryAccess(doctor: address, durationSeconds: uint256):
+    self._grant(msg.sender, doctor, False, block.timestamp + durationSeconds)
+
+
+@external
+def revokeAccess(doctor: address):
+    self._revoke(msg.sender, doctor)
+
+
+@external
+def grantWithSignature(patient: address, doctor: address, permanent: bool, expiryTime: uint256, nonce: uint256, signature: Bytes[65]):
+    digest: bytes32 = keccak256(concat(
+        convert(patient, bytes20),
+        convert(doctor, bytes20),
+        convert(convert(permanent, uint8), bytes1),
+        convert(expiryTime, bytes32),
+        convert(nonce, bytes32),
+        convert(self, bytes20)
+    ))
+    self._consume(digest, patient, signature)
+    self._grant(patient, doctor, permanent, expiryTime)
+
+
+@external
+def revokeWithSignature(patient: address, doctor: address, nonce: uint256, signature: Bytes[65]):
+    digest: bytes32 = keccak256(concat(
+        convert(patient, bytes20),
+        convert(doctor, bytes20),
+        convert(nonce, bytes32),
+        convert(self, bytes20)
+    ))
+    self._consume(digest, patient, signature)
+    self._revoke(patient, doctor)
+
+
+@view
+@external
+def getAccessInfo(patient: address, doctor: address) -> (bool, uint256):
+    g: Grant = self.grants[patient][doctor]
+    return g.permanent, g.expiryTime
+
+
+@view
+@external
+def hasAccess(patient: address, doctor: address) -> bool:
+    g: Grant = self.grants[patient][doctor]
+    return g.permanent or g.expiryTime > block.timestamp
@@ -0,0 +1,51 @@
+# pragma version ^0.4.0
+# Stand-in for MedicalRecords (ABI-compatible, for local benchmarks only)
+
+struct Record:
+    cid: String[128]
+    recordType: String[64]
+    timestamp: uint256
+    addedBy: address
+
+
+event RecordAdded:
+    patient: indexed(address)
+    cid: String[128]
+    recordType: String[64]
+    timestamp: uint256
+    addedBy: indexed(address)
+
+
+MAX_RECORDS: constant(uint256) = 512
+
+records: HashMap[address, DynArray[Record, MAX_RECORDS]]
+
+
+@external
+def addRecord(_patient: address, _cid: String[128], _recordType: String[64]):
+    self.records[_patient].append(Record(
+        cid=_cid,
+        recordType=_recordType,
+        timestamp=block.timestamp,
+        addedBy=msg.sender
+    ))
+    log RecordAdded(patient=_patient, cid=_cid, recordType=_recordType, timestamp=block.timestamp, addedBy=msg.sender)
+
+
+@view
+@external
+def getAllRecords(_patient: address) -> DynArray[Record, MAX_RECORDS]:
+    return self.records[_patient]
+
+
+@view
+@external
+def getRecordCount(_patient: address) -> uint256:
+    return len(self.records[_patient])
+
+
+@view
+@external
+def getRecordByIndex(_patient: address, _index: uint256) -> (String[128], String[64], uint256, address):
+    r: Record = self.records[_patient][_index]
+    return r.cid, r.recordType, r.timestamp, r.addedBy
@@ -0,0 +1,37 @@
+# pragma version ^0.4.0
+# Stand-in for Multicall3.aggregate3 (for local benchmarks only)
+
+MAX_CALLS: constant(uint256) = 256
+MAX_DATA: constant(uint256) = 1024
+
+
+struct Call3:
+    target: address
+    allowFailure: bool
+    callData: Bytes[MAX_DATA]
+
+
+struct Result:
+    success: bool
+    returnData: Bytes[MAX_DATA]
+
+
+@payable
+@external
+def aggregate3(calls: DynArray[Call3, MAX_CALLS]) -> DynArray[Result, MAX_CALLS]:
+    results: DynArray[Result, MAX_CALLS] = []
+
+    for c: Call3 in calls:
+        success: bool = False
+        data: Bytes[MAX_DATA] = b""
+        success, data = raw_call(
+            c.target,
+            c.callData,
+            max_outsize=MAX_DATA,
+            revert_on_failure=False,
+            is_static_call=True
+        )
+        assert success or c.allowFailure, "call failed"
+        results.append(Result(success=success, returnData=data))
+
+    return results
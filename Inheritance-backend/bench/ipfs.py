@@ -0,0 +1,163 @@
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ===============================
+# PINATA / GATEWAY STAND-IN
+# ===============================
+#
+# POST /pinning/pinFileToIPFS keeps the file in memory and answers with
+# its CIDv1 (raw codec, sha2-256), so the backend's digest checks pass.
+# GET /ipfs/{cid} serves it back, with Range support. Both sleep for a
+# configurable time first to model the network.
+
+def cid_of(data):
+
+    multihash = b"\x12\x20" + hashlib.sha256(data).digest()
+
+    return "b" + base64.b32encode(b"\x01\x55" + multihash).decode().lower().rstrip("=")
+
+
+def _file_part(body, boundary):
+
+    for part in body.split(b"--" + boundary):
+        head, _, content = part.partition(b"\r\n\r\n")
+
+        if b'name="file"' in head:
+            return content[:-2]
+
+    return None
+
+
+class FakePinata:
+
+    def __init__(self, pin_latency=0.0, gateway_latency=0.0):
+
+        self.pin_latency = pin_latency
+        self.gateway_latency = gateway_latency
+
+        self.blobs = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+        Start the server in a thread; returns its base URL
+        """
+
+        pinata = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+
+                if self.headers.get("Transfer-Encoding") != "chunked":
+                    return self.rfile.read(int(self.headers["Content-Length"]))
+
+                chunks = []
+
+                while True:
+                    size = int(self.rfile.readline().strip(), 16)
+
+                    if size == 0:
+                        self.rfile.readline()
+                        return b"".join(chunks)
+
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+
+            def _reply(self, status, data=b"", headers=None):
+
+                self.send_response(status)
+
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+
+                body = self._body()
+
+                if pinata.pin_latency:
+                    time.sleep(pinata.pin_latency)
+
+                boundary = re.search(r"boundary=(\S+)", self.headers.get("Content-Type", ""))
+                data = _file_part(body, boundary.group(1).encode()) if boundary else None
+
+                if data is None:
+                    return self._reply(400, b'{"error": "file missing"}')
+
+                cid = cid_of(data)
+
+                with pinata._lock:
+                    pinata.blobs[cid] = data
+
+                self._reply(
+                    200,
+                    json.dumps({"IpfsHash": cid, "PinSize": len(data)}).encode(),
+                    {"Content-Type": "application/json"}
+                )
+
+            def do_GET(self):
+
+                if pinata.gateway_latency:
+                    time.sleep(pinata.gateway_latency)
+
+                cid = self.path.split("/ipfs/")[-1].split("?")[0]
+
+                with pinata._lock:
+                    data = pinata.blobs.get(cid)
+
+                if data is None:
+                    return self._reply(404)
+
+                match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+
+                if not match:
+                    return self._reply(200, data, {"Accept-Ranges": "bytes"})
+
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else len(data) - 1
+                part = data[start:end + 1]
+
+                self._reply(206, part, {
+                    "Accept-Ranges": "bytes",
+                    "Content-Range": f"bytes {start}-{start + len(part) - 1}/{len(data)}"
+                })
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def env(self, url):
+        """
+        Backend settings pointing at this stand-in
+        """
+
+        return {
+            "PINATA_API_URL": url,
+            "PINATA_API_KEY": "bench",
+            "PINATA_SECRET_KEY": "bench",
+            "IPFS_GATEWAYS": f"{url}/ipfs/"
+        }
+
+    def stop(self):
+
+        if self._server:
+            self._server.shutdown()
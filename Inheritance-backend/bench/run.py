@@ -0,0 +1,406 @@
+"""
+End-to-end load benchmark against a local chain and IPFS stand-in.
+
+    pip install -r bench/requirements.txt
+    python -m bench.run --requests 200 --concurrency 16
+
+Run from Inheritance-backend. Starts an in-process EVM with the contract
+stand-ins, a Pinata/gateway stand-in and the FastAPI app on uvicorn,
+then runs the upload, grant, list and view workloads one after the other
+and reports throughput and latency percentiles for each.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+from cryptography.fernet import Fernet
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from bench.chain import LocalChain
+from bench.ipfs import FakePinata
+
+
+WORKLOADS = ("upload", "grant", "list", "view")
+
+# First errors of each workload shown in the report
+MAX_ERRORS_SHOWN = 3
+
+
+# ===============================
+# ENVIRONMENT
+# ===============================
+
+def boot(args):
+    """
+    Start the stand-ins and point the backend settings at them. Must run
+    before the app is imported: config is read at import time.
+    """
+
+    chain = LocalChain(latency=args.rpc_latency)
+    rpc_url = chain.serve()
+
+    pinata = FakePinata(
+        pin_latency=args.pin_latency,
+        gateway_latency=args.gateway_latency
+    )
+    pinata_url = pinata.serve()
+
+    workdir = tempfile.mkdtemp(prefix="medblocks-bench-")
+
+    os.environ.update(chain.env(rpc_url))
+    os.environ.update(pinata.env(pinata_url))
+    os.environ.update({
+        "MASTER_KEY": Fernet.generate_key().decode(),
+        "DB_PATH": os.path.join(workdir, "medblocks.db"),
+        "BLOB_CACHE_DIR": os.path.join(workdir, "blobs")
+    })
+
+    print(f"⛓️  Local chain at {rpc_url}, Pinata stand-in at {pinata_url}")
+    print(f"📁 Working data in {workdir}")
+
+    return chain, pinata
+
+
+def serve_app(port):
+
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(
+        app,
+        host="127.0.0.1",
+        port=port,
+        log_level="warning"
+    ))
+
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn did not start")
+
+        time.sleep(0.05)
+
+    return server, thread
+
+
+# ===============================
+# MEASUREMENT
+# ===============================
+
+def percentile(sorted_values, p):
+
+    if not sorted_values:
+        return 0.0
+
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+
+    return sorted_values[rank]
+
+
+class Stats:
+
+    def __init__(self, name):
+
+        self.name = name
+        self.latencies = []
+        self.errors = []
+        self.elapsed = 0.0
+
+    def record(self, seconds, error=None):
+
+        self.latencies.append(seconds)
+
+        if error:
+            self.errors.append(error)
+
+    def summary(self):
+
+        values = sorted(self.latencies)
+        count = len(values)
+
+        return {
+            "workload": self.name,
+            "requests": count,
+            "errors": len(self.errors),
+            "seconds": round(self.elapsed, 3),
+            "rps": round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1) if values else 0.0
+        }
+
+
+async def run_workload(name, jobs, concurrency):
+    """
+    Run `jobs` (coroutine factories returning an error string or None)
+    with at most `concurrency` in flight
+    """
+
+    stats = Stats(name)
+    queue = iter(jobs)
+
+    async def worker():
+        for job in queue:
+            started = time.perf_counter()
+
+            try:
+                error = await job()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+            stats.record(time.perf_counter() - started, error)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stats.elapsed = time.perf_counter() - started
+
+    return stats
+
+
+def _error_of(res):
+
+    if res.status_code < 400:
+        return None
+
+    return f"{res.status_code} {res.text[:200]}"
+
+
+# ===============================
+# WORKLOADS
+# ===============================
+
+class Scenario:
+
+    def __init__(self, client, args, contract):
+
+        self.client = client
+        self.args = args
+        self.contract = contract
+        self.rng = random.Random(args.seed)
+
+        self.patients = [Account.create() for _ in range(args.patients)]
+        self.doctors = [Account.create().address for _ in range(args.doctors)]
+
+        # patient address -> uploaded CIDs
+        self.records = {p.address: [] for p in self.patients}
+
+        # (patient, doctor) pairs granted during the run
+        self.granted = set()
+        self.next_nonce = 0
+
+    def _requester(self, patient):
+
+        for doctor in self.doctors:
+            if (patient, doctor) in self.granted:
+                return doctor
+
+        return patient
+
+    def upload(self, i):
+
+        patient = self.patients[i % len(self.patients)].address
+        payload = self.rng.randbytes(self.args.size)
+
+        async def job():
+            res = await self.client.post(
+                "/records/upload",
+                files={"file": (f"bench-{i}.pdf", payload, "application/pdf")},
+                data={
+                    "patient_address": patient,
+                    "record_type": "bench",
+                    "dedupe": "false"
+                }
+            )
+
+            if res.status_code == 200:
+                self.records[patient].append(res.json()["cid"])
+
+            return _error_of(res)
+
+        return job
+
+    def grant(self, i):
+
+        from services.relayer import request_digest
+
+        patient = self.patients[i % len(self.patients)]
+        doctor = self.doctors[(i // len(self.patients)) % len(self.doctors)]
+
+        nonce = self.next_nonce
+        self.next_nonce += 1
+
+        digest = request_digest(
+            "grant", patient.address, doctor, True, 0, nonce, self.contract
+        )
+        signature = patient.sign_message(encode_defunct(primitive=digest)).signature
+
+        async def job():
+            res = await self.client.post("/access/gasless-grant", json={
+                "patient": patient.address,
+                "doctor": doctor,
+                "nonce": nonce,
+                "signature": signature.hex()
+            })
+
+            if res.status_code == 200:
+                self.granted.add((patient.address, doctor))
+
+            return _error_of(res)
+
+        return job
+
+    def list(self, i):
+
+        patient = self.patients[i % len(self.patients)].address
+
+        async def job():
+            res = await self.client.get(f"/records/{patient}", params={
+                "requester_address": self._requester(patient),
+                "limit": self.args.page_size
+            })
+
+            return _error_of(res)
+
+        return job
+
+    def view(self, i):
+
+        with_records = [p for p, cids in self.records.items() if cids]
+        patient = with_records[i % len(with_records)]
+        cid = self.rng.choice(self.records[patient])
+
+        async def job():
+            res = await self.client.get(f"/records/view/{cid}", params={
+                "patient_address": patient,
+                "requester_address": self._requester(patient)
+            })
+
+            if res.status_code == 200 and len(res.content) != self.args.size:
+                return f"view returned {len(res.content)} bytes"
+
+            return _error_of(res)
+
+        return job
+
+
+async def drive(args, base_url, contract):
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+
+        scenario = Scenario(client, args, contract)
+        results = []
+
+        # list/view without the upload workload still need something to read
+        if "upload" not in args.workloads and {"list", "view"} & set(args.workloads):
+            print(f"🌱 Seeding {args.patients} records")
+            await run_workload(
+                "seed",
+                [scenario.upload(i) for i in range(args.patients)],
+                args.concurrency
+            )
+
+        for name in WORKLOADS:
+            if name not in args.workloads:
+                continue
+
+            print(f"🚀 {name}: {args.requests} requests, concurrency {args.concurrency}")
+
+            make = getattr(scenario, name)
+            stats = await run_workload(
+                name,
+                [make(i) for i in range(args.requests)],
+                args.concurrency
+            )
+
+            results.append(stats)
+
+        return results
+
+
+# ===============================
+# REPORT
+# ===============================
+
+def report(results):
+
+    columns = ("workload", "requests", "errors", "seconds", "rps",
+               "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    rows = [s.summary() for s in results]
+
+    print()
+    print("".join(f"{c:>10}" for c in columns))
+
+    for row in rows:
+        print("".join(f"{row[c]:>10}" for c in columns))
+
+    for stats in results:
+        for error in stats.errors[:MAX_ERRORS_SHOWN]:
+            print(f"❌ {stats.name}: {error}")
+
+    return rows
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+
+    parser.add_argument("--requests", type=int, default=100, help="requests per workload")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        help="comma-separated subset of " + ",".join(WORKLOADS))
+    parser.add_argument("--size", type=int, default=64 * 1024, help="bytes per uploaded file")
+    parser.add_argument("--patients", type=int, default=10)
+    parser.add_argument("--doctors", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--pin-latency", type=float, default=0.0, help="seconds per pin")
+    parser.add_argument("--gateway-latency", type=float, default=0.0, help="seconds per gateway fetch")
+    parser.add_argument("--rpc-latency", type=float, default=0.0, help="seconds per RPC request")
+    parser.add_argument("--port", type=int, default=8765, help="port for the app under test")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+
+    args = parser.parse_args()
+    args.workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+
+    unknown = set(args.workloads) - set(WORKLOADS)
+
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    chain, pinata = boot(args)
+    server, thread = serve_app(args.port)
+
+    try:
+        results = asyncio.run(drive(
+            args,
+            f"http://127.0.0.1:{args.port}",
+            chain.addresses["AccessControl"]
+        ))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+        pinata.stop()
+        chain.stop()
+
+    rows = report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,12 +20,72 @@ NETWORK = os.getenv("NETWORK", "sepolia")
 
 RPC_URL = os.getenv("RPC_URL")
 
+# Several endpoints (comma separated) are pooled: reads go to the
+# fastest healthy one, writes stay on one. Defaults to RPC_URL alone.
+RPC_URLS = [
+    url.strip()
+    for url in os.getenv("RPC_URLS", RPC_URL or "").split(",")
+    if url.strip()
+]
+
+if RPC_URLS and not RPC_URL:
+    RPC_URL = RPC_URLS[0]
+
+# A slow eth_call is re-sent to a second endpoint once it takes longer
+# than this percentile of the first endpoint's recent latencies
+RPC_HEDGE_PERCENTILE = float(os.getenv("RPC_HEDGE_PERCENTILE", "95"))
+
+# Consecutive failures that take an endpoint out, and for how long
+RPC_BREAKER_FAILURES = int(os.getenv("RPC_BREAKER_FAILURES", "5"))
+RPC_BREAKER_COOLDOWN_SECONDS = float(os.getenv("RPC_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Async RPC client: per-call timeout and pooled connections per worker
+RPC_TIMEOUT_SECONDS = float(os.getenv("RPC_TIMEOUT_SECONDS", "10"))
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "100"))
+
 BACKEND_PRIVATE_KEY = os.getenv("BACKEND_PRIVATE_KEY")
 BACKEND_WALLET = os.getenv("BACKEND_WALLET")
 
 MEDICAL_RECORDS_ADDRESS = os.getenv("MEDICAL_RECORDS_ADDRESS")
 ACCESS_CONTROL_ADDRESS = os.getenv("ACCESS_CONTROL_ADDRESS")
 
+# Multicall3 is deployed at the same address on Sepolia and mainnet
+MULTICALL_ADDRESS = os.getenv(
+    "MULTICALL_ADDRESS",
+    "0xcA11bde05977b3631167028862bE2a173976CA11"
+)
+MULTICALL_CHUNK_SIZE = int(os.getenv("MULTICALL_CHUNK_SIZE", "200"))
+
+
+# -------------------------------
+# Fees / Gas
+# -------------------------------
+
+# eth_feeHistory window and the tip percentile sampled in each block
+FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", "20"))
+FEE_PRIORITY_PERCENTILE = float(os.getenv("FEE_PRIORITY_PERCENTILE", "50"))
+FEE_CACHE_SECONDS = float(os.getenv("FEE_CACHE_SECONDS", "12"))
+
+# Hard ceiling for maxFeePerGas, replacements included
+MAX_FEE_GWEI = float(os.getenv("MAX_FEE_GWEI", "200"))
+
+# estimate_gas result is multiplied by this
+GAS_MARGIN = float(os.getenv("GAS_MARGIN", "1.2"))
+
+# Pending longer than this: re-broadcast with bumped fees
+TX_STUCK_SECONDS = float(os.getenv("TX_STUCK_SECONDS", "120"))
+
+
+# -------------------------------
+# Relayer (gasless grant / revoke)
+# -------------------------------
+
+# Signed requests claimed and broadcast per relayer round
+RELAYER_BATCH_SIZE = int(os.getenv("RELAYER_BATCH_SIZE", "200"))
+
+# Idle relayer re-checks the queue this often (new requests wake it)
+RELAYER_POLL_SECONDS = float(os.getenv("RELAYER_POLL_SECONDS", "2"))
+
 
 # -------------------------------
 # Pinata
@@ -34,11 +94,115 @@ ACCESS_CONTROL_ADDRESS = os.getenv("ACCESS_CONTROL_ADDRESS")
 PINATA_API_KEY = os.getenv("PINATA_API_KEY")
 PINATA_SECRET_KEY = os.getenv("PINATA_SECRET_KEY")
 
+# Pinning API base URL (a local stand-in when benchmarking)
+PINATA_API_URL = os.getenv("PINATA_API_URL", "https://api.pinata.cloud").rstrip("/")
+
+# Concurrent uploads per worker (async uploader)
+PINATA_UPLOAD_CONCURRENCY = int(os.getenv("PINATA_UPLOAD_CONCURRENCY", "8"))
+
+
+# -------------------------------
+# Uploads
+# -------------------------------
+
+# Reuse the CID of an identical earlier upload for the same patient.
+# Off by default: a duplicate is answered without a transaction hash.
+UPLOAD_DEDUPE = os.getenv("UPLOAD_DEDUPE", "false").lower() == "true"
+
+# "direct": one addRecord transaction per record
+# "merkle": queue records and anchor one Merkle root per batch window
+ANCHOR_MODE = os.getenv("ANCHOR_MODE", "direct").lower()
+ANCHOR_BATCH_SECONDS = float(os.getenv("ANCHOR_BATCH_SECONDS", "60"))
+ANCHOR_MAX_BATCH = int(os.getenv("ANCHOR_MAX_BATCH", "1000"))
+
+
+# -------------------------------
+# IPFS Retrieval
+# -------------------------------
+
+# Gateways in order of preference, e.g. a local Kubo node first:
+# "http://127.0.0.1:8080/ipfs/,https://gateway.pinata.cloud/ipfs/"
+IPFS_GATEWAYS = [
+    url.strip().rstrip("/") + "/"
+    for url in os.getenv("IPFS_GATEWAYS", "https://gateway.pinata.cloud/ipfs/").split(",")
+    if url.strip()
+]
+
+# Start the next gateway if the current ones have not answered by then
+IPFS_HEDGE_DELAY_SECONDS = float(os.getenv("IPFS_HEDGE_DELAY_SECONDS", "0.3"))
+IPFS_TIMEOUT_SECONDS = float(os.getenv("IPFS_TIMEOUT_SECONDS", "20"))
+
+
+# -------------------------------
+# Encryption
+# -------------------------------
+
+MASTER_KEY = os.getenv("MASTER_KEY")
+
+# Master keys being rotated out, comma-separated. Data keys they wrapped
+# stay readable and are rewrapped with MASTER_KEY at start-up. Records
+# encrypted with a master key itself (no envelope) are tried with each,
+# so keep old keys here for as long as such records exist.
+MASTER_KEYS_PREVIOUS = [
+    key.strip()
+    for key in os.getenv("MASTER_KEYS_PREVIOUS", "").split(",")
+    if key.strip()
+]
+
+# Encrypt new uploads with a per-patient data key wrapped by MASTER_KEY
+# (false: MASTER_KEY encrypts records directly). Data keys are kept only
+# in the data_keys table of DB_PATH, so enable this only with backups of
+# that table, e.g. sqlite3 data/medblocks.db ".dump data_keys" > keys.sql
+ENVELOPE_ENCRYPTION = os.getenv("ENVELOPE_ENCRYPTION", "false").lower() == "true"
+
+# Unwrapped data keys kept in memory (least recently used dropped)
+DATA_KEY_CACHE_SIZE = int(os.getenv("DATA_KEY_CACHE_SIZE", "10000"))
+
+
+# -------------------------------
+# Local Storage
+# -------------------------------
+
+DB_PATH = os.getenv("DB_PATH", "data/medblocks.db")
+
+# Encrypted IPFS blobs kept on disk by CID (0 disables the cache)
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", "data/blobs")
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+
+# -------------------------------
+# Event Indexer
+# -------------------------------
+
+INDEXER_ENABLED = os.getenv("INDEXER_ENABLED", "true").lower() == "true"
+
+# Block the contracts were deployed at (no point scanning before it)
+INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", "0"))
+
+INDEXER_BATCH_BLOCKS = int(os.getenv("INDEXER_BATCH_BLOCKS", "2000"))
+INDEXER_POLL_SECONDS = float(os.getenv("INDEXER_POLL_SECONDS", "5"))
+
+# How far back a chain reorganisation is tracked and rolled back
+INDEXER_REORG_DEPTH = int(os.getenv("INDEXER_REORG_DEPTH", "64"))
+
+# check_access goes to the chain when the access projection lags more
+ACCESS_MAX_LAG_BLOCKS = int(os.getenv("ACCESS_MAX_LAG_BLOCKS", "5"))
+
+# Without the projection, hasAccess answers are cached: granted pairs
+# up to this long (temporary grants until they expire), refusals for
+# the shorter negative TTL. 0 disables the cache.
+ACCESS_CACHE_TTL_SECONDS = float(os.getenv("ACCESS_CACHE_TTL_SECONDS", "60"))
+ACCESS_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("ACCESS_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+ACCESS_CACHE_MAX_ENTRIES = int(os.getenv("ACCESS_CACHE_MAX_ENTRIES", "100000"))
+
 
 # -------------------------------
 # Validation
 # -------------------------------
 
+# Checked at start-up (and by the readiness probe), not at import, so
+# tools and workers can load this module without a complete .env
+
 def _require(name: str, value: str):
     if not value:
         raise RuntimeError(f"{name} is missing in .env file")
@@ -49,17 +213,52 @@ def _validate_eth_address(name: str, address: str):
         raise RuntimeError(f"{name} is not a valid Ethereum address")
 
 
-# Required values
-_require("RPC_URL", RPC_URL)
-_require("BACKEND_PRIVATE_KEY", BACKEND_PRIVATE_KEY)
-_require("BACKEND_WALLET", BACKEND_WALLET)
-_require("MEDICAL_RECORDS_ADDRESS", MEDICAL_RECORDS_ADDRESS)
-_require("ACCESS_CONTROL_ADDRESS", ACCESS_CONTROL_ADDRESS)
-_require("PINATA_API_KEY", PINATA_API_KEY)
-_require("PINATA_SECRET_KEY", PINATA_SECRET_KEY)
+def _validate_anchor_mode():
+    if ANCHOR_MODE not in ("direct", "merkle"):
+        raise RuntimeError("ANCHOR_MODE must be 'direct' or 'merkle'")
+
+
+def problems() -> list:
+    """
+    Every configuration error, empty when the configuration is usable
+    """
+
+    checks = [
+        # Required values
+        lambda: _require("RPC_URL", RPC_URL),
+        lambda: _require("BACKEND_PRIVATE_KEY", BACKEND_PRIVATE_KEY),
+        lambda: _require("BACKEND_WALLET", BACKEND_WALLET),
+        lambda: _require("MEDICAL_RECORDS_ADDRESS", MEDICAL_RECORDS_ADDRESS),
+        lambda: _require("ACCESS_CONTROL_ADDRESS", ACCESS_CONTROL_ADDRESS),
+        lambda: _require("PINATA_API_KEY", PINATA_API_KEY),
+        lambda: _require("PINATA_SECRET_KEY", PINATA_SECRET_KEY),
+
+        # Address format check
+        lambda: _validate_eth_address("BACKEND_WALLET", BACKEND_WALLET),
+        lambda: _validate_eth_address("MEDICAL_RECORDS_ADDRESS", MEDICAL_RECORDS_ADDRESS),
+        lambda: _validate_eth_address("ACCESS_CONTROL_ADDRESS", ACCESS_CONTROL_ADDRESS),
+        lambda: _validate_eth_address("MULTICALL_ADDRESS", MULTICALL_ADDRESS),
+
+        _validate_anchor_mode,
+    ]
+
+    found = []
+
+    for check in checks:
+        try:
+            check()
+        except RuntimeError as e:
+            found.append(str(e))
+
+    return found
+
+
+def validate():
+    """
+    Raise on the first configuration error
+    """
 
+    found = problems()
 
-# Address format check
-_validate_eth_address("BACKEND_WALLET", BACKEND_WALLET)
-_validate_eth_address("MEDICAL_RECORDS_ADDRESS", MEDICAL_RECORDS_ADDRESS)
-_validate_eth_address("ACCESS_CONTROL_ADDRESS", ACCESS_CONTROL_ADDRESS)
+    if found:
+        raise RuntimeError(found[0])
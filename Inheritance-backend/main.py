@@ -1,8 +1,25 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+import config
+from config import INDEXER_ENABLED, ANCHOR_MODE, MASTER_KEYS_PREVIOUS
 from routes.records import router as records_router
 from routes.access import router as access_router
+from routes.tx import router as tx_router
+from services import access_index, key_store, metrics
+from services.blockchain import (
+    client,
+    access_indexer,
+    record_indexer,
+    merkle_anchorer,
+    receipt_tracker,
+    relayer
+)
+from services.async_blockchain import close_session
+from services.async_pinata import close_client
 
 
 # -------------------------------
@@ -38,12 +55,93 @@ app.add_middleware(
 )
 
 
+# -------------------------------
+# Request Metrics
+# -------------------------------
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+
+    started = time.perf_counter()
+    status = 500
+
+    metrics.HTTP_IN_FLIGHT.inc()
+
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+
+        # Route template, not the path: addresses and CIDs stay out of labels
+        route = request.scope.get("route")
+
+        metrics.HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=str(status)
+        )
+
+
 # -------------------------------
 # API Routes
 # -------------------------------
 
 app.include_router(records_router)
 app.include_router(access_router)
+app.include_router(tx_router)
+
+
+# -------------------------------
+# Background Indexers
+# -------------------------------
+
+@app.on_event("startup")
+def start_indexers():
+
+    # Reported by /ready instead of stopping the worker from booting
+    for problem in config.problems():
+        print("❌ Config:", problem)
+
+    if INDEXER_ENABLED:
+        access_index.load_snapshot()
+        record_indexer.start()
+        access_indexer.start()
+
+    if ANCHOR_MODE == "merkle":
+        merkle_anchorer.start()
+
+    # Transactions still pending when the last worker stopped
+    receipt_tracker.resume()
+
+    # Signed gasless requests, including any queued before a restart
+    relayer.start()
+
+    # Master key rotation: only the small per-patient data keys change
+    if MASTER_KEYS_PREVIOUS:
+        rewrapped = key_store.rewrap_all()
+        print(f"🔑 Rewrapped {rewrapped} data keys with the current master key")
+
+        stale = key_store.stale_count()
+
+        if stale:
+            print(f"⚠️ {stale} data keys are wrapped by an unknown master key")
+
+
+@app.on_event("shutdown")
+async def stop_indexers():
+
+    record_indexer.stop()
+    access_indexer.stop()
+    merkle_anchorer.stop()
+    relayer.stop()
+
+    # Pooled async RPC and Pinata connections
+    await close_session()
+    await close_client()
 
 
 # -------------------------------
@@ -66,3 +164,41 @@ def health_check():
         "status": "ok",
         "service": "backend"
     }
+
+
+@app.get("/ready", tags=["System"])
+def readiness_check():
+    """
+    Readiness probe: configuration is complete and the RPC answers
+    """
+
+    problems = config.problems()
+    rpc_ok = client.ping()
+
+    body = {
+        "status": "ready" if rpc_ok and not problems else "unavailable",
+        "rpc": {"ok": rpc_ok, "error": client.last_error, **client.pool.stats()},
+        "config": problems,
+        "indexers": {
+            indexer.name: {
+                "enabled": INDEXER_ENABLED,
+                "lag": indexer.lag(),
+                "synced": indexer.is_ready()
+            }
+            for indexer in (record_indexer, access_indexer)
+        }
+    }
+
+    return JSONResponse(body, status_code=200 if body["status"] == "ready" else 503)
+
+
+@app.get("/metrics", tags=["System"], response_class=PlainTextResponse)
+def metrics_endpoint():
+    """
+    Prometheus scrape target
+    """
+
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4"
+    )
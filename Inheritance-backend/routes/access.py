@@ -1,40 +1,42 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import time
+
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from web3 import Web3
-import json
-import os
-import threading
 
-from services.blockchain import (
+from services import doctor_registry
+from services.async_blockchain import (
     grant_access,
     grant_temporary_access,
     revoke_access,
     check_access,
-    grant_with_signature,
-    revoke_with_signature
+    check_access_many,
+    get_access_info_many
 )
+from services.blockchain import relayer
 
 router = APIRouter(prefix="/access", tags=["Access Control"])
 
 
-# ===============================
-# FILE PATH (ABSOLUTE - FIX)
-# ===============================
+# Upper bound on pairs answered by one /access/matrix request
+MAX_MATRIX_PAIRS = 5000
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Upper bound on the page size of /access/doctors
+MAX_DOCTORS_PAGE = 500
 
-DOCTORS_FILE = os.path.join(
-    BASE_DIR,
-    "..",
-    "data",
-    "doctors.json"
-)
+# Upper bound on signed requests queued by one /access/relay call
+MAX_RELAY_REQUESTS = 1000
 
+# /gasless-* wait this long for their request to be broadcast
+RELAY_WAIT_SECONDS = 60
 
-# ===============================
-# FILE LOCK (THREAD SAFE)
-# ===============================
+# ... re-reading its row this often, in case another worker sent it
+RELAY_CHECK_SECONDS = 1
 
-file_lock = threading.Lock()
+
+doctor_registry.init_schema()
+doctor_registry.migrate_doctors_json()
 
 
 # ===============================
@@ -47,58 +49,44 @@ def validate_address(addr: str):
         raise HTTPException(400, "Invalid Ethereum address")
 
 
-def load_doctors():
-
-    # Ensure folder exists
-    os.makedirs(os.path.dirname(DOCTORS_FILE), exist_ok=True)
-
-    # Create file if missing
-    if not os.path.exists(DOCTORS_FILE):
-
-        with open(DOCTORS_FILE, "w") as f:
-            json.dump([], f)
-
-        return []
-
-    try:
-        with open(DOCTORS_FILE, "r") as f:
-            data = json.load(f)
-
-        if not isinstance(data, list):
-            return []
-
-        return data
-
-    except Exception as e:
-        print("Load doctors error:", e)
-        return []
-
-
-def save_doctors(doctors):
-
-    os.makedirs(os.path.dirname(DOCTORS_FILE), exist_ok=True)
-
-    with open(DOCTORS_FILE, "w") as f:
-        json.dump(doctors, f, indent=2)
-
-
 # ===============================
 # READ APIs
 # ===============================
 
 @router.get("/doctors")
-def get_doctors():
+async def get_doctors(
+    response: Response,
+    q: str | None = None,
+    offset: int = 0,
+    limit: int | None = None
+):
+    """
+    Registered doctors by id. `q` filters on name or wallet; the number
+    of matches is returned in X-Total-Count.
+    """
+
+    if offset < 0 or (limit is not None and not 1 <= limit <= MAX_DOCTORS_PAGE):
+        raise HTTPException(400, f"limit must be between 1 and {MAX_DOCTORS_PAGE}")
+
+    doctors, total = await run_in_threadpool(
+        doctor_registry.list_doctors,
+        q,
+        offset,
+        limit
+    )
+
+    response.headers["X-Total-Count"] = str(total)
 
-    return load_doctors()
+    return doctors
 
 
 @router.get("/check")
-def check_access_api(patient: str, doctor: str):
+async def check_access_api(patient: str, doctor: str):
 
     validate_address(patient)
     validate_address(doctor)
 
-    allowed = check_access(patient, doctor)
+    allowed = await check_access(patient, doctor)
 
     return {
         "patient": patient,
@@ -112,7 +100,7 @@ def check_access_api(patient: str, doctor: str):
 # ===============================
 
 @router.post("/add-doctor")
-def add_doctor(data: dict):
+async def add_doctor(data: dict):
 
     try:
 
@@ -124,26 +112,17 @@ def add_doctor(data: dict):
 
         validate_address(wallet)
 
-        with file_lock:
-
-            doctors = load_doctors()
-
-            # Check duplicate
-            for d in doctors:
-                if d["wallet"].lower() == wallet.lower():
-                    return {
-                        "status": "exists",
-                        "message": "Doctor already exists"
-                    }
-
-            # Add new doctor
-            doctors.append({
-                "id": len(doctors) + 1,
-                "name": name,
-                "wallet": wallet
-            })
+        _, added = await run_in_threadpool(
+            doctor_registry.add_doctor,
+            name,
+            wallet
+        )
 
-            save_doctors(doctors)
+        if not added:
+            return {
+                "status": "exists",
+                "message": "Doctor already exists"
+            }
 
         return {
             "status": "added",
@@ -159,7 +138,7 @@ def add_doctor(data: dict):
 # ===============================
 
 @router.post("/grant/permanent")
-def grant_permanent(data: dict):
+async def grant_permanent(data: dict):
 
     patient = data.get("patient")
     doctor = data.get("doctor")
@@ -167,13 +146,13 @@ def grant_permanent(data: dict):
     validate_address(patient)
     validate_address(doctor)
 
-    tx = grant_access(patient, doctor)
+    tx = await grant_access(patient, doctor)
 
     return {"tx_hash": tx}
 
 
 @router.post("/grant/temp")
-def grant_temp(data: dict):
+async def grant_temp(data: dict):
 
     patient = data.get("patient")
     doctor = data.get("doctor")
@@ -185,13 +164,13 @@ def grant_temp(data: dict):
     if not duration or duration <= 0:
         raise HTTPException(400, "Invalid duration")
 
-    tx = grant_temporary_access(patient, doctor, duration)
+    tx = await grant_temporary_access(patient, doctor, duration)
 
     return {"tx_hash": tx}
 
 
 @router.post("/revoke")
-def revoke(data: dict):
+async def revoke(data: dict):
 
     patient = data.get("patient")
     doctor = data.get("doctor")
@@ -199,7 +178,7 @@ def revoke(data: dict):
     validate_address(patient)
     validate_address(doctor)
 
-    tx = revoke_access(patient, doctor)
+    tx = await revoke_access(patient, doctor)
 
     return {"tx_hash": tx}
 
@@ -208,8 +187,62 @@ def revoke(data: dict):
 # GASLESS MODE (Meta TX)
 # ===============================
 
+async def _wait_sent(request_id):
+    """
+    Status view of a request once it has left the queue. Any worker
+    process may send it, and only this one's sends resolve the Future,
+    so the row is re-read while waiting.
+    """
+
+    deadline = time.monotonic() + RELAY_WAIT_SECONDS
+
+    while True:
+        # Resolved at once if the row is already out of the queue
+        future = await run_in_threadpool(relayer.waiter, request_id)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)),
+                RELAY_CHECK_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+
+        if time.monotonic() >= deadline:
+            relayer.forget_waiter(request_id)
+
+            raise HTTPException(
+                504,
+                f"Request {request_id} is still queued, see /access/relay/{request_id}"
+            )
+
+
+async def _relay_one(request):
+    """
+    Queue one signed request and wait until it has been broadcast
+    """
+
+    result = (await run_in_threadpool(relayer.submit, [request]))[0]
+
+    if result["status"] == "invalid":
+        raise HTTPException(400, result["error"])
+
+    if result["status"] == "duplicate":
+        raise HTTPException(409, result["error"])
+
+    view = await _wait_sent(result["id"])
+
+    if view["tx_hash"] is None:
+        raise HTTPException(
+            409 if view["status"] == "rejected" else 502,
+            view["error"]
+        )
+
+    return {"tx_hash": view["tx_hash"], "request_id": view["id"]}
+
+
 @router.post("/gasless-grant")
-def gasless_grant(data: dict):
+async def gasless_grant(data: dict):
 
     patient = data["patient"]
     doctor = data["doctor"]
@@ -217,20 +250,19 @@ def gasless_grant(data: dict):
     validate_address(patient)
     validate_address(doctor)
 
-    tx = grant_with_signature(
-        patient,
-        doctor,
-        True,
-        0,
-        data["nonce"],
-        bytes.fromhex(data["signature"][2:])
-    )
-
-    return {"tx_hash": tx}
+    return await _relay_one({
+        "action": "grant",
+        "patient": patient,
+        "doctor": doctor,
+        "permanent": True,
+        "expiry": 0,
+        "nonce": data["nonce"],
+        "signature": data["signature"]
+    })
 
 
 @router.post("/gasless-revoke")
-def gasless_revoke(data: dict):
+async def gasless_revoke(data: dict):
 
     patient = data["patient"]
     doctor = data["doctor"]
@@ -238,33 +270,135 @@ def gasless_revoke(data: dict):
     validate_address(patient)
     validate_address(doctor)
 
-    tx = revoke_with_signature(
-        patient,
-        doctor,
-        data["nonce"],
-        bytes.fromhex(data["signature"][2:])
-    )
+    return await _relay_one({
+        "action": "revoke",
+        "patient": patient,
+        "doctor": doctor,
+        "nonce": data["nonce"],
+        "signature": data["signature"]
+    })
+
+
+@router.post("/relay")
+async def relay(data: dict):
+    """
+    Queue many signed grant/revoke requests at once.
+
+    Body: {"requests": [{"action": "grant" | "revoke", "patient",
+    "doctor", "nonce", "signature", "permanent"?, "expiry"?}, ...]}.
+    Returns one result per request, in order; queued ones carry an id
+    to follow with GET /access/relay/{id}.
+    """
+
+    requests = data.get("requests")
+
+    if not isinstance(requests, list) or not requests:
+        raise HTTPException(400, "No requests given")
+
+    if len(requests) > MAX_RELAY_REQUESTS:
+        raise HTTPException(400, f"Too many requests (max {MAX_RELAY_REQUESTS})")
+
+    if not all(isinstance(r, dict) for r in requests):
+        raise HTTPException(400, "Each request must be an object")
+
+    results = await run_in_threadpool(relayer.submit, requests)
+
+    return {"results": results}
+
+
+@router.get("/relay/{request_id}")
+async def relay_status(request_id: int):
+
+    view = await run_in_threadpool(relayer.status, request_id)
+
+    if view is None:
+        raise HTTPException(404, "Unknown relay request")
+
+    return view
 
-    return {"tx_hash": tx}
 
 # ===============================
 # COUNT ACTIVE DOCTORS
 # ===============================
 
 @router.get("/count")
-def count_access(patient: str):
+async def count_access(patient: str):
 
     validate_address(patient)
 
-    doctors = load_doctors()
+    wallets = await run_in_threadpool(doctor_registry.wallets)
 
-    count = 0
-
-    for d in doctors:
-        if check_access(patient, d["wallet"]):
-            count += 1
+    # One batched read instead of a hasAccess call per doctor
+    allowed = await check_access_many([
+        (patient, wallet) for wallet in wallets
+    ])
 
     return {
-        "doctorCount": count
+        "doctorCount": sum(allowed)
     }
 
+
+# ===============================
+# ACCESS MATRIX (BATCHED)
+# ===============================
+
+@router.post("/matrix")
+async def access_matrix(data: dict):
+    """
+    Access for many patient/doctor pairs at once.
+
+    Body is either {"pairs": [[patient, doctor], ...]}
+    or {"patients": [...], "doctors": [...]} for the full cross product.
+    """
+
+    if "pairs" in data:
+        pairs = data["pairs"]
+
+        if not isinstance(pairs, list):
+            raise HTTPException(400, "pairs must be a list")
+
+        size = len(pairs)
+
+    else:
+        patients = data.get("patients", [])
+        doctors = data.get("doctors", [])
+
+        if not isinstance(patients, list) or not isinstance(doctors, list):
+            raise HTTPException(400, "patients and doctors must be lists")
+
+        size = len(patients) * len(doctors)
+
+    if not size:
+        raise HTTPException(400, "No patient/doctor pairs given")
+
+    # Before the cross product is built
+    if size > MAX_MATRIX_PAIRS:
+        raise HTTPException(400, f"Too many pairs (max {MAX_MATRIX_PAIRS})")
+
+    if "pairs" not in data:
+        pairs = [(p, d) for p in patients for d in doctors]
+
+    for pair in pairs:
+        if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+            raise HTTPException(400, "Each pair must be [patient, doctor]")
+
+        validate_address(pair[0])
+        validate_address(pair[1])
+
+    info = await get_access_info_many(pairs)
+    now = time.time()
+
+    # hasAccess is derived from (permanent, expiry) as the contract does,
+    # so each pair costs one getAccessInfo call
+    return {
+        "matrix": [
+            {
+                "patient": p,
+                "doctor": d,
+                "hasAccess": bool(permanent) or expiry > now,
+                "permanent": permanent,
+                "expiryTime": expiry
+            }
+            for (p, d), (permanent, expiry) in zip(pairs, info)
+        ]
+    }
@@ -1,20 +1,52 @@
 import os
-import io
+import re
+import json
 import uuid
-import requests
-import tempfile
 import mimetypes # Added to detect if file is PDF, JPG, or PNG
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from web3 import Web3
 
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import InvalidToken
 from dotenv import load_dotenv
-from cryptography.fernet import Fernet
 
-from services.pinata_service import upload_to_ipfs
-from services.blockchain import add_record, get_all_records, has_access
-from services.crypto import encrypt_file
+from config import UPLOAD_DEDUPE
+from services import (
+    blob_cache,
+    content_index,
+    ipfs_gateways,
+    key_store,
+    metrics,
+    upload_pipeline
+)
+from services.async_pinata import upload_stream_to_ipfs
+from services.async_blockchain import (
+    add_record,
+    get_all_records,
+    get_record,
+    get_records_page,
+    has_access
+)
+from services.crypto import (
+    MAX_HEADER_LEN,
+    DEFAULT_CHUNK_SIZE,
+    StreamDecryptor,
+    ciphertext_range,
+    content_hasher,
+    decrypt_bytes,
+    decrypt_stream,
+    encrypt_stream,
+    encrypted_size,
+    header_length,
+    is_chunked,
+    iter_file,
+    parse_header,
+    plaintext_size,
+    segment_count
+)
 
 
 # -----------------------------------
@@ -28,8 +60,6 @@ MASTER_KEY = os.getenv("MASTER_KEY")
 if not MASTER_KEY:
     raise Exception("MASTER_KEY not found in .env file")
 
-fernet = Fernet(MASTER_KEY.encode())
-
 
 # -----------------------------------
 # Router
@@ -37,13 +67,404 @@ fernet = Fernet(MASTER_KEY.encode())
 
 router = APIRouter(prefix="/records", tags=["Records"])
 
+NO_STORE = "no-store, no-cache, must-revalidate, max-age=0"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Upper bound on files accepted by one /records/upload/batch request
+MAX_BATCH_FILES = 5000
+
+blob_cache.init_schema()
+content_index.init_schema()
+key_store.init_schema()
+
 
 # -----------------------------------
-# Temp Directory (Cross-platform safe)
+# Helpers
 # -----------------------------------
 
-TEMP_DIR = os.path.join(tempfile.gettempdir(), "medblocks")
-os.makedirs(TEMP_DIR, exist_ok=True)
+async def _pin_encrypted(src, name, patient):
+    """
+    Encrypt a seekable file with the patient's key while streaming it
+    to IPFS (bounded memory)
+    """
+
+    src.seek(0, os.SEEK_END)
+    size = src.tell()
+
+    key, flags = await run_in_threadpool(key_store.encryption_key, patient)
+
+    def make_blocks():
+        src.seek(0)
+        read = metrics.TimedBlocks(iter_file(src), "read")
+
+        return metrics.TimedBlocks(
+            encrypt_stream(read, key, flags=flags),
+            "encrypt",
+            read
+        )
+
+    return await upload_stream_to_ipfs(make_blocks, encrypted_size(size), name)
+
+
+def _fingerprint(src):
+    """
+    Keyed hash of the plaintext, for per-patient duplicate detection
+    """
+
+    src.seek(0)
+    hasher = content_hasher(MASTER_KEY.encode())
+
+    with metrics.stage("fingerprint"):
+        for block in iter_file(src):
+            hasher.update(block)
+
+    return hasher.hexdigest()
+
+
+def _iter_range(res, byte_range):
+    """
+    Body blocks of a ranged GET, cutting the range out locally when the
+    gateway ignored the Range header and answered 200
+    """
+
+    blocks = res.iter_content(DEFAULT_CHUNK_SIZE)
+
+    if res.status_code == 206:
+        yield from blocks
+        return
+
+    start, end = byte_range
+    offset = 0
+
+    for block in blocks:
+        lo = max(start - offset, 0)
+        hi = min(end + 1 - offset, len(block))
+        offset += len(block)
+
+        if lo < hi:
+            yield block[lo:hi]
+
+        if offset > end:
+            break
+
+
+def _total_size(res):
+    """
+    Full object size from Content-Range (206) or Content-Length (200)
+    """
+
+    content_range = res.headers.get("Content-Range", "")
+
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+
+    length = res.headers.get("Content-Length")
+
+    return int(length) if length and length.isdigit() else None
+
+
+class _GatewaySource:
+    """
+    Ciphertext read from the IPFS gateways: whole reads follow the blob
+    cache's single download of the CID, range reads go to a gateway
+    directly and start that download in the background
+    """
+
+    def __init__(self, cid, verify=None):
+
+        self.cid = cid
+        self.verify = verify
+        self.url = None
+        self._open = []
+
+    def read(self, byte_range=None):
+        """
+        (ciphertext blocks, total ciphertext size or None)
+        """
+
+        if byte_range is None:
+            followed = blob_cache.follow(self.cid, self.verify)
+
+            if followed:
+                blocks, size, self.url = followed
+                self._open.append(blocks)
+
+                return metrics.TimedBlocks(blocks, "gateway_read"), size
+
+        self.url, res = ipfs_gateways.open_stream(self.cid, byte_range)
+        self._open.append(res)
+
+        if byte_range is None:
+            blocks = res.iter_content(DEFAULT_CHUNK_SIZE)
+        else:
+            blocks = _iter_range(res, byte_range)
+            blob_cache.prefetch(self.cid, self.verify)
+
+        return metrics.TimedBlocks(blocks, "gateway_read"), _total_size(res)
+
+    def corrupt(self):
+
+        blob_cache.reject(self.cid, self.url)
+
+    def close(self):
+
+        for item in self._open:
+            item.close()
+
+
+class _FileSource:
+    """
+    Ciphertext read from the local blob cache
+    """
+
+    def __init__(self, cid, f):
+
+        self.cid = cid
+        self.f = f
+        self.size = os.fstat(f.fileno()).st_size
+
+    def read(self, byte_range=None):
+
+        start, end = byte_range or (0, self.size - 1)
+
+        def blocks():
+            self.f.seek(start)
+            remaining = end - start + 1
+
+            while remaining > 0:
+                block = self.f.read(min(DEFAULT_CHUNK_SIZE, remaining))
+
+                if not block:
+                    break
+
+                remaining -= len(block)
+                yield block
+
+        return metrics.TimedBlocks(blocks(), "blob_read"), self.size
+
+    def corrupt(self):
+
+        blob_cache.reject(self.cid)
+
+    def close(self):
+
+        self.f.close()
+
+
+def _open_source(cid, verify=None):
+
+    f = blob_cache.open_blob(cid)
+
+    return _FileSource(cid, f) if f else _GatewaySource(cid, verify)
+
+
+# Raised by a record that does not decrypt (bad segment, cut-off tail)
+_DECRYPT_ERRORS = (InvalidTag, InvalidToken, ValueError)
+
+
+def _verifier(key_for):
+    """
+    `verify(path)` for the blob cache: True if a downloaded blob
+    decrypts to its end, i.e. is the record that was pinned
+    """
+
+    def verify(path):
+
+        with open(path, "rb") as f:
+            head = f.read(MAX_HEADER_LEN)
+            f.seek(0)
+
+            try:
+                if not is_chunked(head):
+                    decrypt_bytes(f.read(), key_store.master_keys())
+                    return True
+
+                for _ in decrypt_stream(iter_file(f), key_for(head)):
+                    pass
+
+            except _DECRYPT_ERRORS:
+                return False
+
+        return True
+
+    return verify
+
+
+def _parse_range(value, size):
+    """
+    Single `bytes=` range -> inclusive (start, end), None to serve the
+    whole body. Raises 416 when the range cannot be satisfied.
+    """
+
+    match = _RANGE_RE.match(value.strip())
+
+    # Multi-range and malformed headers are ignored (RFC 9110)
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+
+    if start > end or start >= size:
+        raise HTTPException(
+            416,
+            "Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    return start, end
+
+
+def _closing(blocks, source):
+    """
+    Stream `blocks`, then close the source. If the record stops
+    decrypting midway, its bytes are bad: they are dropped from the
+    cache and their gateway penalised, so the next view refetches.
+    """
+
+    try:
+        yield from blocks
+    except _DECRYPT_ERRORS:
+        source.corrupt()
+        raise
+    finally:
+        source.close()
+
+
+def _open_full(source, key_for):
+    """
+    Whole record: (plaintext blocks, plaintext size or None).
+    `key_for(header)` returns the key of a chunked-format record.
+    """
+
+    blocks, cipher_size = source.read()
+
+    # Look at the header before choosing a decoder
+    head = b""
+
+    for block in blocks:
+        head += block
+
+        if len(head) >= MAX_HEADER_LEN:
+            break
+
+    if not is_chunked(head):
+        # Legacy Fernet token: not seekable, decrypt in one go
+        body = head + b"".join(blocks)
+        source.close()
+
+        with metrics.stage("decrypt"):
+            plain = decrypt_bytes(body, key_store.master_keys())
+
+        return iter([plain]), len(plain)
+
+    key = key_for(head)
+    size = None
+
+    if cipher_size:
+        size = plaintext_size(cipher_size, parse_header(head), header_length(head))
+
+    def chained():
+        yield head
+        yield from blocks
+
+    plain = metrics.TimedBlocks(decrypt_stream(chained(), key), "decrypt", blocks)
+
+    return _closing(plain, source), size
+
+
+def _open_range(source, range_header, key_for):
+    """
+    Byte range of a record: (plaintext blocks, (start, end, size)), or
+    None when the whole record should be served instead
+    """
+
+    blocks, cipher_size = source.read((0, MAX_HEADER_LEN - 1))
+    head = b"".join(blocks)
+
+    if not cipher_size:
+        return None
+
+    if not is_chunked(head):
+        # Legacy Fernet token: decrypt all, slice in memory
+        blocks, _ = source.read()
+        body = b"".join(blocks)
+        source.close()
+
+        with metrics.stage("decrypt"):
+            plain = decrypt_bytes(body, key_store.master_keys())
+
+        byte_range = _parse_range(range_header, len(plain))
+
+        if byte_range is None:
+            return None
+
+        start, end = byte_range
+
+        return iter([plain[start:end + 1]]), (start, end, len(plain))
+
+    chunk_size = parse_header(head)
+    header_len = header_length(head)
+    head = head[:header_len]
+    size = plaintext_size(cipher_size, chunk_size, header_len)
+
+    byte_range = _parse_range(range_header, size)
+
+    if byte_range is None:
+        return None
+
+    start, end = byte_range
+    first, cipher_start, cipher_end = ciphertext_range(
+        start, end, chunk_size, cipher_size, header_len
+    )
+
+    cipher_blocks, _ = source.read((cipher_start, cipher_end))
+
+    decryptor = StreamDecryptor(
+        key_for(head),
+        header=head,
+        first_chunk=first,
+        total_chunks=segment_count(cipher_size, chunk_size, header_len)
+    )
+
+    def blocks():
+        skip = start - first * chunk_size
+        remaining = end - start + 1
+
+        # Trim the covering segments down to the requested bytes
+        def emit(plain):
+            nonlocal skip, remaining
+
+            cut = min(skip, len(plain))
+            skip -= cut
+
+            plain = plain[cut:cut + remaining]
+            remaining -= len(plain)
+
+            return plain
+
+        for block in cipher_blocks:
+            plain = emit(decryptor.update(block))
+
+            if plain:
+                yield plain
+
+        plain = emit(decryptor.finalize())
+
+        if plain:
+            yield plain
+
+    plain = metrics.TimedBlocks(blocks(), "decrypt", cipher_blocks)
+
+    return _closing(plain, source), (start, end, size)
 
 
 # -----------------------------------
@@ -54,7 +475,9 @@ os.makedirs(TEMP_DIR, exist_ok=True)
 async def upload_record(
     file: UploadFile = File(...),
     patient_address: str = Form(...),
-    record_type: str = Form(...)
+    record_type: str = Form(...),
+    dedupe: bool = Form(UPLOAD_DEDUPE),
+    record_duplicate: bool = Form(False)
 ):
 
     if not Web3.is_address(patient_address):
@@ -63,30 +486,43 @@ async def upload_record(
     uid = str(uuid.uuid4())
     original_filename = file.filename
 
-    temp_path = os.path.join(TEMP_DIR, uid)
-    enc_path = temp_path + ".enc"
-
     try:
-        # Save original file
-        content = await file.read()
-
-        with open(temp_path, "wb") as f:
-            f.write(content)
-
-        # Encrypt
-        encrypt_file(temp_path, enc_path, MASTER_KEY.encode())
-
-        # Upload encrypted file to IPFS
-        cid = upload_to_ipfs(enc_path)
+        digest = None
+        cid = None
+
+        # Same document already uploaded for this patient: reuse its CID
+        if dedupe:
+            digest = await run_in_threadpool(_fingerprint, file.file)
+            cid = await run_in_threadpool(
+                content_index.find_cid, patient_address, digest
+            )
+
+        if cid and not record_duplicate:
+            return {
+                "status": "duplicate",
+                "cid": cid,
+                "transaction_hash": None,
+                "filename": original_filename
+            }
+
+        if not cid:
+            # Encrypt and upload in one pass, straight from the spooled upload
+            cid = await _pin_encrypted(file.file, uid + ".enc", patient_address)
 
         # Store metadata on blockchain
-        tx_hash = add_record(
+        tx_hash = await add_record(
             patient_address,
             cid,
             record_type,
             original_filename
         )
 
+        # Saved once the record transaction is broadcast, not mined
+        if digest:
+            await run_in_threadpool(
+                content_index.save_cid, patient_address, digest, cid
+            )
+
         return {
             "status": "success",
             "cid": cid,
@@ -97,20 +533,121 @@ async def upload_record(
     except Exception as e:
         raise HTTPException(500, str(e))
 
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
-        if os.path.exists(enc_path):
-            os.remove(enc_path)
+# -----------------------------------
+# Bulk Upload (staged pipeline)
+# -----------------------------------
+
+def _per_file(values, count, name):
+    """
+    One form value for every file, or a single value shared by all
+    """
+
+    if len(values) == 1:
+        return values * count
+
+    if len(values) != count:
+        raise HTTPException(400, f"Give one {name} or one per file")
+
+    return values
+
+
+def _form_flag(form, name, default):
+
+    value = form.get(name)
+
+    if value is None:
+        return default
+
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+@router.post("/upload/batch")
+async def upload_records_batch(request: Request):
+    """
+    Multipart form: repeated `files`, `patient_address` and
+    `record_type` (one value for all files or one per file), optional
+    `dedupe` and `record_duplicate`.
+
+    Streams NDJSON progress: one line per file per stage
+    (encrypted, pinned, anchored, duplicate or failed) and a summary.
+    """
+
+    form = await request.form(
+        max_files=MAX_BATCH_FILES,
+        max_fields=MAX_BATCH_FILES * 2 + 10
+    )
+
+    try:
+        files = [f for f in form.getlist("files") if hasattr(f, "filename")]
+
+        if not files:
+            raise HTTPException(400, "No files given")
+
+        patients = _per_file(form.getlist("patient_address"), len(files), "patient_address")
+        record_types = _per_file(form.getlist("record_type"), len(files), "record_type")
+
+        for patient in set(patients):
+            if not Web3.is_address(patient):
+                raise HTTPException(400, f"Invalid patient address: {patient}")
+
+        jobs = [
+            {
+                "index": i,
+                "file": f.file,
+                "filename": f.filename,
+                "patient": patient,
+                "record_type": record_type
+            }
+            for i, (f, patient, record_type) in enumerate(zip(files, patients, record_types))
+        ]
+
+        events = upload_pipeline.run(
+            jobs,
+            MASTER_KEY.encode(),
+            dedupe=_form_flag(form, "dedupe", UPLOAD_DEDUPE),
+            record_duplicate=_form_flag(form, "record_duplicate", False)
+        )
+
+    except Exception:
+        await form.close()
+        raise
+
+    async def ndjson():
+        # The form (spooled uploads) must outlive the response body
+        try:
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        finally:
+            await events.aclose()
+            await form.close()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 
 # -----------------------------------
 # Fetch Records
 # -----------------------------------
 
+# Largest page of /records/{patient_address}
+MAX_PAGE_SIZE = 500
+
+
 @router.get("/{patient_address}")
-def fetch_records(patient_address: str, requester_address: str):
+async def fetch_records(
+    patient_address: str,
+    requester_address: str,
+    limit: int | None = None,
+    cursor: str | None = None,
+    order: str = "asc"
+):
+    """
+    A patient's records, by time. Without `limit`, all of them.
+
+    `order` is "asc" (oldest first) or "desc" (newest first). With
+    `limit`, pass the returned `next_cursor` as `cursor` for the next
+    page; it is null on the last one.
+    """
 
     if not Web3.is_address(patient_address):
         raise HTTPException(400, "Invalid patient address")
@@ -118,16 +655,42 @@ def fetch_records(patient_address: str, requester_address: str):
     if not Web3.is_address(requester_address):
         raise HTTPException(400, "Invalid requester address")
 
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    if cursor is not None and limit is None:
+        raise HTTPException(400, "cursor needs a limit")
+
+    if order not in ("asc", "desc"):
+        raise HTTPException(400, "order must be 'asc' or 'desc'")
+
     # ✅ Allow patient himself
     if patient_address.lower() != requester_address.lower():
-        if not has_access(patient_address, requester_address):
+        if not await has_access(patient_address, requester_address):
             raise HTTPException(403, "Access denied")
 
-    records = get_all_records(patient_address)
+    if limit is None:
+        records = await get_all_records(patient_address)
+
+        if order == "desc":
+            records.reverse()
+
+        page = {"records": records, "total": len(records), "next_cursor": None}
+
+    else:
+        try:
+            page = await get_records_page(
+                patient_address,
+                cursor=cursor,
+                limit=limit,
+                newest_first=order == "desc"
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
 
     return {
         "patient": patient_address,
-        "records": records
+        **page
     }
 
 
@@ -136,10 +699,11 @@ def fetch_records(patient_address: str, requester_address: str):
 # -----------------------------------
 
 @router.get("/view/{cid}")
-def view_record(
+async def view_record(
     cid: str,
     patient_address: str,
-    requester_address: str
+    requester_address: str,
+    request: Request
 ):
 
     if not Web3.is_address(patient_address):
@@ -150,42 +714,88 @@ def view_record(
 
     # ✅ Security check (Blockchain Verification)
     if patient_address.lower() != requester_address.lower():
-        if not has_access(patient_address, requester_address):
+        if not await has_access(patient_address, requester_address):
             raise HTTPException(403, "Access denied")
 
-    # 1. Download encrypted file from IPFS
-    url = f"https://gateway.pinata.cloud/ipfs/{cid}"
-    res = requests.get(url, timeout=20)
+    # 1. Dynamic MIME Type Detection
+    # Get the original filename from the record index to know the extension (.jpg, .pdf, etc.)
+    record = await get_record(patient_address, cid)
+    filename = (record and record.get("filename")) or "document.pdf" # Fallback
+    
+    # Guess the type (e.g., 'image/png' or 'application/pdf')
+    mime_type, _ = mimetypes.guess_type(filename)
+    if not mime_type:
+        mime_type = "application/octet-stream"
+
+    headers = {
+        "Content-Disposition": "inline",
+        "Cache-Control": NO_STORE,
+        "Accept-Ranges": "bytes"
+    }
 
-    if res.status_code != 200 or not res.content:
-        raise HTTPException(404, "File not found on IPFS")
+    # 2. Read the ciphertext (local blob cache, else the gateway) and
+    #    decrypt it segment by segment as it arrives, with the patient's
+    #    data key (or the current or a previous master key for records
+    #    without one)
+    def key_for(header):
+        return key_store.decryption_key(patient_address, header)
+
+    range_header = request.headers.get("range")
 
-    # 2. Decrypt into RAM
     try:
-        decrypted = fernet.decrypt(res.content)
+        source = await run_in_threadpool(_open_source, cid, _verifier(key_for))
+    except ValueError:
+        raise HTTPException(400, "Invalid CID")
+    except FileNotFoundError:
+        raise HTTPException(404, "File not found on IPFS")
     except Exception:
+        raise HTTPException(502, "Could not fetch file from IPFS")
+
+    try:
+        opened = None
+
+        if range_header:
+            opened = await run_in_threadpool(_open_range, source, range_header, key_for)
+
+        if opened:
+            blocks, (start, end, size) = opened
+
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+
+            return StreamingResponse(
+                blocks,
+                status_code=206,
+                media_type=mime_type,
+                headers=headers
+            )
+
+        blocks, size = await run_in_threadpool(_open_full, source, key_for)
+
+    except HTTPException:
+        source.close()
+        raise
+    except KeyError:
+        # No data key: the record is not this patient's
+        source.close()
+        raise HTTPException(404, "Record not found for this patient")
+    except FileNotFoundError:
+        source.close()
+        raise HTTPException(404, "File not found on IPFS")
+    except ipfs_gateways.ContentMismatchError:
+        source.close()
+        raise HTTPException(502, "IPFS gateways served corrupt content")
+    except Exception as e:
+        source.close()
+
+        # A corrupt copy must not keep failing: refetch next time
+        if isinstance(e, _DECRYPT_ERRORS) or isinstance(source, _FileSource):
+            await run_in_threadpool(source.corrupt)
+
         raise HTTPException(500, "Decryption failed")
 
-    # 3. Dynamic MIME Type Detection
-    # Get the original filename from blockchain to know the extension (.jpg, .pdf, etc.)
-    records_list = get_all_records(patient_address)
-    filename = "document.pdf" # Fallback
-    for r in records_list:
-        if r["cid"] == cid:
-            filename = r.get("filename") or "document.pdf"
-            break
-    
-    # Guess the type (e.g., 'image/png' or 'application/pdf')
-    mime_type, _ = mimetypes.guess_type(filename)
-    if not mime_type:
-        mime_type = "application/octet-stream"
+    if size is not None:
+        headers["Content-Length"] = str(size)
 
-    # 4. Stream response (RAM only, no temp file on disk)
-    return StreamingResponse(
-        io.BytesIO(decrypted),
-        media_type=mime_type,
-        headers={
-            "Content-Disposition": "inline",
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0"
-        }
-    )
\ No newline at end of file
+    # 3. Stream response (bounded memory, no temp file on disk)
+    return StreamingResponse(blocks, media_type=mime_type, headers=headers)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from services.blockchain import receipt_tracker
+from services.receipts import FINAL_STATUSES
+
+router = APIRouter(prefix="/tx", tags=["Transactions"])
+
+
+# Seconds between keep-alive comments on idle event streams
+KEEPALIVE_SECONDS = 15
+
+# Upper bound on hashes followed by one event stream
+MAX_STREAM_HASHES = 500
+
+# Seconds between re-reads of the followed hashes from SQLite, for
+# transactions sent (and so tracked) by another worker process
+STREAM_CHECK_SECONDS = 2
+
+
+# ===============================
+# HELPERS
+# ===============================
+
+def _validate_hash(tx_hash: str):
+
+    body = tx_hash[2:] if tx_hash.startswith("0x") else ""
+
+    if len(body) != 64 or any(c not in "0123456789abcdefABCDEF" for c in body):
+        raise HTTPException(400, "Invalid transaction hash")
+
+    return tx_hash.lower()
+
+
+def _view(tx_hash, entry):
+
+    return {
+        "hash": tx_hash,
+        "status": entry["status"],
+        "nonce": entry["nonce"],
+        "blockNumber": entry["block_number"],
+        "replaces": entry["replaces"],
+        "replacedBy": entry["replaced_by"],
+        "final": entry["status"] in FINAL_STATUSES
+    }
+
+
+def _sse(data):
+
+    return f"event: status\ndata: {json.dumps(data)}\n\n"
+
+
+# ===============================
+# STATUS
+# ===============================
+
+@router.get("/stream")
+async def stream_status(request: Request, hashes: str | None = None):
+    """
+    Server-sent events with status changes of backend transactions.
+
+    With `hashes` (comma separated) only those are followed: their
+    current status is sent first and the stream ends once all of them
+    are final. Without it every change made by this worker process is
+    streamed (other workers' transactions are not seen).
+    """
+
+    wanted = None
+
+    if hashes:
+        wanted = {_validate_hash(h.strip()) for h in hashes.split(",") if h.strip()}
+
+        if len(wanted) > MAX_STREAM_HASHES:
+            raise HTTPException(400, f"Too many hashes (max {MAX_STREAM_HASHES})")
+
+    loop = asyncio.get_running_loop()
+    updates = asyncio.Queue()
+
+    def listener(tx_hash, entry):
+        if wanted is None or tx_hash in wanted:
+            loop.call_soon_threadsafe(updates.put_nowait, (tx_hash, entry))
+
+    # Subscribe before reading current state so no change is missed
+    receipt_tracker.add_listener(listener)
+
+    async def events():
+        try:
+            open_hashes = set(wanted or ())
+            sent = {}
+
+            def changed(tx_hash, entry):
+                view = _view(tx_hash, entry)
+
+                if wanted is None:
+                    return _sse(view)
+
+                if sent.get(tx_hash) == view:
+                    return None
+
+                sent[tx_hash] = view
+
+                if view["final"]:
+                    open_hashes.discard(tx_hash)
+
+                return _sse(view)
+
+            for tx_hash in wanted or ():
+                entry = await run_in_threadpool(receipt_tracker.status, tx_hash)
+
+                if entry is None:
+                    yield _sse({"hash": tx_hash, "status": "unknown", "final": True})
+                    open_hashes.discard(tx_hash)
+                    continue
+
+                yield changed(tx_hash, entry)
+
+            last_sent = loop.time()
+
+            while wanted is None or open_hashes:
+
+                if await request.is_disconnected():
+                    break
+
+                # Followed hashes may be tracked by another worker: only
+                # the shared SQLite row sees their changes
+                timeout = STREAM_CHECK_SECONDS if wanted else KEEPALIVE_SECONDS
+
+                try:
+                    tx_hash, entry = await asyncio.wait_for(
+                        updates.get(),
+                        timeout
+                    )
+                    lines = [changed(tx_hash, entry)]
+                except asyncio.TimeoutError:
+                    lines = []
+
+                    for tx_hash in list(open_hashes):
+                        entry = await run_in_threadpool(receipt_tracker.status, tx_hash)
+
+                        if entry is not None:
+                            lines.append(changed(tx_hash, entry))
+
+                for line in lines:
+                    if line:
+                        last_sent = loop.time()
+                        yield line
+
+                if loop.time() - last_sent >= KEEPALIVE_SECONDS:
+                    last_sent = loop.time()
+                    yield ": keep-alive\n\n"
+
+        finally:
+            receipt_tracker.remove_listener(listener)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{tx_hash}")
+async def get_status(tx_hash: str):
+
+    tx_hash = _validate_hash(tx_hash)
+
+    entry = await run_in_threadpool(receipt_tracker.status, tx_hash)
+
+    if entry is None:
+        raise HTTPException(404, "Unknown transaction")
+
+    return _view(tx_hash, entry)
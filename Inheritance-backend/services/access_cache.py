@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    ACCESS_CACHE_TTL_SECONDS,
+    ACCESS_CACHE_NEGATIVE_TTL_SECONDS,
+    ACCESS_CACHE_MAX_ENTRIES
+)
+from services import metrics
+from services.receipts import FINAL_STATUSES
+
+
+# ===============================
+# ACCESS RESULT CACHE
+# ===============================
+#
+# Used while the access event projection is not available. Entries are
+# built from getAccessInfo, so a temporary grant is cached exactly until
+# it expires, a permanent one for ACCESS_CACHE_TTL_SECONDS (it may still
+# be revoked by a transaction we did not send) and a refusal for
+# ACCESS_CACHE_NEGATIVE_TTL_SECONDS.
+#
+# Grants and revocations sent by this backend drop the entry at once,
+# and the pair stays uncached until the transaction is final.
+
+class AccessCache:
+
+    def __init__(self):
+
+        # (patient, doctor) -> (allowed, expires_at), oldest first
+        self._entries = OrderedDict()
+
+        # tx_hash -> pair written by that (still pending) transaction
+        self._writes = {}
+        self._pending = {}
+
+        self._lock = threading.Lock()
+
+    def get(self, patient, doctor):
+        """
+        Cached hasAccess answer, or None
+        """
+
+        key = (patient, doctor)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and time.time() >= entry[1]:
+                del self._entries[key]
+                entry = None
+
+        metrics.cache_lookup("access", entry is not None)
+
+        return entry[0] if entry else None
+
+    def put(self, patient, doctor, permanent, expiry):
+        """
+        Cache a getAccessInfo result; returns the hasAccess answer
+        """
+
+        now = time.time()
+        allowed = bool(permanent) or expiry > now
+
+        if permanent:
+            ttl = ACCESS_CACHE_TTL_SECONDS
+        elif allowed:
+            ttl = min(expiry - now, ACCESS_CACHE_TTL_SECONDS)
+        else:
+            ttl = ACCESS_CACHE_NEGATIVE_TTL_SECONDS
+
+        key = (patient, doctor)
+
+        with self._lock:
+            if ttl <= 0 or key in self._pending:
+                return allowed
+
+            self._entries[key] = (allowed, now + ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > ACCESS_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+        return allowed
+
+    def invalidate(self, patient, doctor, tx_hash=None):
+        """
+        Drop a pair after a local grant/revoke; with `tx_hash` the pair
+        stays uncached until that transaction is final
+        """
+
+        key = (patient, doctor)
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+            if tx_hash:
+                self._writes[tx_hash] = key
+                self._pending[key] = self._pending.get(key, 0) + 1
+
+    def on_tx_status(self, tx_hash, entry):
+        """
+        ReceiptTracker listener
+        """
+
+        with self._lock:
+            key = self._writes.get(tx_hash)
+
+            if key is None:
+                return
+
+            # A fee-bumped replacement carries the same write
+            replacement = entry["replaced_by"]
+
+            if (
+                replacement
+                and entry["status"] == "pending"
+                and replacement not in self._writes
+            ):
+                self._writes[replacement] = key
+                self._pending[key] += 1
+
+            if entry["status"] not in FINAL_STATUSES:
+                return
+
+            del self._writes[tx_hash]
+            self._entries.pop(key, None)
+
+            if self._pending[key] > 1:
+                self._pending[key] -= 1
+            else:
+                del self._pending[key]
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
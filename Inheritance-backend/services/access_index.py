@@ -0,0 +1,187 @@
+import threading
+import time
+
+from web3 import Web3
+
+from services.db import get_connection
+
+
+# ===============================
+# SCHEMA
+# ===============================
+
+# access_events keeps the history needed to undo a reorg,
+# access_state is the durable snapshot the memory view is loaded from.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS access_events (
+    block_number INTEGER NOT NULL,
+    log_index    INTEGER NOT NULL,
+    patient      TEXT NOT NULL,
+    doctor       TEXT NOT NULL,
+    granted      INTEGER NOT NULL,
+    permanent    INTEGER NOT NULL,
+    expiry       INTEGER NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+
+CREATE INDEX IF NOT EXISTS access_events_by_pair
+    ON access_events (patient, doctor, block_number, log_index);
+
+CREATE TABLE IF NOT EXISTS access_state (
+    patient   TEXT NOT NULL,
+    doctor    TEXT NOT NULL,
+    permanent INTEGER NOT NULL,
+    expiry    INTEGER NOT NULL,
+    PRIMARY KEY (patient, doctor)
+);
+"""
+
+
+# ===============================
+# IN-MEMORY PROJECTION
+# ===============================
+
+# (patient, doctor) -> (permanent, expiry); revoked pairs are absent
+_state = {}
+
+# Pairs written since the last commit, refreshed from the snapshot
+_dirty = set()
+
+_lock = threading.Lock()
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+def load_snapshot():
+    """
+    Rebuild the memory view from the durable snapshot
+    """
+
+    rows = get_connection().execute(
+        "SELECT patient, doctor, permanent, expiry FROM access_state"
+    ).fetchall()
+
+    with _lock:
+        _state.clear()
+
+        for r in rows:
+            _state[(r["patient"], r["doctor"])] = (bool(r["permanent"]), r["expiry"])
+
+
+def _refresh_pair(conn, patient, doctor):
+    """
+    Re-derive one pair's snapshot row from its newest event
+    """
+
+    last = conn.execute(
+        "SELECT granted, permanent, expiry FROM access_events "
+        "WHERE patient = ? AND doctor = ? "
+        "ORDER BY block_number DESC, log_index DESC LIMIT 1",
+        (patient, doctor)
+    ).fetchone()
+
+    if last is None or not last["granted"]:
+        conn.execute(
+            "DELETE FROM access_state WHERE patient = ? AND doctor = ?",
+            (patient, doctor)
+        )
+    else:
+        conn.execute(
+            "INSERT OR REPLACE INTO access_state "
+            "(patient, doctor, permanent, expiry) VALUES (?, ?, ?, ?)",
+            (patient, doctor, last["permanent"], last["expiry"])
+        )
+
+    _dirty.add((patient, doctor))
+
+
+# ===============================
+# INDEXER CALLBACKS
+# ===============================
+
+def apply_access_event(conn, event):
+
+    args = event["args"]
+    granted = event["event"] == "AccessGranted"
+
+    conn.execute(
+        "INSERT OR REPLACE INTO access_events "
+        "(block_number, log_index, patient, doctor, granted, permanent, expiry) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            event["blockNumber"],
+            event["logIndex"],
+            args["patient"],
+            args["doctor"],
+            int(granted),
+            int(granted and args["permanent"]),
+            args["expiryTime"] if granted else 0
+        )
+    )
+
+    _refresh_pair(conn, args["patient"], args["doctor"])
+
+
+def rollback_access(conn, block):
+
+    pairs = conn.execute(
+        "SELECT DISTINCT patient, doctor FROM access_events WHERE block_number > ?",
+        (block,)
+    ).fetchall()
+
+    conn.execute(
+        "DELETE FROM access_events WHERE block_number > ?",
+        (block,)
+    )
+
+    for p in pairs:
+        _refresh_pair(conn, p["patient"], p["doctor"])
+
+
+def commit_access():
+    """
+    Copy committed snapshot rows for touched pairs into memory
+    """
+
+    conn = get_connection()
+
+    with _lock:
+        pairs = list(_dirty)
+        _dirty.clear()
+
+        for patient, doctor in pairs:
+            row = conn.execute(
+                "SELECT permanent, expiry FROM access_state "
+                "WHERE patient = ? AND doctor = ?",
+                (patient, doctor)
+            ).fetchone()
+
+            if row is None:
+                _state.pop((patient, doctor), None)
+            else:
+                _state[(patient, doctor)] = (bool(row["permanent"]), row["expiry"])
+
+
+# ===============================
+# QUERIES
+# ===============================
+
+def get_access_info(patient, doctor):
+    """
+    (permanent, expiry) for a pair, (False, 0) when never granted
+    """
+
+    return _state.get(
+        (Web3.to_checksum_address(patient), Web3.to_checksum_address(doctor)),
+        (False, 0)
+    )
+
+
+def has_access(patient, doctor):
+
+    permanent, expiry = get_access_info(patient, doctor)
+
+    return permanent or expiry > time.time()
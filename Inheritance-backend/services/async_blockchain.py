@@ -0,0 +1,434 @@
+import asyncio
+
+from web3 import AsyncWeb3, Web3
+from web3._utils.abi import get_abi_output_types
+
+from config import (
+    RPC_TIMEOUT_SECONDS,
+    ACCESS_MAX_LAG_BLOCKS,
+    MULTICALL_CHUNK_SIZE,
+    ANCHOR_MODE
+)
+from services import access_index, merkle_anchor, record_index
+from services import blockchain
+from services.rpc_pool import AsyncPooledProvider
+from services.blockchain import (
+    access_indexer,
+    record_indexer,
+    medical_records_abi,
+    access_control_abi,
+    multicall_abi,
+    medical_records_contract,
+    access_control_contract,
+    _batched_records,
+    _list_records,
+    _find_indexed_record,
+    _checksum_pairs,
+    _parse_cursor,
+    _page_window,
+    _assemble_page,
+    _chain_rows,
+    _cached_access,
+    _fill_access,
+    _invalidate_access,
+    access_cache,
+    _submit_tx,
+    save_filename
+)
+
+
+# ===============================
+# ASYNC WEB3 CONNECTION
+# ===============================
+
+# Shares the endpoint pool (health, hedging, breakers) with the sync client
+async_w3 = AsyncWeb3(AsyncPooledProvider())
+
+
+async def close_session():
+
+    await async_w3.provider.disconnect()
+
+
+async def _call(function):
+    """
+    eth_call with a hard per-call timeout
+    """
+
+    return await asyncio.wait_for(function.call(), RPC_TIMEOUT_SECONDS)
+
+
+# ===============================
+# CONTRACTS
+# ===============================
+
+async_medical_records_contract = async_w3.eth.contract(
+    address=medical_records_contract.address,
+    abi=medical_records_abi
+)
+
+async_access_control_contract = async_w3.eth.contract(
+    address=access_control_contract.address,
+    abi=access_control_abi
+)
+
+async_multicall_contract = async_w3.eth.contract(
+    address=blockchain.multicall_contract.address,
+    abi=multicall_abi
+)
+
+
+# ===============================
+# BATCHED READS (Multicall3)
+# ===============================
+#
+# SQLite reads and writes run in worker threads (`asyncio.to_thread`),
+# never on the event loop.
+
+async def _has_multicall():
+    """
+    Async counterpart of `blockchain._has_multicall`, sharing its answer
+    """
+
+    if blockchain._multicall_available is None:
+        code = await asyncio.wait_for(
+            async_w3.eth.get_code(async_multicall_contract.address),
+            RPC_TIMEOUT_SECONDS
+        )
+
+        blockchain._multicall_available = len(code) > 0
+
+        if not blockchain._multicall_available:
+            print("⚠️ Multicall3 not deployed, batched reads fall back to single calls")
+
+    return blockchain._multicall_available
+
+
+async def multicall(calls, chunk_size=MULTICALL_CHUNK_SIZE):
+    """
+    Async counterpart of `blockchain.multicall`; chunks are sent concurrently
+    """
+
+    if not calls:
+        return []
+
+    if not await _has_multicall():
+        return await asyncio.gather(*[
+            _call_or_none(contract.functions[fn_name](*args))
+            for contract, fn_name, args in calls
+        ])
+
+    chunks = [
+        calls[start:start + chunk_size]
+        for start in range(0, len(calls), chunk_size)
+    ]
+
+    replies = await asyncio.gather(*[
+        _call(async_multicall_contract.functions.aggregate3([
+            (contract.address, True, contract.encodeABI(fn_name=fn_name, args=args))
+            for contract, fn_name, args in chunk
+        ]))
+        for chunk in chunks
+    ])
+
+    results = []
+
+    for chunk, chunk_replies in zip(chunks, replies):
+        for (contract, fn_name, _), (success, data) in zip(chunk, chunk_replies):
+
+            if not success:
+                results.append(None)
+                continue
+
+            output_types = get_abi_output_types(
+                contract.get_function_by_name(fn_name).abi
+            )
+            decoded = async_w3.codec.decode(output_types, data)
+
+            results.append(decoded[0] if len(decoded) == 1 else list(decoded))
+
+    return results
+
+
+async def _call_or_none(function):
+
+    try:
+        return await _call(function)
+    except Exception:
+        return None
+
+
+def _indexed_access(pairs):
+
+    return [access_index.has_access(p, d) for p, d in pairs]
+
+
+def _indexed_access_info(pairs):
+
+    return [access_index.get_access_info(p, d) for p, d in pairs]
+
+
+async def check_access_many(pairs):
+
+    pairs = _checksum_pairs(pairs)
+
+    if access_indexer.is_ready(ACCESS_MAX_LAG_BLOCKS):
+        return await asyncio.to_thread(_indexed_access, pairs)
+
+    cached, missing = _cached_access(pairs)
+
+    infos = await multicall([
+        (async_access_control_contract, "getAccessInfo", [p, d])
+        for p, d in missing
+    ])
+
+    return _fill_access(cached, missing, infos)
+
+
+async def get_access_info_many(pairs):
+
+    pairs = _checksum_pairs(pairs)
+
+    if access_indexer.is_ready(ACCESS_MAX_LAG_BLOCKS):
+        return await asyncio.to_thread(_indexed_access_info, pairs)
+
+    results = await multicall([
+        (async_access_control_contract, "getAccessInfo", [p, d])
+        for p, d in pairs
+    ])
+
+    return [tuple(r) if r else (False, 0) for r in results]
+
+
+# ===============================
+# READ FUNCTIONS
+# ===============================
+
+async def check_access(patient, doctor):
+
+    if not Web3.is_address(patient) or not Web3.is_address(doctor):
+        raise ValueError("Invalid address")
+
+    if access_indexer.is_ready(ACCESS_MAX_LAG_BLOCKS):
+        return await asyncio.to_thread(access_index.has_access, patient, doctor)
+
+    patient = Web3.to_checksum_address(patient)
+    doctor = Web3.to_checksum_address(doctor)
+
+    allowed = access_cache.get(patient, doctor)
+
+    if allowed is None:
+        permanent, expiry = await _call(
+            async_access_control_contract.functions.getAccessInfo(patient, doctor)
+        )
+
+        allowed = access_cache.put(patient, doctor, permanent, expiry)
+
+    return allowed
+
+
+async def get_all_records(patient):
+
+    if not Web3.is_address(patient):
+        raise ValueError("Invalid address")
+
+    patient = Web3.to_checksum_address(patient)
+
+    if record_indexer.is_ready():
+        records = await asyncio.to_thread(record_index.get_records, patient)
+    else:
+        records = await _call(
+            async_medical_records_contract.functions.getAllRecords(patient)
+        )
+
+    return await asyncio.to_thread(_list_records, patient, records)
+
+
+async def get_records_page(patient, cursor=None, limit=100, newest_first=False):
+    """
+    Async counterpart of `blockchain.get_records_page`
+    """
+
+    if not Web3.is_address(patient):
+        raise ValueError("Invalid address")
+
+    patient = Web3.to_checksum_address(patient)
+    cursor = _parse_cursor(cursor)
+
+    indexed = record_indexer.is_ready()
+
+    if indexed:
+        chain_count = await asyncio.to_thread(record_index.count_records, patient)
+    else:
+        chain_count = await _call(
+            async_medical_records_contract.functions.getRecordCount(patient)
+        )
+
+    total = chain_count + await asyncio.to_thread(merkle_anchor.count_records, patient)
+
+    indices, after_id, before_id = _page_window(chain_count, cursor, limit, newest_first)
+
+    if indexed:
+        chain_rows = await asyncio.to_thread(record_index.get_records_at, patient, indices)
+    else:
+        chain_rows = _chain_rows(patient, indices, await multicall([
+            (async_medical_records_contract, "getRecordByIndex", [patient, i])
+            for i in indices
+        ]))
+
+    batched = await asyncio.to_thread(
+        _batched_records,
+        patient,
+        after_id=after_id,
+        before_id=before_id,
+        limit=limit + 1,
+        newest_first=newest_first
+    )
+
+    # Formatting looks up the file names in SQLite
+    return await asyncio.to_thread(
+        _assemble_page,
+        chain_rows,
+        batched,
+        cursor,
+        limit,
+        newest_first,
+        chain_count,
+        total
+    )
+
+
+async def get_record(patient, cid):
+
+    if not Web3.is_address(patient):
+        raise ValueError("Invalid address")
+
+    patient = Web3.to_checksum_address(patient)
+
+    if record_indexer.is_ready():
+        return await asyncio.to_thread(_find_indexed_record, patient, cid)
+
+    for r in await get_all_records(patient):
+        if r["cid"] == cid:
+            return r
+
+    return None
+
+
+async def has_access(patient, doctor):
+    return await check_access(patient, doctor)
+
+
+# ===============================
+# WRITES (via the single-writer queue)
+# ===============================
+
+async def _send_tx(function, gas=300000):
+    """
+    Queue a write without blocking the event loop
+    """
+
+    return await asyncio.wrap_future(_submit_tx(function, gas))
+
+
+async def add_record(patient, cid, record_type, filename):
+
+    if not Web3.is_address(patient):
+        raise ValueError("Invalid patient")
+
+    # Anchored later with the next batch root: no transaction hash yet
+    if ANCHOR_MODE == "merkle":
+        await asyncio.to_thread(merkle_anchor.queue_record, patient, cid, record_type)
+        await asyncio.to_thread(save_filename, cid, filename)
+        return None
+
+    tx_hash = await _send_tx(
+        medical_records_contract.functions.addRecord(
+            Web3.to_checksum_address(patient),
+            cid,
+            record_type
+        )
+    )
+
+    await asyncio.to_thread(save_filename, cid, filename)
+
+    return tx_hash
+
+
+async def grant_access(patient, doctor):
+
+    tx_hash = await _send_tx(
+        access_control_contract.functions.grantPermanentAccess(
+            Web3.to_checksum_address(doctor)
+        ),
+        gas=200000
+    )
+
+    return await asyncio.to_thread(_invalidate_access, tx_hash, patient, doctor)
+
+
+async def grant_temporary_access(patient, doctor, duration):
+
+    tx_hash = await _send_tx(
+        access_control_contract.functions.grantTemporaryAccess(
+            Web3.to_checksum_address(doctor),
+            duration
+        ),
+        gas=200000
+    )
+
+    return await asyncio.to_thread(_invalidate_access, tx_hash, patient, doctor)
+
+
+async def revoke_access(patient, doctor):
+
+    tx_hash = await _send_tx(
+        access_control_contract.functions.revokeAccess(
+            Web3.to_checksum_address(doctor)
+        ),
+        gas=200000
+    )
+
+    return await asyncio.to_thread(_invalidate_access, tx_hash, patient, doctor)
+
+
+async def grant_with_signature(
+    patient,
+    doctor,
+    permanent,
+    expiry,
+    nonce,
+    signature
+):
+
+    tx_hash = await _send_tx(
+        access_control_contract.functions.grantWithSignature(
+            Web3.to_checksum_address(patient),
+            Web3.to_checksum_address(doctor),
+            permanent,
+            expiry,
+            nonce,
+            signature
+        )
+    )
+
+    return await asyncio.to_thread(_invalidate_access, tx_hash, patient, doctor)
+
+
+async def revoke_with_signature(
+    patient,
+    doctor,
+    nonce,
+    signature
+):
+
+    tx_hash = await _send_tx(
+        access_control_contract.functions.revokeWithSignature(
+            Web3.to_checksum_address(patient),
+            Web3.to_checksum_address(doctor),
+            nonce,
+            signature
+        )
+    )
+
+    return await asyncio.to_thread(_invalidate_access, tx_hash, patient, doctor)
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import random
+
+import httpx
+
+from config import PINATA_UPLOAD_CONCURRENCY
+from services import metrics, pinata_service
+from services.pinata_service import (
+    MAX_RETRIES,
+    TIMEOUT,
+    _MultipartBody,
+    _get_headers,
+    _pinata_payload
+)
+
+
+# Backoff before retry n is uniform in [0, BACKOFF_BASE * 2**n] seconds
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# Statuses worth retrying (rate limited or server side)
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_BLOCK = 64 * 1024
+
+
+# ===============================
+# POOLED HTTP/2 CLIENT
+# ===============================
+
+_client = None
+_slots = None
+_loop = None
+
+
+def _ensure_client():
+    """
+    One pooled client and upload limiter per event loop
+    """
+
+    global _client, _slots, _loop
+
+    loop = asyncio.get_running_loop()
+
+    if _client is None or _client.is_closed or _loop is not loop:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(TIMEOUT, connect=10),
+            limits=httpx.Limits(
+                max_connections=PINATA_UPLOAD_CONCURRENCY * 2,
+                max_keepalive_connections=PINATA_UPLOAD_CONCURRENCY
+            )
+        )
+        _slots = asyncio.Semaphore(PINATA_UPLOAD_CONCURRENCY)
+        _loop = loop
+
+    return _client, _slots
+
+
+async def close_client():
+
+    global _client
+
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+
+    _client = None
+
+
+# ===============================
+# FILE BODIES
+# ===============================
+
+def _read_file(file_path):
+
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(_BLOCK)
+
+            if not block:
+                break
+
+            yield block
+
+
+# ===============================
+# UPLOADS
+# ===============================
+
+async def _post_with_retries(make_body) -> str:
+    """
+    POST a fresh body from `make_body()` with jittered exponential
+    backoff, and return the CID
+    """
+
+    client, slots = _ensure_client()
+    headers = _get_headers()
+
+    for attempt in range(1, MAX_RETRIES + 1):
+
+        body = make_body()
+
+        try:
+            async with slots:
+                response = await client.post(
+                    pinata_service.PINATA_PIN_FILE_URL,
+                    headers={
+                        **headers,
+                        "Content-Type": body.content_type,
+                        "Content-Length": str(len(body))
+                    },
+                    content=aiter(body)
+                )
+
+            if response.status_code == 200:
+                return response.json()["IpfsHash"]
+
+            if response.status_code not in _RETRY_STATUSES:
+                # Client error (don't retry)
+                raise RuntimeError(
+                    f"Pinata error {response.status_code}: {response.text}"
+                )
+
+            error = f"Pinata server error: {response.status_code}"
+
+        except httpx.TransportError as e:
+            error = str(e) or type(e).__name__
+
+        if attempt == MAX_RETRIES:
+            raise RuntimeError(
+                f"IPFS upload failed after {MAX_RETRIES} tries: {error}"
+            )
+
+        await asyncio.sleep(
+            random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        )
+
+    raise RuntimeError("Unexpected upload failure")
+
+
+async def upload_stream_to_ipfs(
+    make_blocks,
+    size: int,
+    name: str,
+    metadata: dict | None = None
+) -> str:
+    """
+    Async counterpart of `pinata_service.upload_stream_to_ipfs`.
+
+    `make_blocks()` may return a sync or an async iterator; at most
+    PINATA_UPLOAD_CONCURRENCY uploads run at once per worker.
+    """
+
+    payload = _pinata_payload(name, metadata)
+
+    # Wall time of the upload; a streamed source is encrypted meanwhile
+    with metrics.IN_FLIGHT.track(kind="pin"), metrics.stage("pin"):
+        return await _post_with_retries(
+            lambda: _MultipartBody(payload, name, make_blocks(), size)
+        )
+
+
+async def upload_to_ipfs(
+    file_path: str,
+    metadata: dict | None = None
+) -> str:
+    """
+    Async counterpart of `pinata_service.upload_to_ipfs`, streaming the
+    file from disk
+    """
+
+    size = await asyncio.to_thread(lambda: os.path.getsize(file_path))
+
+    return await upload_stream_to_ipfs(
+        lambda: _read_file(file_path),
+        size,
+        os.path.basename(file_path),
+        metadata
+    )
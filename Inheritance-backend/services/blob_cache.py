@@ -0,0 +1,459 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import BLOB_CACHE_DIR, BLOB_CACHE_MAX_BYTES
+from services import ipfs_gateways, metrics
+from services.db import get_connection
+from services.ipfs_gateways import ContentMismatchError, raw_digest
+
+
+# ===============================
+# ON-DISK CIPHERTEXT CACHE
+# ===============================
+#
+# CIDs are immutable, so a blob fetched once never has to be fetched
+# again. Blobs are stored exactly as pinned (still encrypted), one file
+# per CID, with size and last use tracked in SQLite for LRU eviction.
+
+_CID_RE = re.compile(r"^[A-Za-z0-9]{10,128}$")
+
+_BLOCK = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blob_cache (
+    cid       TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_blob_cache_used ON blob_cache (last_used);
+"""
+
+# cid -> _Flight: blobs being downloaded, one download per CID
+_flights = {}
+
+# CIDs known to be larger than the cache, so not prefetched again
+_too_large = OrderedDict()
+TOO_LARGE_HISTORY = 10000
+
+_lock = threading.Lock()
+
+# Background downloads, one per blob in flight
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="blob-fill")
+
+
+def enabled():
+
+    return BLOB_CACHE_MAX_BYTES > 0
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+    if not enabled():
+        return
+
+    os.makedirs(BLOB_CACHE_DIR, exist_ok=True)
+
+    # Leftovers of downloads interrupted by a restart
+    for name in os.listdir(BLOB_CACHE_DIR):
+        if name.startswith(".part-"):
+            os.remove(os.path.join(BLOB_CACHE_DIR, name))
+
+
+def _path(cid):
+
+    return os.path.join(BLOB_CACHE_DIR, cid)
+
+
+# ===============================
+# INDEX
+# ===============================
+
+def _touch(cid, size):
+
+    conn = get_connection()
+
+    # Upsert: a file without a row would otherwise never be evicted
+    with conn:
+        conn.execute(
+            "INSERT INTO blob_cache (cid, size, last_used) VALUES (?, ?, ?) "
+            "ON CONFLICT (cid) DO UPDATE SET last_used = excluded.last_used",
+            (cid, size, time.time())
+        )
+
+
+def _forget(cid):
+
+    conn = get_connection()
+
+    with conn:
+        conn.execute("DELETE FROM blob_cache WHERE cid = ?", (cid,))
+
+
+def _evict():
+    """
+    Drop least recently used blobs until the cache fits its size bound
+    """
+
+    conn = get_connection()
+
+    total = conn.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM blob_cache"
+    ).fetchone()[0]
+
+    if total <= BLOB_CACHE_MAX_BYTES:
+        return
+
+    rows = conn.execute(
+        "SELECT cid, size FROM blob_cache ORDER BY last_used"
+    ).fetchall()
+
+    for row in rows:
+        if total <= BLOB_CACHE_MAX_BYTES:
+            break
+
+        evict(row["cid"])
+        total -= row["size"]
+
+
+def evict(cid):
+
+    _forget(cid)
+
+    try:
+        os.remove(_path(cid))
+    except FileNotFoundError:
+        pass
+
+
+# ===============================
+# READ-THROUGH (single flight)
+# ===============================
+#
+# A miss is downloaded once however many requests want it: the first
+# starts a background download (a "flight") that spools the body to a
+# part file, and every full read, the first included, follows that file
+# as it grows. Range reads are served from the gateway and only start
+# the flight (`prefetch`).
+#
+# A blob enters the cache only once verified: a raw-codec CID by its
+# hash, any other (dag-pb) by decrypting the whole spool with the
+# `verify` callback of the request that started the flight.
+
+class _Flight:
+    """
+    One blob being downloaded into a part file
+    """
+
+    def __init__(self, cid, verify):
+
+        self.cid = cid
+        self.verify = verify
+
+        self.part = os.path.join(BLOB_CACHE_DIR, ".part-" + uuid.uuid4().hex)
+        self.f = open(self.part, "wb")
+
+        self.url = None
+        self.length = None
+        self.size = 0
+        self.done = False
+        self.error = None
+
+        self.cond = threading.Condition()
+
+    def _set(self, **fields):
+
+        with self.cond:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+            self.cond.notify_all()
+
+    def wait_opened(self):
+        """
+        Block until a gateway answered; raises if none could
+        """
+
+        with self.cond:
+            while self.url is None and not self.done:
+                self.cond.wait()
+
+            if self.url is None:
+                raise self.error
+
+    def follow(self, f):
+        """
+        Body blocks as they are spooled, read through the caller's own
+        handle `f` (valid even once the part file is moved or removed)
+        """
+
+        offset = 0
+
+        try:
+            while True:
+                with self.cond:
+                    while self.size == offset and not self.done:
+                        self.cond.wait()
+
+                    size, done, error = self.size, self.done, self.error
+
+                while offset < size:
+                    block = f.read(min(_BLOCK, size - offset))
+                    offset += len(block)
+
+                    yield block
+
+                if done:
+                    if error:
+                        raise error
+
+                    return
+
+        finally:
+            f.close()
+
+
+def _content_length(res):
+
+    length = res.headers.get("Content-Length")
+
+    return int(length) if length and length.isdigit() else None
+
+
+def _mark_too_large(cid):
+
+    with _lock:
+        _too_large[cid] = True
+
+        while len(_too_large) > TOO_LARGE_HISTORY:
+            _too_large.popitem(last=False)
+
+
+def _verified(flight):
+    """
+    True once the spooled blob is known to be the pinned one
+    """
+
+    digest = raw_digest(flight.cid)
+
+    if digest is not None:
+        # Checked while spooling
+        return True
+
+    if flight.verify is None:
+        return False
+
+    try:
+        ok = flight.verify(flight.part)
+    except Exception as e:
+        print(f"⚠️ Could not verify blob {flight.cid}: {e}")
+        return False
+
+    if not ok:
+        print(f"⚠️ {flight.url} served a blob for {flight.cid} that does not decrypt")
+        ipfs_gateways.report_corrupt(flight.url)
+
+    return ok
+
+
+def _land(flight, keep):
+    """
+    Retire a finished flight: move its blob into the cache or drop it.
+    Readers hold their own handles, so both are safe while they read.
+    """
+
+    flight.f.close()
+
+    with _lock:
+        _flights.pop(flight.cid, None)
+
+        if keep:
+            os.replace(flight.part, _path(flight.cid))
+        elif os.path.exists(flight.part):
+            os.remove(flight.part)
+
+    if keep:
+        _touch(flight.cid, flight.size)
+        _evict()
+
+
+def _spool(flight):
+
+    digest = raw_digest(flight.cid)
+    sha = hashlib.sha256()
+
+    try:
+        with metrics.stage("blob_download"):
+            url, res = ipfs_gateways.open_stream(flight.cid)
+
+            flight._set(url=url, length=_content_length(res))
+
+            with res:
+                for block in res.iter_content(_BLOCK):
+                    flight.f.write(block)
+                    flight.f.flush()
+
+                    if digest is not None:
+                        sha.update(block)
+
+                    flight._set(size=flight.size + len(block))
+
+        if digest is not None and sha.digest() != digest:
+            print(f"⚠️ {url} served content not matching CID {flight.cid}")
+            ipfs_gateways.report_corrupt(url)
+
+            raise ContentMismatchError(f"{url} served content not matching CID {flight.cid}")
+
+    except Exception as e:
+        flight._set(done=True, error=e)
+        _land(flight, False)
+        return
+
+    # Readers finish now; verification and commit happen behind them
+    flight._set(done=True)
+
+    fits = flight.size <= BLOB_CACHE_MAX_BYTES
+
+    if not fits:
+        _mark_too_large(flight.cid)
+
+    keep = False
+
+    try:
+        keep = fits and _verified(flight)
+    finally:
+        _land(flight, keep)
+
+
+def _start(cid, verify):
+    """
+    The flight of `cid`, started if none is; call with `_lock` held
+    """
+
+    flight = _flights.get(cid)
+
+    if flight is None:
+        flight = _flights[cid] = _Flight(cid, verify)
+        _executor.submit(_spool, flight)
+
+    return flight
+
+
+def _file_blocks(f):
+
+    with f:
+        while True:
+            block = f.read(_BLOCK)
+
+            if not block:
+                return
+
+            yield block
+
+
+def follow(cid, verify=None):
+    """
+    Read the whole ciphertext of an uncached `cid` through its flight,
+    starting it if needed: (blocks, size or None, gateway url or None).
+    None with the cache disabled.
+
+    `verify(path)` tells whether a downloaded dag-pb blob is genuine.
+    Raises FileNotFoundError when no gateway has the blob.
+    """
+
+    if not _CID_RE.match(cid):
+        raise ValueError("Invalid CID")
+
+    if not enabled():
+        return None
+
+    with _lock:
+        # Committed since the caller missed: read that instead
+        try:
+            f = open(_path(cid), "rb")
+        except FileNotFoundError:
+            f = None
+
+        if f is None:
+            flight = _start(cid, verify)
+
+            # Opened before the flight can land and move the file
+            reader = open(flight.part, "rb")
+
+    if f is not None:
+        return _file_blocks(f), os.fstat(f.fileno()).st_size, None
+
+    try:
+        flight.wait_opened()
+    except Exception:
+        reader.close()
+        raise
+
+    return flight.follow(reader), flight.length, flight.url
+
+
+def prefetch(cid, verify=None):
+    """
+    Download `cid` into the cache in the background, unless it is
+    cached, in flight or known not to fit
+    """
+
+    if not enabled() or not _CID_RE.match(cid):
+        return
+
+    with _lock:
+        if cid in _too_large or os.path.exists(_path(cid)):
+            return
+
+        _start(cid, verify)
+
+
+def reject(cid, url=None):
+    """
+    A blob failed to decrypt: drop any cached copy and, unless its hash
+    already vouched for the bytes, penalise the gateway that served it
+    """
+
+    evict(cid)
+
+    if url and raw_digest(cid) is None:
+        ipfs_gateways.report_corrupt(url)
+
+
+def open_blob(cid):
+    """
+    Open the cached ciphertext of `cid`, or None on a miss (or with the
+    cache disabled): the caller then reads through `follow`, or from
+    the gateway alongside `prefetch`.
+
+    The file is opened before returning, so a concurrent eviction
+    cannot pull it from under the reader.
+    """
+
+    if not _CID_RE.match(cid):
+        raise ValueError("Invalid CID")
+
+    if not enabled():
+        return None
+
+    try:
+        f = open(_path(cid), "rb")
+    except FileNotFoundError:
+        # Row without file (removed by hand or evicted meanwhile)
+        _forget(cid)
+        metrics.cache_lookup("blob", False)
+
+        return None
+
+    _touch(cid, os.fstat(f.fileno()).st_size)
+    metrics.cache_lookup("blob", True)
+
+    return f
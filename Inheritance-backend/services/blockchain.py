@@ -1,87 +1,242 @@
 from web3 import Web3
-import json
-import os
+from web3._utils.abi import get_abi_output_types
+from web3.exceptions import ContractLogicError
 
 from config import (
-    RPC_URL,
     MEDICAL_RECORDS_ADDRESS,
     ACCESS_CONTROL_ADDRESS,
     BACKEND_PRIVATE_KEY,
-    BACKEND_WALLET
+    BACKEND_WALLET,
+    ACCESS_MAX_LAG_BLOCKS,
+    MULTICALL_ADDRESS,
+    MULTICALL_CHUNK_SIZE,
+    ANCHOR_MODE,
+    TX_STUCK_SECONDS
 )
+from services import access_index, file_store, merkle_anchor, record_index
+from services import relayer as relayer_store
+from services.file_store import save_filename, get_filename, get_filenames
+from services.access_cache import AccessCache
+from services.chain import ChainClient, load_abi
+from services.fee_oracle import FeeOracle, with_margin
+from services.indexer import EventIndexer
+from services.merkle_anchor import MerkleAnchorer, ROOT_RECORD_TYPE
+from services.receipts import ReceiptTracker
+from services.relayer import Relayer
+from services.tx_queue import TxQueue
 
 # ===============================
-# WEB3 CONNECTION
+# WEB3 CLIENT (lazy, no RPC at import)
 # ===============================
 
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+client = ChainClient()
 
-if not w3.is_connected():
-    raise RuntimeError("❌ RPC connection failed")
+w3 = client.w3
 
-BACKEND_WALLET = Web3.to_checksum_address(BACKEND_WALLET)
-
-print("✅ Connected to blockchain")
+if Web3.is_address(BACKEND_WALLET or ""):
+    BACKEND_WALLET = Web3.to_checksum_address(BACKEND_WALLET)
 
 
 # ===============================
-# LOAD ABIS
+# ABIS / CONTRACTS
 # ===============================
 
-with open("contracts/MedicalRecords.json") as f:
-    medical_records_abi = json.load(f)["abi"]
+medical_records_abi = load_abi("MedicalRecords")
+access_control_abi = load_abi("AccessControl")
+multicall_abi = load_abi("Multicall3")
 
-with open("contracts/AccessControl.json") as f:
-    access_control_abi = json.load(f)["abi"]
+medical_records_contract = client.contract("MedicalRecords", MEDICAL_RECORDS_ADDRESS)
+access_control_contract = client.contract("AccessControl", ACCESS_CONTROL_ADDRESS)
+multicall_contract = client.contract("Multicall3", MULTICALL_ADDRESS)
 
 
 # ===============================
-# CONTRACTS
+# EVENT INDEX (RecordAdded)
 # ===============================
 
-medical_records_contract = w3.eth.contract(
-    address=Web3.to_checksum_address(MEDICAL_RECORDS_ADDRESS),
-    abi=medical_records_abi
+record_index.init_schema()
+
+record_indexer = EventIndexer(
+    "records",
+    w3,
+    medical_records_contract,
+    ["RecordAdded"],
+    record_index.apply_record_added,
+    record_index.rollback_records
 )
 
-access_control_contract = w3.eth.contract(
-    address=Web3.to_checksum_address(ACCESS_CONTROL_ADDRESS),
-    abi=access_control_abi
+
+# ===============================
+# EVENT INDEX (AccessGranted / AccessRevoked)
+# ===============================
+
+access_index.init_schema()
+
+access_indexer = EventIndexer(
+    "access",
+    w3,
+    access_control_contract,
+    ["AccessGranted", "AccessRevoked"],
+    access_index.apply_access_event,
+    access_index.rollback_access,
+    access_index.commit_access
 )
 
 
 # ===============================
-# LOCAL FILE MAP
+# LOCAL FILE NAMES (CID -> filename)
 # ===============================
 
-FILE_MAP = "file_map.json"
+file_store.init_schema()
+file_store.migrate_file_map()
+
+merkle_anchor.init_schema()
+
+
+# ===============================
+# BATCHED READS (Multicall3)
+# ===============================
+
+_multicall_available = None
+
+
+def _has_multicall():
+
+    global _multicall_available
+
+    if _multicall_available is None:
+        _multicall_available = len(w3.eth.get_code(multicall_contract.address)) > 0
+
+        if not _multicall_available:
+            print("⚠️ Multicall3 not deployed, batched reads fall back to single calls")
+
+    return _multicall_available
+
+
+def multicall(calls, chunk_size=MULTICALL_CHUNK_SIZE):
+    """
+    Run many read-only contract calls in as few eth_calls as possible
+
+    Args:
+        calls: list of (contract, function_name, args) tuples
+
+    Returns one decoded result per call, or None if that call reverted.
+    """
+
+    if not calls:
+        return []
+
+    if not _has_multicall():
+        results = []
+
+        for contract, fn_name, args in calls:
+            try:
+                results.append(contract.functions[fn_name](*args).call())
+            except Exception:
+                results.append(None)
+
+        return results
+
+    results = []
 
+    for start in range(0, len(calls), chunk_size):
 
-def load_file_map():
+        chunk = calls[start:start + chunk_size]
 
-    if not os.path.exists(FILE_MAP):
-        return {}
+        payload = [
+            (contract.address, True, contract.encodeABI(fn_name=fn_name, args=args))
+            for contract, fn_name, args in chunk
+        ]
 
-    with open(FILE_MAP, "r") as f:
-        return json.load(f)
+        replies = multicall_contract.functions.aggregate3(payload).call()
 
+        for (contract, fn_name, _), (success, data) in zip(chunk, replies):
 
-def save_file_map(data):
+            if not success:
+                results.append(None)
+                continue
 
-    with open(FILE_MAP, "w") as f:
-        json.dump(data, f, indent=2)
+            output_types = get_abi_output_types(
+                contract.get_function_by_name(fn_name).abi
+            )
+            decoded = w3.codec.decode(output_types, data)
 
+            results.append(decoded[0] if len(decoded) == 1 else list(decoded))
 
-def save_filename(cid, filename):
+    return results
 
-    data = load_file_map()
-    data[cid] = filename
-    save_file_map(data)
 
+def _checksum_pairs(pairs):
 
-def get_filename(cid):
+    for patient, doctor in pairs:
+        if not Web3.is_address(patient) or not Web3.is_address(doctor):
+            raise ValueError("Invalid address")
 
-    return load_file_map().get(cid)
+    return [
+        (Web3.to_checksum_address(p), Web3.to_checksum_address(d))
+        for p, d in pairs
+    ]
+
+
+def _cached_access(pairs):
+    """
+    Cached answers (None for misses) and the pairs still to fetch
+    """
+
+    cached = [access_cache.get(p, d) for p, d in pairs]
+
+    return cached, [pair for pair, hit in zip(pairs, cached) if hit is None]
+
+
+def _fill_access(cached, missing, infos):
+    """
+    Merge fetched getAccessInfo results into the cached answers
+    """
+
+    fetched = iter([
+        access_cache.put(p, d, *info) if info else False
+        for (p, d), info in zip(missing, infos)
+    ])
+
+    return [hit if hit is not None else next(fetched) for hit in cached]
+
+
+def check_access_many(pairs):
+    """
+    hasAccess for many (patient, doctor) pairs in one round trip
+    """
+
+    pairs = _checksum_pairs(pairs)
+
+    if access_indexer.is_ready(ACCESS_MAX_LAG_BLOCKS):
+        return [access_index.has_access(p, d) for p, d in pairs]
+
+    cached, missing = _cached_access(pairs)
+
+    infos = multicall([
+        (access_control_contract, "getAccessInfo", [p, d])
+        for p, d in missing
+    ])
+
+    return _fill_access(cached, missing, infos)
+
+
+def get_access_info_many(pairs):
+    """
+    getAccessInfo -> (permanent, expiryTime) for many pairs
+    """
+
+    pairs = _checksum_pairs(pairs)
+
+    if access_indexer.is_ready(ACCESS_MAX_LAG_BLOCKS):
+        return [access_index.get_access_info(p, d) for p, d in pairs]
+
+    results = multicall([
+        (access_control_contract, "getAccessInfo", [p, d])
+        for p, d in pairs
+    ])
+
+    return [tuple(r) if r else (False, 0) for r in results]
 
 
 # ===============================
@@ -93,10 +248,86 @@ def check_access(patient, doctor):
     if not Web3.is_address(patient) or not Web3.is_address(doctor):
         raise ValueError("Invalid address")
 
-    return access_control_contract.functions.hasAccess(
-        Web3.to_checksum_address(patient),
-        Web3.to_checksum_address(doctor)
-    ).call()
+    # Answered from the event projection unless it has fallen behind
+    if access_indexer.is_ready(ACCESS_MAX_LAG_BLOCKS):
+        return access_index.has_access(patient, doctor)
+
+    patient = Web3.to_checksum_address(patient)
+    doctor = Web3.to_checksum_address(doctor)
+
+    allowed = access_cache.get(patient, doctor)
+
+    if allowed is None:
+        permanent, expiry = access_control_contract.functions.getAccessInfo(
+            patient,
+            doctor
+        ).call()
+
+        allowed = access_cache.put(patient, doctor, permanent, expiry)
+
+    return allowed
+
+
+def _format_record(cid, record_type, timestamp, added_by, filename=None):
+
+    return {
+        "cid": cid,
+        "record_type": record_type,
+        "timestamp": timestamp,
+        "added_by": added_by,
+        "filename": filename,
+        "ipfs_url": f"https://gateway.pinata.cloud/ipfs/{cid}"
+    }
+
+
+def _format_records(records):
+
+    # One lookup for the whole page instead of one per record
+    filenames = get_filenames([r[0] for r in records])
+
+    return [_format_record(*r, filenames.get(r[0])) for r in records]
+
+
+def _batched_records(patient, **bounds):
+    """
+    Records anchored (or queued) through Merkle batches, with proofs:
+    [(leaf id, record)]. `bounds` are those of merkle_anchor.get_records.
+    """
+
+    rows = merkle_anchor.get_records(patient, **bounds)
+    filenames = get_filenames([r[1] for r in rows])
+
+    records = []
+
+    for leaf_id, cid, record_type, timestamp, anchor in rows:
+        record = _format_record(
+            cid,
+            record_type,
+            timestamp,
+            BACKEND_WALLET,
+            filenames.get(cid)
+        )
+        record["anchor"] = anchor
+        record["transaction_hash"] = anchor.get("transaction_hash")
+
+        records.append((leaf_id, record))
+
+    return records
+
+
+def _merge_records(chain, batched):
+    """
+    On-chain [(index, record)] and batched [(leaf id, record)] records as
+    one list of (sort key, record), oldest first. The key is (timestamp,
+    source, id): on equal timestamps on-chain records come first.
+    """
+
+    entries = [((r["timestamp"], 0, i), r) for i, r in chain]
+    entries += [((r["timestamp"], 1, i), r) for i, r in batched]
+
+    entries.sort(key=lambda e: e[0])
+
+    return entries
 
 
 def get_all_records(patient):
@@ -104,62 +335,442 @@ def get_all_records(patient):
     if not Web3.is_address(patient):
         raise ValueError("Invalid address")
 
-    records = medical_records_contract.functions.getAllRecords(
-        Web3.to_checksum_address(patient)
-    ).call()
+    patient = Web3.to_checksum_address(patient)
+
+    # Served from the local event index once it has caught up
+    if record_indexer.is_ready():
+        records = record_index.get_records(patient)
+    else:
+        records = medical_records_contract.functions.getAllRecords(
+            patient
+        ).call()
 
-    result = []
+    return _list_records(patient, records)
 
-    for r in records:
 
-        cid = r[0]
+def _list_records(patient, records):
+    """
+    On-chain `records` of a patient, formatted and merged with the
+    batched ones, oldest first
+    """
 
-        result.append({
-            "cid": cid,
-            "record_type": r[1],
-            "timestamp": r[2],
-            "added_by": r[3],
-            "filename": get_filename(cid),
-            "ipfs_url": f"https://gateway.pinata.cloud/ipfs/{cid}"
-        })
+    entries = _merge_records(
+        enumerate(_format_records(records)),
+        _batched_records(patient)
+    )
 
-    return result
+    return [r for _, r in entries]
 
 
 # ===============================
-# TRANSACTION HELPER
+# PAGINATED RECORDS
 # ===============================
+#
+# A patient's list merges the on-chain records with the Merkle-batched
+# ones in (timestamp, source, id) order. Each source is append-only and
+# already in time order (on-chain by index, batched by leaf id), so a
+# page is merged from the next `limit` records of each.
+#
+# The cursor is the id reached in each source, "<chain index>.<leaf id>".
+# Records added to either source later do not move it. It is only valid
+# for the order it was made with.
+
+def _parse_cursor(cursor):
+    """
+    Cursor string -> (chain index, leaf id), None for the first page
+    """
+
+    if cursor is None:
+        return None
+
+    try:
+        chain, leaf = (int(part) for part in cursor.split("."))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+    if chain < 0 or leaf < 0:
+        raise ValueError("Invalid cursor")
+
+    return chain, leaf
+
+
+def _page_window(chain_count, cursor, limit, newest_first):
+    """
+    Chain indices that may fall on the page, and the leaf id bounds of
+    the batched records to read: (indices, after_id, before_id).
+
+    Oldest first, a cursor (c, b) resumes at chain index c and after leaf
+    b; newest first, below chain index c and below leaf b (0: no bound).
+    """
+
+    chain, leaf = cursor or (None, 0)
+
+    if newest_first:
+        stop = chain_count if chain is None else min(chain, chain_count)
+        indices = list(range(stop - 1, max(stop - limit, 0) - 1, -1))
+
+        return indices, 0, leaf or None
+
+    start = chain or 0
+
+    return list(range(start, min(start + limit, chain_count))), leaf, None
+
+
+def _assemble_page(chain_rows, batched, cursor, limit, newest_first, chain_count, total):
+    """
+    `chain_rows`: {chain index: (cid, record_type, timestamp, added_by)}
+    for the window; `batched`: [(leaf id, record)], one more than `limit`
+    if that many remain.
+    """
+
+    indices = sorted(chain_rows)
+    chain = zip(indices, _format_records([chain_rows[i] for i in indices]))
+
+    entries = _merge_records(chain, batched)
+
+    if newest_first:
+        entries.reverse()
+
+    page, rest = entries[:limit], entries[limit:]
+
+    position, leaf = cursor or (chain_count if newest_first else 0, 0)
+
+    for (_, source, i), _ in page:
+        if source == 1:
+            leaf = i
+        else:
+            position = i if newest_first else i + 1
+
+    if newest_first:
+        more = bool(rest) or position > 0
+    else:
+        more = bool(rest) or position < chain_count
+
+    return {
+        "records": [r for _, r in page],
+        "total": total,
+        "next_cursor": f"{position}.{leaf}" if more else None
+    }
+
+
+def _chain_rows(patient, indices, replies):
+
+    return {
+        i: tuple(r)
+        for i, r in zip(indices, replies)
+        if r is not None
+    }
+
+
+def get_records_page(patient, cursor=None, limit=100, newest_first=False):
+    """
+    One page of a patient's records: the count, then every on-chain
+    record the page may need in a single batched call. `cursor` is the
+    `next_cursor` of the previous page.
+
+    Returns {"records", "total", "next_cursor"}.
+    """
+
+    if not Web3.is_address(patient):
+        raise ValueError("Invalid address")
+
+    patient = Web3.to_checksum_address(patient)
+    cursor = _parse_cursor(cursor)
+
+    indexed = record_indexer.is_ready()
 
-def _send_tx(tx):
+    if indexed:
+        chain_count = record_index.count_records(patient)
+    else:
+        chain_count = medical_records_contract.functions.getRecordCount(
+            patient
+        ).call()
 
-    signed = w3.eth.account.sign_transaction(
-        tx,
-        BACKEND_PRIVATE_KEY
+    total = chain_count + merkle_anchor.count_records(patient)
+
+    indices, after_id, before_id = _page_window(chain_count, cursor, limit, newest_first)
+
+    if indexed:
+        chain_rows = record_index.get_records_at(patient, indices)
+    else:
+        chain_rows = _chain_rows(patient, indices, multicall([
+            (medical_records_contract, "getRecordByIndex", [patient, i])
+            for i in indices
+        ]))
+
+    batched = _batched_records(
+        patient,
+        after_id=after_id,
+        before_id=before_id,
+        limit=limit + 1,
+        newest_first=newest_first
     )
 
-    tx_hash = w3.eth.send_raw_transaction(
-        signed.raw_transaction
+    return _assemble_page(
+        chain_rows,
+        batched,
+        cursor,
+        limit,
+        newest_first,
+        chain_count,
+        total
     )
 
-    return "0x" + tx_hash.hex()
 
+def _find_indexed_record(patient, cid):
+    """
+    A record looked up in the local index, then among the batched ones
+    """
 
-def _build_tx(function, gas=300000):
+    r = record_index.find_record(patient, cid)
 
-    nonce = w3.eth.get_transaction_count(
-        BACKEND_WALLET,
-        "pending"
-    )
+    if r:
+        return _format_record(*r, get_filename(cid))
+
+    for _, r in _batched_records(patient):
+        if r["cid"] == cid:
+            return r
+
+    return None
+
+
+def get_record(patient, cid):
+
+    if not Web3.is_address(patient):
+        raise ValueError("Invalid address")
+
+    patient = Web3.to_checksum_address(patient)
+
+    if record_indexer.is_ready():
+        return _find_indexed_record(patient, cid)
+
+    for r in get_all_records(patient):
+        if r["cid"] == cid:
+            return r
+
+    return None
+
+
+# ===============================
+# TRANSACTION QUEUE
+# ===============================
+
+fee_oracle = FeeOracle(w3)
+
+
+def _on_dropped(tx_hash, nonce):
+
+    print(f"⚠️ Transaction {tx_hash} (nonce {nonce}) was dropped")
+    tx_queue.nonces.resync()
+
+
+def _on_stuck(tx_hash, nonce):
+
+    new_hash = tx_queue.replace(tx_hash, fee_oracle.bumped).result(timeout=30)
+
+    print(f"⚠️ Transaction {tx_hash} (nonce {nonce}) stuck, re-sent as {new_hash}")
+
+
+receipt_tracker = ReceiptTracker(
+    w3,
+    on_dropped=_on_dropped,
+    on_stuck=_on_stuck,
+    stuck_after=TX_STUCK_SECONDS
+)
+
+# hasAccess answers while the access projection is unavailable
+access_cache = AccessCache()
+receipt_tracker.add_listener(access_cache.on_tx_status)
+
+
+def _invalidate_access(tx_hash, patient, doctor):
+    """
+    Forget cached answers a local grant/revoke changes. Backend-signed
+    calls act for the backend wallet (msg.sender), so that pair too.
+    """
+
+    for grantor in {patient, BACKEND_WALLET}:
+        if Web3.is_address(grantor or ""):
+            access_cache.invalidate(
+                Web3.to_checksum_address(grantor),
+                Web3.to_checksum_address(doctor),
+                tx_hash
+            )
+
+    # Settled before we got here: release the pair straight away
+    entry = receipt_tracker.status(tx_hash)
+
+    if entry:
+        access_cache.on_tx_status(tx_hash, entry)
+
+    return tx_hash
+
+
+# Every backend-signed write goes through this single writer
+tx_queue = TxQueue(
+    w3,
+    BACKEND_WALLET,
+    BACKEND_PRIVATE_KEY,
+    tracker=receipt_tracker
+)
+
+# Another endpoint may not know our pending transactions yet
+client.pool.add_writer_listener(tx_queue.nonces.reset)
+
+
+_chain_id = None
+
+
+def _get_chain_id():
+
+    global _chain_id
+
+    # Fixed for the lifetime of the RPC, no need to ask per transaction
+    if _chain_id is None:
+        _chain_id = w3.eth.chain_id
+
+    return _chain_id
+
+
+# Estimation errors meaning the call itself fails, not the node
+_REVERT_ERRORS = (
+    "revert",
+    "invalid opcode",
+    "gas required exceeds"
+)
+
+
+def _is_revert(error):
+
+    if isinstance(error, ContractLogicError):
+        return True
+
+    message = str(error).lower()
+
+    return any(e in message for e in _REVERT_ERRORS)
+
+
+def _estimate_gas(function, fallback):
+    """
+    estimate_gas plus a safety margin; `fallback` when the node could
+    not be asked. A reverting call raises: sending it would only burn
+    gas on a transaction known to fail.
+    """
+
+    try:
+        return with_margin(function.estimate_gas({"from": BACKEND_WALLET}))
+    except Exception as e:
+        if _is_revert(e):
+            raise
+
+        print(f"⚠️ Gas estimation failed, using {fallback}:", e)
+        return fallback
+
+
+def _build_tx(function, nonce, gas=300000):
+
+    max_fee, priority_fee = fee_oracle.fees()
 
     return function.build_transaction({
         "from": BACKEND_WALLET,
+        "chainId": _get_chain_id(),
         "nonce": nonce,
-        "gas": gas,
-        "maxFeePerGas": w3.to_wei("30", "gwei"),
-        "maxPriorityFeePerGas": w3.to_wei("2", "gwei"),
+        "gas": _estimate_gas(function, gas),
+        "maxFeePerGas": max_fee,
+        "maxPriorityFeePerGas": priority_fee,
     })
 
 
+def _submit_tx(function, gas=300000):
+    """
+    Queue a write and return a Future for its tx hash
+    """
+
+    return tx_queue.submit(
+        lambda nonce: _build_tx(function, nonce, gas)
+    )
+
+
+def _send_tx(function, gas=300000):
+
+    return _submit_tx(function, gas).result()
+
+
+# ===============================
+# MERKLE BATCH ANCHORING
+# ===============================
+
+def _anchor_root(root):
+
+    # MedicalRecords has no dedicated anchor call: the root is stored as
+    # a record of the backend wallet
+    return _send_tx(
+        medical_records_contract.functions.addRecord(
+            BACKEND_WALLET,
+            "merkle:" + root,
+            ROOT_RECORD_TYPE
+        )
+    )
+
+
+merkle_anchorer = MerkleAnchorer(_anchor_root)
+
+
+# ===============================
+# RELAYER (gasless grant / revoke)
+# ===============================
+
+relayer_store.init_schema()
+
+
+def _relay_send(action, patient, doctor, permanent, expiry, nonce, signature):
+
+    if action == "grant":
+        function = access_control_contract.functions.grantWithSignature(
+            patient,
+            doctor,
+            permanent,
+            expiry,
+            nonce,
+            signature
+        )
+    else:
+        function = access_control_contract.functions.revokeWithSignature(
+            patient,
+            doctor,
+            nonce,
+            signature
+        )
+
+    def sent(future):
+        if future.exception() is None:
+            _invalidate_access(future.result(), patient, doctor)
+
+    future = _submit_tx(function)
+    future.add_done_callback(sent)
+
+    return future
+
+
+def _used_hashes(digests):
+
+    results = multicall([
+        (access_control_contract, "usedHashes", [digest])
+        for digest in digests
+    ])
+
+    return [bool(r) for r in results]
+
+
+relayer = Relayer(
+    access_control_contract.address,
+    _relay_send,
+    _used_hashes,
+    receipt_tracker.status
+)
+receipt_tracker.add_listener(relayer.on_tx_status)
+
+
 # ===============================
 # NORMAL MODE (Backend signs)
 # ===============================
@@ -169,7 +780,13 @@ def add_record(patient, cid, record_type, filename):
     if not Web3.is_address(patient):
         raise ValueError("Invalid patient")
 
-    tx = _build_tx(
+    # Anchored later with the next batch root: no transaction hash yet
+    if ANCHOR_MODE == "merkle":
+        merkle_anchor.queue_record(patient, cid, record_type)
+        save_filename(cid, filename)
+        return None
+
+    tx_hash = _send_tx(
         medical_records_contract.functions.addRecord(
             Web3.to_checksum_address(patient),
             cid,
@@ -177,8 +794,6 @@ def add_record(patient, cid, record_type, filename):
         )
     )
 
-    tx_hash = _send_tx(tx)
-
     save_filename(cid, filename)
 
     return tx_hash
@@ -186,19 +801,19 @@ def add_record(patient, cid, record_type, filename):
 
 def grant_access(patient, doctor):
 
-    tx = _build_tx(
+    tx_hash = _send_tx(
         access_control_contract.functions.grantPermanentAccess(
             Web3.to_checksum_address(doctor)
         ),
         gas=200000
     )
 
-    return _send_tx(tx)
+    return _invalidate_access(tx_hash, patient, doctor)
 
 
 def grant_temporary_access(patient, doctor, duration):
 
-    tx = _build_tx(
+    tx_hash = _send_tx(
         access_control_contract.functions.grantTemporaryAccess(
             Web3.to_checksum_address(doctor),
             duration
@@ -206,19 +821,19 @@ def grant_temporary_access(patient, doctor, duration):
         gas=200000
     )
 
-    return _send_tx(tx)
+    return _invalidate_access(tx_hash, patient, doctor)
 
 
 def revoke_access(patient, doctor):
 
-    tx = _build_tx(
+    tx_hash = _send_tx(
         access_control_contract.functions.revokeAccess(
             Web3.to_checksum_address(doctor)
         ),
         gas=200000
     )
 
-    return _send_tx(tx)
+    return _invalidate_access(tx_hash, patient, doctor)
 
 
 # ===============================
@@ -234,7 +849,7 @@ def grant_with_signature(
     signature
 ):
 
-    tx = _build_tx(
+    tx_hash = _send_tx(
         access_control_contract.functions.grantWithSignature(
             Web3.to_checksum_address(patient),
             Web3.to_checksum_address(doctor),
@@ -245,7 +860,7 @@ def grant_with_signature(
         )
     )
 
-    return _send_tx(tx)
+    return _invalidate_access(tx_hash, patient, doctor)
 
 
 def revoke_with_signature(
@@ -255,7 +870,7 @@ def revoke_with_signature(
     signature
 ):
 
-    tx = _build_tx(
+    tx_hash = _send_tx(
         access_control_contract.functions.revokeWithSignature(
             Web3.to_checksum_address(patient),
             Web3.to_checksum_address(doctor),
@@ -264,7 +879,7 @@ def revoke_with_signature(
         )
     )
 
-    return _send_tx(tx)
+    return _invalidate_access(tx_hash, patient, doctor)
 
 
 # ===============================
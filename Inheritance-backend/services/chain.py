@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+from web3 import Web3
+
+from services.rpc_pool import PooledProvider, pool
+
+
+# ===============================
+# LAZY CLIENT / CONTRACT REGISTRY
+# ===============================
+#
+# Nothing here touches the network when imported or constructed: the
+# provider opens its first connection on the first request. Readiness
+# is checked separately (and cached) by `ping`.
+
+CONTRACTS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "contracts"
+)
+
+# Cached health answer lifetime
+PING_MAX_AGE = 5.0
+
+# Consecutive failed pings before the provider (and its HTTP
+# connections) is rebuilt
+RECONNECT_AFTER = 3
+
+
+@lru_cache(maxsize=None)
+def load_abi(name):
+
+    with open(os.path.join(CONTRACTS_DIR, f"{name}.json")) as f:
+        return json.load(f)["abi"]
+
+
+class ChainClient:
+
+    def __init__(self, rpc_pool=pool):
+
+        self.pool = rpc_pool
+
+        self._w3 = None
+        self._contracts = {}
+        self._lock = threading.Lock()
+
+        self._healthy = None
+        self._checked_at = 0.0
+        self._failures = 0
+        self.last_error = None
+
+    def _provider(self):
+
+        return PooledProvider(self.pool)
+
+    @property
+    def w3(self):
+
+        if self._w3 is None:
+            with self._lock:
+                if self._w3 is None:
+                    self._w3 = Web3(self._provider())
+
+        return self._w3
+
+    def contract(self, name, address):
+        """
+        Contract `name` (ABI from contracts/<name>.json), built once
+        """
+
+        key = (name, address)
+
+        if key not in self._contracts:
+            self._contracts[key] = self.w3.eth.contract(
+                address=Web3.to_checksum_address(address) if address else None,
+                abi=load_abi(name)
+            )
+
+        return self._contracts[key]
+
+    def ping(self, max_age=PING_MAX_AGE):
+        """
+        True when the RPC answers; rebuilds the provider (fresh HTTP
+        session) after repeated failures
+        """
+
+        if self._healthy is not None and time.time() - self._checked_at < max_age:
+            return self._healthy
+
+        try:
+            self.w3.eth.block_number
+            self._healthy = True
+            self._failures = 0
+            self.last_error = None
+
+        except Exception as e:
+            self._healthy = False
+            self._failures += 1
+            self.last_error = str(e)
+
+            if self._failures >= RECONNECT_AFTER:
+                print("⚠️ RPC unhealthy, reconnecting:", e)
+
+                # Swapped in place: every holder of `w3` follows
+                self.w3.provider = self._provider()
+                self._failures = 0
+
+        self._checked_at = time.time()
+
+        return self._healthy
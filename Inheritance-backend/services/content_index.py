@@ -0,0 +1,52 @@
+import time
+
+from services.db import get_connection
+
+
+# ===============================
+# UPLOAD DEDUPLICATION
+# ===============================
+#
+# Maps (patient, keyed plaintext fingerprint) -> CID of a record that
+# is already pinned and whose record transaction was broadcast, so
+# re-uploading the same document for the same patient can reuse it
+# instead of pinning a new ciphertext (every encryption uses a fresh
+# key, so the CIDs differ).
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_index (
+    patient    TEXT NOT NULL,
+    digest     TEXT NOT NULL,
+    cid        TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    PRIMARY KEY (patient, digest)
+);
+"""
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+def find_cid(patient, digest):
+
+    row = get_connection().execute(
+        "SELECT cid FROM content_index WHERE patient = ? AND digest = ?",
+        (patient.lower(), digest)
+    ).fetchone()
+
+    return row["cid"] if row else None
+
+
+def save_cid(patient, digest, cid):
+
+    conn = get_connection()
+
+    # First upload wins: later duplicates keep pointing at it
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO content_index (patient, digest, cid, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (patient.lower(), digest, cid, int(time.time()))
+        )
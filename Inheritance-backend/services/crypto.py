@@ -1,5 +1,445 @@
-from cryptography.fernet import Fernet
+import base64
+import hashlib
+import hmac
+import os
+import struct
+from functools import lru_cache
 
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+# ===============================
+# CHUNKED FORMAT (v2)
+# ===============================
+#
+# header: MAGIC | version (1) | flags (1) | chunk_size (4) | salt (16)
+# then one AES-256-GCM segment per chunk_size bytes of plaintext.
+#
+# Each file is encrypted under its own key, derived from the given key
+# and the random salt, so nonces never repeat across files. Segment i
+# uses nonce = 0 (7) | i (4) | last (1) and the header as associated
+# data, so segments cannot be reordered, dropped or truncated. Every
+# segment but the last holds exactly chunk_size bytes, which makes the
+# ciphertext seekable.
+#
+# v1 files (header: ... | chunk_size (4) | nonce_prefix (7)) used the
+# derived stream key directly with a random nonce prefix; they are still
+# decrypted, never written.
+#
+# flags: FLAG_ENVELOPE marks a record encrypted with the patient's data
+# key instead of the master key. Being part of the header, the flag is
+# authenticated like the rest of it.
+
+MAGIC = b"MBE1"
+VERSION = 2
+
+FLAG_ENVELOPE = 0x01
+
+_HEADERS = {
+    1: struct.Struct(">4sBBI7s"),
+    2: struct.Struct(">4sBBI16s")
+}
+
+HEADER_LEN = _HEADERS[VERSION].size
+
+# Bytes to read to be sure to hold the header of any version
+MAX_HEADER_LEN = max(h.size for h in _HEADERS.values())
+
+TAG_LEN = 16
+SALT_LEN = 16
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_ZERO_PREFIX = bytes(7)
+
+
+@lru_cache(maxsize=32)
+def _derive(key: bytes, info: bytes) -> bytes:
+    """
+    Derive a purpose-bound 256-bit key from a Fernet-format master key
+    """
+
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=info
+    ).derive(base64.urlsafe_b64decode(key))
+
+
+def _stream_key(key: bytes) -> bytes:
+
+    return _derive(key, b"medblocks/record-stream/v1")
+
+
+def _file_key(key: bytes, salt: bytes) -> bytes:
+    """
+    Per-file stream key (v2)
+    """
+
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=b"medblocks/record-stream/v2"
+    ).derive(base64.urlsafe_b64decode(key))
+
+
+def content_hasher(key: bytes):
+    """
+    Keyed plaintext fingerprint (HMAC-SHA256) for duplicate detection;
+    unlike a bare hash it reveals nothing about known documents
+    """
+
+    return hmac.new(_derive(key, b"medblocks/content-hash/v1"), digestmod=hashlib.sha256)
+
+
+def _nonce(prefix: bytes, index: int, last: bool) -> bytes:
+
+    return prefix + struct.pack(">IB", index, int(last))
+
+
+def is_chunked(data: bytes) -> bool:
+    """
+    True for the chunked format, False for legacy Fernet tokens
+    """
+
+    return data[:len(MAGIC)] == MAGIC
+
+
+def encrypted_size(
+    plain_size: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    header_len: int = HEADER_LEN
+) -> int:
+    """
+    Exact ciphertext length for a plaintext of `plain_size` bytes
+    """
+
+    chunks = max(1, -(-plain_size // chunk_size))
+
+    return header_len + plain_size + chunks * TAG_LEN
+
+
+# ===============================
+# SEEKING (byte ranges)
+# ===============================
+
+def header_length(data: bytes) -> int:
+    """
+    Length of the chunked-format header `data` starts with
+    """
+
+    header = _HEADERS.get(data[len(MAGIC)]) if len(data) > len(MAGIC) else None
+
+    if data[:len(MAGIC)] != MAGIC or header is None:
+        raise ValueError("Not a MEDBLOCKS encrypted stream")
+
+    return header.size
+
+
+def parse_header(header: bytes) -> int:
+    """
+    Validate a chunked-format header and return its chunk size
+    """
+
+    length = header_length(header)
+
+    if len(header) < length:
+        raise ValueError("Truncated encrypted stream header")
+
+    _magic, _version, _flags, chunk_size, _rest = _HEADERS[header[len(MAGIC)]].unpack(
+        header[:length]
+    )
+
+    return chunk_size
+
+
+def header_flags(header: bytes) -> int:
+
+    parse_header(header)
+
+    return header[len(MAGIC) + 1]
+
+
+def segment_count(cipher_size: int, chunk_size: int, header_len: int = HEADER_LEN) -> int:
+
+    return -(-(cipher_size - header_len) // (chunk_size + TAG_LEN))
+
+
+def plaintext_size(cipher_size: int, chunk_size: int, header_len: int = HEADER_LEN) -> int:
+    """
+    Plaintext length of a ciphertext of `cipher_size` bytes
+    """
+
+    segments = segment_count(cipher_size, chunk_size, header_len)
+
+    return cipher_size - header_len - segments * TAG_LEN
+
+
+def ciphertext_range(
+    start: int,
+    end: int,
+    chunk_size: int,
+    cipher_size: int,
+    header_len: int = HEADER_LEN
+):
+    """
+    Segments covering plaintext bytes [start, end] (inclusive)
+
+    Returns (first_segment, cipher_start, cipher_end), cipher_end inclusive.
+    """
+
+    segment = chunk_size + TAG_LEN
+
+    first = start // chunk_size
+    last = end // chunk_size
+
+    cipher_start = header_len + first * segment
+    cipher_end = min(header_len + (last + 1) * segment, cipher_size) - 1
+
+    return first, cipher_start, cipher_end
+
+
+def _keying(key: bytes, header: bytes):
+    """
+    (AEAD, nonce prefix) for the stream with this header
+    """
+
+    if header[len(MAGIC)] == 1:
+        return AESGCM(_stream_key(key)), header[-7:]
+
+    return AESGCM(_file_key(key, header[-SALT_LEN:])), _ZERO_PREFIX
+
+
+class StreamEncryptor:
+    """
+    Incremental encryptor: feed plaintext with `update`, then `finalize`
+    """
+
+    def __init__(
+        self,
+        key: bytes,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        flags: int = 0
+    ):
+
+        self._chunk_size = chunk_size
+
+        self.header = _HEADERS[VERSION].pack(
+            MAGIC, VERSION, flags, chunk_size, os.urandom(SALT_LEN)
+        )
+
+        self._aead, self._prefix = _keying(key, self.header)
+
+        self._buffer = bytearray()
+        self._index = 0
+
+    def _seal(self, chunk: bytes, last: bool) -> bytes:
+
+        sealed = self._aead.encrypt(
+            _nonce(self._prefix, self._index, last),
+            chunk,
+            self.header
+        )
+        self._index += 1
+
+        return sealed
+
+    def update(self, data: bytes) -> bytes:
+
+        self._buffer += data
+        out = []
+
+        # Keep at least one byte back: only finalize knows the last chunk
+        while len(self._buffer) > self._chunk_size:
+            out.append(self._seal(bytes(self._buffer[:self._chunk_size]), False))
+            del self._buffer[:self._chunk_size]
+
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+
+        last = self._seal(bytes(self._buffer), True)
+        self._buffer.clear()
+
+        return last
+
+
+class StreamDecryptor:
+    """
+    Incremental decryptor for the chunked format.
+
+    `key` may be a list of candidate keys (e.g. current and previous
+    master keys): the first segment opened picks the one it
+    authenticates under.
+
+    To decrypt a byte range, pass the stream `header`, the index of the
+    first segment fed and the stream's `total_chunks`.
+    """
+
+    def __init__(
+        self,
+        key: bytes,
+        header: bytes | None = None,
+        first_chunk: int = 0,
+        total_chunks: int | None = None
+    ):
+
+        self._keys = key if isinstance(key, list) else [key]
+        self._candidates = None
+        self._header = None
+        self._chunk_size = None
+
+        self._buffer = bytearray()
+        self._index = first_chunk
+        self._total = total_chunks
+
+        if header is not None:
+            self._read_header(header)
+
+    def _read_header(self, header: bytes):
+
+        self._chunk_size = parse_header(header)
+        self._header = header[:header_length(header)]
+        self._candidates = [_keying(k, self._header) for k in self._keys]
+
+    def _open(self, sealed: bytes, last: bool) -> bytes:
+
+        for aead, prefix in self._candidates:
+            try:
+                plain = aead.decrypt(
+                    _nonce(prefix, self._index, last),
+                    sealed,
+                    self._header
+                )
+            except InvalidTag:
+                continue
+
+            # Key found: later segments use it alone
+            self._candidates = [(aead, prefix)]
+            self._index += 1
+
+            return plain
+
+        raise InvalidTag()
+
+    def update(self, data: bytes) -> bytes:
+
+        self._buffer += data
+
+        if self._header is None:
+            if len(self._buffer) <= len(MAGIC):
+                return b""
+
+            length = header_length(bytes(self._buffer[:len(MAGIC) + 1]))
+
+            if len(self._buffer) < length:
+                return b""
+
+            self._read_header(bytes(self._buffer[:length]))
+            del self._buffer[:length]
+
+        segment = self._chunk_size + TAG_LEN
+        out = []
+
+        while len(self._buffer) > segment:
+            out.append(self._open(bytes(self._buffer[:segment]), False))
+            del self._buffer[:segment]
+
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+
+        if self._header is None or len(self._buffer) < TAG_LEN:
+            raise ValueError("Truncated encrypted stream")
+
+        # Unknown total: the stream was read to its end
+        last = self._total is None or self._index == self._total - 1
+
+        plain = self._open(bytes(self._buffer), last)
+        self._buffer.clear()
+
+        return plain
+
+
+def encrypt_stream(
+    chunks,
+    key: bytes,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    flags: int = 0
+):
+    """
+    Encrypt an iterable of plaintext blocks, yielding ciphertext blocks
+    """
+
+    encryptor = StreamEncryptor(key, chunk_size, flags)
+
+    yield encryptor.header
+
+    for chunk in chunks:
+        sealed = encryptor.update(chunk)
+
+        if sealed:
+            yield sealed
+
+    yield encryptor.finalize()
+
+
+def _fernet(key):
+
+    if isinstance(key, list):
+        return MultiFernet([Fernet(k) for k in key])
+
+    return Fernet(key)
+
+
+def decrypt_stream(chunks, key: bytes):
+    """
+    Decrypt an iterable of ciphertext blocks, yielding plaintext blocks
+    """
+
+    decryptor = StreamDecryptor(key)
+
+    for chunk in chunks:
+        plain = decryptor.update(chunk)
+
+        if plain:
+            yield plain
+
+    yield decryptor.finalize()
+
+
+def decrypt_bytes(data: bytes, key: bytes) -> bytes:
+    """
+    Decrypt a whole blob in either format (chunked or legacy Fernet).
+    `key` may be a list of candidate keys.
+    """
+
+    if not is_chunked(data):
+        return _fernet(key).decrypt(data)
+
+    return b"".join(decrypt_stream([data], key))
+
+
+def iter_file(f, block_size: int = DEFAULT_CHUNK_SIZE):
+
+    while True:
+        block = f.read(block_size)
+
+        if not block:
+            break
+
+        yield block
+
+
+# ===============================
+# KEYS / FILES
+# ===============================
 
 def generate_key() -> bytes:
     """
@@ -8,31 +448,63 @@ def generate_key() -> bytes:
     return Fernet.generate_key()
 
 
-def encrypt_file(input_path: str, output_path: str, key: bytes):
+# Wrapped data key: nonce (12) | AES-256-GCM(data key) (32 + 16)
+_WRAP_NONCE_LEN = 12
+
+
+def key_id(master_key: bytes) -> str:
     """
-    Encrypt a file using Fernet (AES)
+    Short public identifier of a master key, to tell which one wrapped
+    a data key
     """
-    fernet = Fernet(key)
 
-    with open(input_path, "rb") as f:
-        data = f.read()
+    return _derive(master_key, b"medblocks/key-id/v1")[:8].hex()
+
+
+def wrap_key(master_key: bytes, data_key: bytes, context: bytes) -> bytes:
+    """
+    Encrypt a Fernet-format data key under the master key. `context`
+    (e.g. the patient address) must be given again to unwrap it.
+    """
 
-    encrypted_data = fernet.encrypt(data)
+    nonce = os.urandom(_WRAP_NONCE_LEN)
+    aead = AESGCM(_derive(master_key, b"medblocks/key-wrap/v1"))
 
-    with open(output_path, "wb") as f:
-        f.write(encrypted_data)
+    return nonce + aead.encrypt(nonce, base64.urlsafe_b64decode(data_key), context)
+
+
+def unwrap_key(master_key: bytes, wrapped: bytes, context: bytes) -> bytes:
+
+    aead = AESGCM(_derive(master_key, b"medblocks/key-wrap/v1"))
+    raw = aead.decrypt(wrapped[:_WRAP_NONCE_LEN], wrapped[_WRAP_NONCE_LEN:], context)
+
+    return base64.urlsafe_b64encode(raw)
+
+
+def encrypt_file(input_path: str, output_path: str, key: bytes):
+    """
+    Encrypt a file with chunked AES-GCM, streaming (bounded memory)
+    """
+
+    with open(input_path, "rb") as src, open(output_path, "wb") as dst:
+        for block in encrypt_stream(iter_file(src), key):
+            dst.write(block)
 
 
 def decrypt_file(input_path: str, output_path: str, key: bytes):
     """
-    Decrypt a file using Fernet (AES)
+    Decrypt a file in either format (chunked or legacy Fernet)
     """
-    fernet = Fernet(key)
 
-    with open(input_path, "rb") as f:
-        encrypted_data = f.read()
+    with open(input_path, "rb") as src:
+        is_new = is_chunked(src.read(len(MAGIC)))
+        src.seek(0)
+
+        with open(output_path, "wb") as dst:
 
-    decrypted_data = fernet.decrypt(encrypted_data)
+            if not is_new:
+                dst.write(_fernet(key).decrypt(src.read()))
+                return
 
-    with open(output_path, "wb") as f:
-        f.write(decrypted_data)
+            for block in decrypt_stream(iter_file(src), key):
+                dst.write(block)
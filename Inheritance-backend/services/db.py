@@ -0,0 +1,40 @@
+import os
+import sqlite3
+import threading
+
+from config import DB_PATH
+
+
+# ===============================
+# SQLITE CONNECTIONS
+# ===============================
+
+# One connection per thread (sqlite3 objects are not thread safe)
+_local = threading.local()
+
+
+def get_connection():
+    """
+    Return this thread's connection to the local SQLite store
+    """
+
+    conn = getattr(_local, "conn", None)
+
+    if conn is not None:
+        return conn
+
+    folder = os.path.dirname(DB_PATH)
+
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+
+    # WAL lets readers (API workers) run alongside the indexer writer
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    _local.conn = conn
+
+    return conn
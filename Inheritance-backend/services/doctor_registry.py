@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+
+from web3 import Web3
+
+from services.db import get_connection
+
+
+# Pre-SQLite registry, imported once
+LEGACY_DOCTORS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "data",
+    "doctors.json"
+)
+
+
+# ===============================
+# SCHEMA
+# ===============================
+
+# wallet_key (lower-cased wallet) is unique, so concurrent workers can
+# never register the same doctor twice. Ids are never reused.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS doctors (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    name       TEXT NOT NULL,
+    wallet     TEXT NOT NULL,
+    wallet_key TEXT NOT NULL UNIQUE,
+    created_at INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+def migrate_doctors_json(path=LEGACY_DOCTORS_FILE):
+    """
+    Import the legacy doctors.json once, keeping its ids; later runs
+    are a no-op
+    """
+
+    conn = get_connection()
+
+    done = conn.execute(
+        "SELECT value FROM store_meta WHERE key = 'doctors_migrated'"
+    ).fetchone()
+
+    if done or not os.path.exists(path):
+        return 0
+
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except ValueError as e:
+        print("⚠️ Could not read", path, e)
+        data = []
+
+    rows = [
+        d for d in data if isinstance(d, dict)
+        and d.get("name") and Web3.is_address(d.get("wallet", ""))
+    ] if isinstance(data, list) else []
+
+    now = int(time.time())
+
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO doctors (id, name, wallet, wallet_key, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (d.get("id"), d["name"], d["wallet"], d["wallet"].lower(), now)
+                for d in rows
+            ]
+        )
+
+        conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) "
+            "VALUES ('doctors_migrated', ?)",
+            (str(now),)
+        )
+
+        _bump_version(conn)
+
+    print(f"✅ Migrated {len(rows)} doctors from {path}")
+
+    return len(rows)
+
+
+# ===============================
+# READ REPLICA
+# ===============================
+#
+# The registry is read on every listing and access count, and changes
+# rarely. Each worker keeps it in memory and reloads it when the
+# version row, bumped in the same transaction as every write, moves.
+
+_replica = {"version": None, "doctors": [], "by_wallet": {}}
+_lock = threading.Lock()
+
+
+def _bump_version(conn):
+
+    conn.execute(
+        "INSERT INTO store_meta (key, value) VALUES ('doctors_version', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+
+
+def _snapshot():
+
+    conn = get_connection()
+
+    row = conn.execute(
+        "SELECT value FROM store_meta WHERE key = 'doctors_version'"
+    ).fetchone()
+    version = row["value"] if row else None
+
+    with _lock:
+        if version is not None and version == _replica["version"]:
+            return _replica
+
+    rows = conn.execute(
+        "SELECT id, name, wallet FROM doctors ORDER BY id"
+    ).fetchall()
+
+    doctors = [dict(r) for r in rows]
+
+    with _lock:
+        _replica["version"] = version
+        _replica["doctors"] = doctors
+        _replica["by_wallet"] = {d["wallet"].lower(): d for d in doctors}
+
+        return _replica
+
+
+def _invalidate():
+
+    with _lock:
+        _replica["version"] = None
+
+
+# ===============================
+# WRITES
+# ===============================
+
+def add_doctor(name, wallet):
+    """
+    Register a doctor; returns (doctor, created). An already registered
+    wallet returns the existing entry.
+    """
+
+    conn = get_connection()
+
+    with conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO doctors (name, wallet, wallet_key, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (name, wallet, wallet.lower(), int(time.time()))
+        )
+
+        created = cur.rowcount == 1
+
+        if created:
+            _bump_version(conn)
+
+    if created:
+        _invalidate()
+
+    return get_doctor(wallet), created
+
+
+# ===============================
+# QUERIES
+# ===============================
+
+def get_doctor(wallet):
+
+    return _snapshot()["by_wallet"].get(wallet.lower())
+
+
+def list_doctors(query=None, offset=0, limit=None):
+    """
+    Doctors by id, optionally filtered by a name or wallet substring;
+    returns (page, total matches)
+    """
+
+    doctors = _snapshot()["doctors"]
+
+    if query:
+        q = query.lower()
+        doctors = [
+            d for d in doctors
+            if q in d["name"].lower() or q in d["wallet"].lower()
+        ]
+
+    end = None if limit is None else offset + limit
+
+    return doctors[offset:end], len(doctors)
+
+
+def wallets():
+
+    return [d["wallet"] for d in _snapshot()["doctors"]]
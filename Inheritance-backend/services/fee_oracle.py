@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+from collections import deque
+
+from config import (
+    FEE_HISTORY_BLOCKS,
+    FEE_PRIORITY_PERCENTILE,
+    FEE_CACHE_SECONDS,
+    MAX_FEE_GWEI,
+    GAS_MARGIN
+)
+
+
+# EIP-1559 replacement rule: both fees must rise by at least 10%
+BUMP_FACTOR = 1.125
+
+
+# ===============================
+# FEE ORACLE
+# ===============================
+
+class FeeOracle:
+    """
+    EIP-1559 fee suggestions from `eth_feeHistory`.
+
+    Keeps a sliding window of the last FEE_HISTORY_BLOCKS blocks (base
+    fee, tip at FEE_PRIORITY_PERCENTILE) and only asks the node for the
+    blocks added since the previous refresh. Results are cached for
+    FEE_CACHE_SECONDS.
+    """
+
+    def __init__(self, w3):
+
+        self.w3 = w3
+
+        self._window = deque(maxlen=FEE_HISTORY_BLOCKS)
+        self._last_block = None
+        self._next_base_fee = None
+
+        self._fees = None
+        self._fetched_at = 0.0
+
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+
+        head = self.w3.eth.block_number
+
+        if self._last_block is not None and head <= self._last_block:
+            return
+
+        count = FEE_HISTORY_BLOCKS
+
+        if self._last_block is not None:
+            count = min(count, head - self._last_block)
+
+        history = self.w3.eth.fee_history(
+            count,
+            head,
+            [FEE_PRIORITY_PERCENTILE]
+        )
+
+        base_fees = history["baseFeePerGas"]
+        rewards = history.get("reward") or []
+
+        for i, base_fee in enumerate(base_fees[:count]):
+            tip = rewards[i][0] if i < len(rewards) and rewards[i] else None
+            self._window.append((base_fee, tip))
+
+        # The node appends the base fee of the block after `head`
+        if len(base_fees) > count:
+            self._next_base_fee = base_fees[-1]
+        else:
+            self._next_base_fee = math.ceil(base_fees[-1] * BUMP_FACTOR)
+
+        self._last_block = head
+
+    def _priority_fee(self):
+
+        tips = sorted(t for _, t in self._window if t)
+
+        if tips:
+            return tips[len(tips) // 2]
+
+        # Empty blocks carry no tips: ask the node instead
+        return self.w3.eth.max_priority_fee
+
+    def fees(self):
+        """
+        (maxFeePerGas, maxPriorityFeePerGas) in wei
+        """
+
+        with self._lock:
+            if self._fees and time.time() - self._fetched_at < FEE_CACHE_SECONDS:
+                return self._fees
+
+            try:
+                self._refresh()
+                priority = self._priority_fee()
+
+                # Room for the base fee to double before the tx is priced out
+                max_fee = 2 * self._next_base_fee + priority
+
+            except Exception as e:
+                print("⚠️ Fee history unavailable, using gas price:", e)
+
+                priority = self.w3.eth.max_priority_fee
+                max_fee = self.w3.eth.gas_price + priority
+
+            cap = self.w3.to_wei(MAX_FEE_GWEI, "gwei")
+
+            self._fees = (min(max_fee, cap), min(priority, cap))
+            self._fetched_at = time.time()
+
+            return self._fees
+
+    def bumped(self, tx):
+        """
+        Fee fields for a replacement of `tx`: at least BUMP_FACTOR over
+        the old fees and never below the current suggestion
+        """
+
+        max_fee, priority = self.fees()
+        cap = self.w3.to_wei(MAX_FEE_GWEI, "gwei")
+
+        priority = max(priority, math.ceil(tx["maxPriorityFeePerGas"] * BUMP_FACTOR))
+        max_fee = max(max_fee, math.ceil(tx["maxFeePerGas"] * BUMP_FACTOR))
+
+        if max_fee > cap:
+            raise RuntimeError(f"Replacement fee would exceed {MAX_FEE_GWEI} gwei")
+
+        return {
+            "maxFeePerGas": max_fee,
+            "maxPriorityFeePerGas": min(priority, max_fee)
+        }
+
+
+def with_margin(gas):
+
+    return int(gas * GAS_MARGIN)
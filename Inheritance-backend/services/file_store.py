@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.db import get_connection
+
+
+# Pre-SQLite CID -> filename map, imported once
+LEGACY_FILE_MAP = "file_map.json"
+
+# Filenames kept in the in-process read cache
+CACHE_SIZE = 50000
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+# ===============================
+# SCHEMA
+# ===============================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_names (
+    cid        TEXT PRIMARY KEY,
+    filename   TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# ===============================
+# READ CACHE
+# ===============================
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cid):
+
+    with _cache_lock:
+        if cid not in _cache:
+            return None
+
+        _cache.move_to_end(cid)
+        return _cache[cid]
+
+
+def _cache_put(cid, filename):
+
+    with _cache_lock:
+        _cache[cid] = filename
+        _cache.move_to_end(cid)
+
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+# ===============================
+# SETUP / MIGRATION
+# ===============================
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+def migrate_file_map(path=LEGACY_FILE_MAP):
+    """
+    Import the legacy file_map.json once; later runs are a no-op
+    """
+
+    conn = get_connection()
+
+    done = conn.execute(
+        "SELECT value FROM store_meta WHERE key = 'file_map_migrated'"
+    ).fetchone()
+
+    if done or not os.path.exists(path):
+        return 0
+
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    now = int(time.time())
+
+    with conn:
+        # Existing rows win: they were written after the JSON map
+        conn.executemany(
+            "INSERT OR IGNORE INTO file_names (cid, filename, created_at) "
+            "VALUES (?, ?, ?)",
+            [(cid, name, now) for cid, name in data.items()]
+        )
+
+        conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) "
+            "VALUES ('file_map_migrated', ?)",
+            (str(now),)
+        )
+
+    print(f"✅ Migrated {len(data)} entries from {path}")
+
+    return len(data)
+
+
+# ===============================
+# WRITES
+# ===============================
+
+def save_filename(cid, filename):
+
+    conn = get_connection()
+
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO file_names (cid, filename, created_at) "
+            "VALUES (?, ?, ?)",
+            (cid, filename, int(time.time()))
+        )
+
+    _cache_put(cid, filename)
+
+
+# ===============================
+# LOOKUPS
+# ===============================
+
+def get_filename(cid):
+
+    return get_filenames([cid]).get(cid)
+
+
+def get_filenames(cids):
+    """
+    Batched lookup: {cid: filename} for the CIDs that are known
+    """
+
+    found = {}
+    missing = []
+
+    for cid in set(cids):
+        name = _cache_get(cid)
+
+        if name is None:
+            missing.append(cid)
+        else:
+            found[cid] = name
+
+    conn = get_connection()
+
+    for start in range(0, len(missing), _LOOKUP_CHUNK):
+
+        chunk = missing[start:start + _LOOKUP_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+
+        rows = conn.execute(
+            f"SELECT cid, filename FROM file_names WHERE cid IN ({placeholders})",
+            chunk
+        ).fetchall()
+
+        for row in rows:
+            found[row["cid"]] = row["filename"]
+            _cache_put(row["cid"], row["filename"])
+
+    return found
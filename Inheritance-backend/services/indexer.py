@@ -0,0 +1,282 @@
+import threading
+import time
+
+from eth_utils import event_abi_to_log_topic
+
+from config import (
+    INDEXER_START_BLOCK,
+    INDEXER_BATCH_BLOCKS,
+    INDEXER_POLL_SECONDS,
+    INDEXER_REORG_DEPTH
+)
+from services.db import get_connection
+
+
+# ===============================
+# SCHEMA
+# ===============================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexer_cursor (
+    name  TEXT PRIMARY KEY,
+    block INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS indexer_blocks (
+    name   TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    hash   TEXT NOT NULL,
+    PRIMARY KEY (name, number)
+);
+"""
+
+
+def _hex(value):
+
+    value = value.hex() if hasattr(value, "hex") else str(value)
+
+    return value if value.startswith("0x") else "0x" + value
+
+
+# ===============================
+# EVENT INDEXER
+# ===============================
+
+class EventIndexer:
+    """
+    Follows contract events into the local store.
+
+    Progress is checkpointed per indexer name, and the hashes of recently
+    indexed blocks are kept so a chain reorganisation can be detected and
+    rolled back with `on_rollback(conn, block)`. `on_commit()` runs after
+    every committed batch, for projections that mirror the store in memory.
+    """
+
+    def __init__(
+        self,
+        name,
+        w3,
+        contract,
+        event_names,
+        on_log,
+        on_rollback,
+        on_commit=None
+    ):
+
+        self.name = name
+        self.w3 = w3
+        self.contract = contract
+        self.on_log = on_log
+        self.on_rollback = on_rollback
+        self.on_commit = on_commit
+
+        self.events = {}
+
+        for event_name in event_names:
+            event = contract.events[event_name]()
+            self.events[event_abi_to_log_topic(event.abi)] = event
+
+        self.head_block = None
+        self.synced_block = None
+        self.last_poll = 0.0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        conn = get_connection()
+        conn.executescript(_SCHEMA)
+
+    # ---------- cursor ----------
+
+    def _get_cursor(self, conn):
+
+        row = conn.execute(
+            "SELECT block FROM indexer_cursor WHERE name = ?",
+            (self.name,)
+        ).fetchone()
+
+        return row["block"] if row else INDEXER_START_BLOCK - 1
+
+    def _set_cursor(self, conn, block):
+
+        conn.execute(
+            "INSERT OR REPLACE INTO indexer_cursor (name, block) VALUES (?, ?)",
+            (self.name, block)
+        )
+
+    def _remember_block(self, conn, number, block_hash):
+
+        conn.execute(
+            "INSERT OR REPLACE INTO indexer_blocks (name, number, hash) "
+            "VALUES (?, ?, ?)",
+            (self.name, number, _hex(block_hash))
+        )
+
+    # ---------- reorg handling ----------
+
+    def _common_ancestor(self, conn, cursor):
+        """
+        Newest remembered block that is still on the canonical chain
+        """
+
+        rows = conn.execute(
+            "SELECT number, hash FROM indexer_blocks "
+            "WHERE name = ? AND number <= ? ORDER BY number DESC",
+            (self.name, cursor)
+        ).fetchall()
+
+        if not rows:
+            return cursor
+
+        for row in rows:
+            block = self.w3.eth.get_block(row["number"])
+
+            if _hex(block["hash"]) == row["hash"]:
+                return row["number"]
+
+        # Deeper than we track: rebuild the whole remembered window
+        print(f"⚠️ {self.name} indexer: reorg deeper than {INDEXER_REORG_DEPTH} blocks")
+
+        return rows[-1]["number"] - 1
+
+    def _rollback(self, conn, block):
+
+        with conn:
+            self.on_rollback(conn, block)
+
+            conn.execute(
+                "DELETE FROM indexer_blocks WHERE name = ? AND number > ?",
+                (self.name, block)
+            )
+
+            self._set_cursor(conn, block)
+
+        if self.on_commit:
+            self.on_commit()
+
+    # ---------- polling ----------
+
+    def run_once(self):
+        """
+        Index the next batch of blocks.
+
+        Returns True once the cursor has reached the chain head.
+        """
+
+        conn = get_connection()
+
+        head = self.w3.eth.block_number
+        self.head_block = head
+
+        cursor = self._get_cursor(conn)
+
+        if cursor >= INDEXER_START_BLOCK:
+            ancestor = self._common_ancestor(conn, cursor)
+
+            if ancestor < cursor:
+                print(f"⚠️ {self.name} indexer: reorg, rolling back to block {ancestor}")
+                self._rollback(conn, ancestor)
+                cursor = ancestor
+
+        if cursor >= head:
+            self.synced_block = cursor
+            self.last_poll = time.time()
+            return True
+
+        from_block = cursor + 1
+        to_block = min(head, cursor + INDEXER_BATCH_BLOCKS)
+
+        # Hash first: if the chain moves under us the next poll sees it
+        to_hash = self.w3.eth.get_block(to_block)["hash"]
+
+        logs = self.w3.eth.get_logs({
+            "address": self.contract.address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [[_hex(topic) for topic in self.events]]
+        })
+
+        with conn:
+            for log in logs:
+                event = self.events.get(bytes(log["topics"][0]))
+
+                if event is None:
+                    continue
+
+                self.on_log(conn, event.process_log(log))
+                self._remember_block(conn, log["blockNumber"], log["blockHash"])
+
+            self._remember_block(conn, to_block, to_hash)
+
+            conn.execute(
+                "DELETE FROM indexer_blocks WHERE name = ? AND number < ?",
+                (self.name, to_block - INDEXER_REORG_DEPTH)
+            )
+
+            self._set_cursor(conn, to_block)
+
+        if self.on_commit:
+            self.on_commit()
+
+        self.synced_block = to_block
+        self.last_poll = time.time()
+
+        return to_block >= head
+
+    def lag(self):
+        """
+        Blocks between the chain head and the indexed cursor
+        """
+
+        if self.head_block is None or self.synced_block is None:
+            return None
+
+        return max(self.head_block - self.synced_block, 0)
+
+    def is_ready(self, max_lag=0):
+        """
+        True when the index is within `max_lag` blocks of the head
+        and still being followed
+        """
+
+        if self.synced_block is None or self.lag() > max_lag:
+            return False
+
+        # A dead follower must not keep serving a stale index
+        return time.time() - self.last_poll < INDEXER_POLL_SECONDS * 3 + 30
+
+    # ---------- background thread ----------
+
+    def _run(self):
+
+        while not self._stop.is_set():
+
+            try:
+                caught_up = self.run_once()
+            except Exception as e:
+                print(f"❌ {self.name} indexer error:", e)
+                caught_up = True
+
+            if caught_up:
+                self._stop.wait(INDEXER_POLL_SECONDS)
+
+    def start(self):
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"{self.name}-indexer",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+
+        self._stop.set()
+
+        if self._thread:
+            self._thread.join(timeout=10)
@@ -0,0 +1,270 @@
+import base64
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from config import IPFS_GATEWAYS, IPFS_HEDGE_DELAY_SECONDS, IPFS_TIMEOUT_SECONDS
+from services import metrics
+
+
+# ===============================
+# HEDGED MULTI-GATEWAY RETRIEVAL
+# ===============================
+#
+# A request goes to the best-ranked gateway first. If it has not
+# answered within IPFS_HEDGE_DELAY_SECONDS, the next gateway is tried
+# as well, and so on. The first successful response wins and the
+# others are closed by their own threads as they come in. Each
+# gateway's latency and error rate are tracked as EWMAs, which decide
+# the order of later requests.
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# Seconds of latency one failure is worth when ranking gateways
+ERROR_PENALTY_SECONDS = 5.0
+
+CONNECT_TIMEOUT = 3.05
+
+# CIDv1 prefix: version 1, raw codec, sha2-256, 32-byte digest
+_RAW_SHA256_PREFIX = bytes([0x01, 0x55, 0x12, 0x20])
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="ipfs-fetch")
+
+_session = requests.Session()
+_session.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=32)
+)
+_session.mount(
+    "http://",
+    requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=32)
+)
+
+
+class Gateway:
+
+    def __init__(self, url, rank):
+
+        self.url = url
+        self.rank = rank
+
+        self.latency = None
+        self.error_rate = 0.0
+
+        self._lock = threading.Lock()
+
+    def record(self, latency, failed):
+
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += EWMA_ALPHA * (latency - self.latency)
+
+            self.error_rate += EWMA_ALPHA * (float(failed) - self.error_rate)
+
+    def score(self):
+
+        return (self.latency or 0.0) + self.error_rate * ERROR_PENALTY_SECONDS
+
+    def stats(self):
+
+        return {
+            "url": self.url,
+            "latency": self.latency,
+            "errorRate": round(self.error_rate, 4)
+        }
+
+
+gateways = [Gateway(url, rank) for rank, url in enumerate(IPFS_GATEWAYS)]
+
+
+class ContentMismatchError(IOError):
+    """
+    A gateway served bytes that do not hash to the requested CID
+    """
+
+
+def ranked():
+    """
+    Gateways best first; configuration order breaks ties
+    """
+
+    return sorted(gateways, key=lambda g: (g.score(), g.rank))
+
+
+def report_corrupt(url):
+    """
+    Penalise a gateway that served content not matching its CID
+    """
+
+    for g in gateways:
+        if g.url == url:
+            g.record(g.latency or 0.0, True)
+
+
+def raw_digest(cid):
+    """
+    sha2-256 digest named by a raw-codec CIDv1 (bafkrei...), else None.
+
+    dag-pb CIDs (Qm..., bafybei...) hash the UnixFS DAG rather than the
+    bytes, so they cannot be checked against the body; the AES-GCM tags
+    still authenticate their content when the record is decrypted.
+    """
+
+    if not cid.startswith("b"):
+        return None
+
+    body = cid[1:].upper()
+
+    try:
+        data = base64.b32decode(body + "=" * (-len(body) % 8))
+    except ValueError:
+        return None
+
+    if len(data) != 36 or data[:4] != _RAW_SHA256_PREFIX:
+        return None
+
+    return data[4:]
+
+
+# ===============================
+# FETCH
+# ===============================
+
+class _Race:
+    """
+    Results of one hedged fetch. Once a response has won, attempts that
+    answer later close their own response instead of reporting it, so
+    no thread is left waiting on the losers.
+    """
+
+    def __init__(self):
+
+        self.results = queue.Queue()
+        self.won = False
+        self._lock = threading.Lock()
+
+    def report(self, gateway, res, error):
+
+        with self._lock:
+            if not self.won:
+                self.results.put((gateway, res, error))
+                return
+
+        if res is not None:
+            res.close()
+
+    def finish(self):
+        """
+        Stop taking results; close responses that came in meanwhile
+        """
+
+        with self._lock:
+            self.won = True
+
+        while True:
+            try:
+                _, res, _ = self.results.get_nowait()
+            except queue.Empty:
+                return
+
+            if res is not None:
+                res.close()
+
+
+def _attempt(gateway, cid, headers, race):
+
+    # Not started before another gateway won: skip it
+    if race.won:
+        return
+
+    started = time.monotonic()
+
+    try:
+        res = _session.get(
+            gateway.url + cid,
+            headers=headers,
+            stream=True,
+            timeout=(CONNECT_TIMEOUT, IPFS_TIMEOUT_SECONDS)
+        )
+
+        if res.status_code not in (200, 206):
+            res.close()
+            raise FileNotFoundError(
+                f"{gateway.url} answered {res.status_code} for {cid}"
+            )
+
+    except Exception as e:
+        gateway.record(time.monotonic() - started, True)
+        race.report(gateway, None, e)
+        return
+
+    gateway.record(time.monotonic() - started, False)
+    race.report(gateway, res, None)
+
+
+def open_stream(cid, byte_range=None, exclude=()):
+    """
+    Streaming GET of `cid` from the fastest gateway that has it.
+    `byte_range` is an inclusive (start, end) pair.
+
+    Returns (gateway url, response). Raises FileNotFoundError when no
+    gateway could serve the content.
+    """
+
+    # Until the winning gateway's headers are in; the body is read later
+    with metrics.IN_FLIGHT.track(kind="gateway_fetch"), metrics.stage("gateway_fetch"):
+        return _race(cid, byte_range, exclude)
+
+
+def _race(cid, byte_range, exclude):
+
+    order = [g for g in ranked() if g.url not in exclude]
+
+    headers = {}
+
+    if byte_range:
+        headers["Range"] = "bytes=%d-%d" % byte_range
+
+    race = _Race()
+    launched = 0
+    pending = 0
+    errors = []
+
+    while launched < len(order) or pending:
+
+        if pending == 0:
+            # Nothing in flight (start, or everyone failed): go now
+            _executor.submit(_attempt, order[launched], cid, headers, race)
+            launched += 1
+            pending += 1
+
+        hedge = launched < len(order)
+
+        try:
+            gateway, res, error = race.results.get(
+                timeout=IPFS_HEDGE_DELAY_SECONDS if hedge else None
+            )
+        except queue.Empty:
+            _executor.submit(_attempt, order[launched], cid, headers, race)
+            launched += 1
+            pending += 1
+            continue
+
+        pending -= 1
+
+        if res is not None:
+            race.finish()
+
+            return gateway.url, res
+
+        errors.append(str(error))
+
+    raise FileNotFoundError(
+        f"{cid} not found on IPFS: " + ("; ".join(errors) or "no gateways")
+    )
@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from config import (
+    MASTER_KEY,
+    MASTER_KEYS_PREVIOUS,
+    ENVELOPE_ENCRYPTION,
+    DATA_KEY_CACHE_SIZE
+)
+from services import metrics
+from services.crypto import (
+    FLAG_ENVELOPE,
+    generate_key,
+    header_flags,
+    key_id,
+    unwrap_key,
+    wrap_key
+)
+from services.db import get_connection
+
+
+# ===============================
+# PER-PATIENT DATA KEYS
+# ===============================
+#
+# Each patient's records are encrypted with that patient's own data key.
+# The data key is stored wrapped by the master key, with the patient's
+# address as associated data, so a wrapped key copied to another patient
+# cannot be opened. Rotating the master key therefore only rewraps these
+# 48-byte keys; the records on IPFS stay as they are.
+#
+# Records without FLAG_ENVELOPE (from before envelope mode, or with it
+# off) are encrypted with the master key itself; they are decrypted with
+# MASTER_KEY or, once it has been rotated, any of MASTER_KEYS_PREVIOUS.
+#
+# Data keys exist only in the data_keys table: losing the database loses
+# every envelope record, so it needs backups as much as the master key.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS data_keys (
+    patient      TEXT PRIMARY KEY,
+    wrapped      BLOB NOT NULL,
+    kek_id       TEXT NOT NULL,
+    created_at   INTEGER NOT NULL,
+    rewrapped_at INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_data_keys_kek ON data_keys (kek_id);
+"""
+
+# Keys rewrapped per transaction by rewrap_all
+REWRAP_BATCH = 500
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+@lru_cache(maxsize=1)
+def _masters():
+    """
+    key id -> master key, current one first
+    """
+
+    keys = [k.encode() for k in [MASTER_KEY, *MASTER_KEYS_PREVIOUS] if k]
+
+    return {key_id(k): k for k in keys}
+
+
+# ===============================
+# UNWRAPPED KEY CACHE
+# ===============================
+
+class _KeyCache:
+
+    def __init__(self, size):
+
+        self.size = size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, patient):
+
+        with self._lock:
+            key = self._keys.get(patient)
+
+            if key is not None:
+                self._keys.move_to_end(patient)
+
+        metrics.cache_lookup("data_key", key is not None)
+
+        return key
+
+    def put(self, patient, key):
+
+        if self.size <= 0:
+            return
+
+        with self._lock:
+            self._keys[patient] = key
+            self._keys.move_to_end(patient)
+
+            while len(self._keys) > self.size:
+                self._keys.popitem(last=False)
+
+
+_cache = _KeyCache(DATA_KEY_CACHE_SIZE)
+
+
+# ===============================
+# DATA KEYS
+# ===============================
+
+def _unwrap(patient, row):
+
+    master = _masters().get(row["kek_id"])
+
+    if master is None:
+        raise RuntimeError(
+            f"Data key of {patient} is wrapped by an unknown master key "
+            f"({row['kek_id']}); add it to MASTER_KEYS_PREVIOUS"
+        )
+
+    with metrics.stage("unwrap_key"):
+        return unwrap_key(master, row["wrapped"], patient.encode())
+
+
+def data_key(patient, create=False):
+    """
+    Unwrapped data key of `patient`. With `create`, a missing key is
+    generated; otherwise a missing key raises KeyError.
+    """
+
+    patient = patient.lower()
+    key = _cache.get(patient)
+
+    if key is not None:
+        return key
+
+    conn = get_connection()
+    select = "SELECT wrapped, kek_id FROM data_keys WHERE patient = ?"
+
+    row = conn.execute(select, (patient,)).fetchone()
+
+    if row is None:
+        if not create:
+            raise KeyError(f"No data key for {patient}")
+
+        master = MASTER_KEY.encode()
+
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO data_keys (patient, wrapped, kek_id, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    patient,
+                    wrap_key(master, generate_key(), patient.encode()),
+                    key_id(master),
+                    int(time.time())
+                )
+            )
+
+        # Another worker may have created it first: theirs wins
+        row = conn.execute(select, (patient,)).fetchone()
+
+    key = _unwrap(patient, row)
+    _cache.put(patient, key)
+
+    return key
+
+
+def encryption_key(patient):
+    """
+    (key, header flags) to encrypt a new record of `patient` with
+    """
+
+    if not ENVELOPE_ENCRYPTION:
+        return MASTER_KEY.encode(), 0
+
+    return data_key(patient, create=True), FLAG_ENVELOPE
+
+
+def master_keys():
+    """
+    Current and previous master keys, current first
+    """
+
+    return list(_masters().values())
+
+
+def decryption_key(patient, header):
+    """
+    Key for a record of `patient` given its chunked-format header, or
+    the list of master keys to try for a record without a data key
+    """
+
+    if header_flags(header) & FLAG_ENVELOPE:
+        return data_key(patient)
+
+    return master_keys()
+
+
+# ===============================
+# MASTER KEY ROTATION
+# ===============================
+
+def rewrap_all():
+    """
+    Rewrap the data keys still under a previous master key with the
+    current one; returns how many were rewrapped
+    """
+
+    masters = _masters()
+    current = MASTER_KEY.encode()
+    current_id = key_id(current)
+
+    previous = [k for k in masters if k != current_id]
+
+    if not previous:
+        return 0
+
+    conn = get_connection()
+    done = 0
+
+    while True:
+        rows = conn.execute(
+            "SELECT patient, wrapped, kek_id FROM data_keys "
+            f"WHERE kek_id IN ({','.join('?' * len(previous))}) LIMIT ?",
+            (*previous, REWRAP_BATCH)
+        ).fetchall()
+
+        if not rows:
+            return done
+
+        updates = [
+            (
+                wrap_key(current, _unwrap(row["patient"], row), row["patient"].encode()),
+                current_id,
+                int(time.time()),
+                row["patient"],
+                row["kek_id"]
+            )
+            for row in rows
+        ]
+
+        with conn:
+            # Unless another worker rewrapped it meanwhile
+            conn.executemany(
+                "UPDATE data_keys SET wrapped = ?, kek_id = ?, rewrapped_at = ? "
+                "WHERE patient = ? AND kek_id = ?",
+                updates
+            )
+
+        done += len(updates)
+
+
+def stale_count():
+    """
+    Data keys not wrapped by the current master key
+    """
+
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM data_keys WHERE kek_id != ?",
+        (key_id(MASTER_KEY.encode()),)
+    ).fetchone()[0]
@@ -0,0 +1,283 @@
+import json
+import threading
+import time
+
+from eth_abi import encode
+from web3 import Web3
+
+from config import ANCHOR_BATCH_SECONDS, ANCHOR_MAX_BATCH
+from services.db import get_connection
+
+
+# ===============================
+# MERKLE BATCH ANCHORING
+# ===============================
+#
+# Records are queued locally and, once per batch window, the root of a
+# Merkle tree over their (patient, cid, record_type) leaves is written
+# on chain in a single transaction. Each record keeps its inclusion
+# proof, so anyone can check it against the anchored root.
+#
+# Leaves are double-hashed and pairs are hashed in sorted order, as in
+# OpenZeppelin's MerkleProof, so proofs verify with `verify_proof` or
+# on chain with MerkleProof.verify.
+
+# record_type of the on-chain entries that carry batch roots
+ROOT_RECORD_TYPE = "merkle-root"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS merkle_leaves (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient     TEXT NOT NULL,
+    cid         TEXT NOT NULL,
+    record_type TEXT NOT NULL,
+    queued_at   INTEGER NOT NULL,
+    batch_id    INTEGER,
+    proof       TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_merkle_leaves_patient ON merkle_leaves (patient, id);
+CREATE INDEX IF NOT EXISTS idx_merkle_leaves_pending ON merkle_leaves (batch_id, id);
+
+CREATE TABLE IF NOT EXISTS merkle_batches (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    root       TEXT NOT NULL,
+    tx_hash    TEXT NOT NULL,
+    leaf_count INTEGER NOT NULL,
+    created_at INTEGER NOT NULL
+);
+"""
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+# ===============================
+# TREE
+# ===============================
+
+def leaf_hash(patient, cid, record_type) -> bytes:
+
+    encoded = encode(
+        ["address", "string", "string"],
+        [Web3.to_checksum_address(patient), cid, record_type]
+    )
+
+    return Web3.keccak(Web3.keccak(encoded))
+
+
+def _hash_pair(a: bytes, b: bytes) -> bytes:
+
+    return Web3.keccak(min(a, b) + max(a, b))
+
+
+def build_tree(leaves):
+    """
+    Returns (root, proofs) with one sibling list per leaf
+    """
+
+    proofs = [[] for _ in leaves]
+    positions = list(range(len(leaves)))
+    level = list(leaves)
+
+    while len(level) > 1:
+        parents = []
+
+        for i in range(0, len(level) - 1, 2):
+            parents.append(_hash_pair(level[i], level[i + 1]))
+
+        # Odd node out moves up unchanged
+        if len(level) % 2:
+            parents.append(level[-1])
+
+        for leaf, pos in enumerate(positions):
+            sibling = pos ^ 1
+
+            if sibling < len(level):
+                proofs[leaf].append(level[sibling])
+
+            positions[leaf] = pos // 2
+
+        level = parents
+
+    return level[0], proofs
+
+
+def verify_proof(leaf: bytes, proof, root: bytes) -> bool:
+
+    node = leaf
+
+    for sibling in proof:
+        node = _hash_pair(node, sibling)
+
+    return node == root
+
+
+# ===============================
+# QUEUE / READS
+# ===============================
+
+def queue_record(patient, cid, record_type):
+
+    conn = get_connection()
+
+    with conn:
+        conn.execute(
+            "INSERT INTO merkle_leaves (patient, cid, record_type, queued_at) "
+            "VALUES (?, ?, ?, ?)",
+            (Web3.to_checksum_address(patient), cid, record_type, int(time.time()))
+        )
+
+
+def count_records(patient):
+
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM merkle_leaves WHERE patient = ?",
+        (Web3.to_checksum_address(patient),)
+    ).fetchone()[0]
+
+
+def get_records(patient, after_id=0, before_id=None, limit=-1, newest_first=False):
+    """
+    Batched records of a patient with their anchoring state:
+    [(leaf id, cid, record_type, timestamp, anchor)], oldest first or
+    newest first. Leaf ids grow with queueing time, so they bound pages.
+    """
+
+    where = "l.patient = ? AND l.id > ?"
+    params = [Web3.to_checksum_address(patient), after_id]
+
+    if before_id is not None:
+        where += " AND l.id < ?"
+        params.append(before_id)
+
+    rows = get_connection().execute(
+        "SELECT l.id, l.cid, l.record_type, l.queued_at, l.proof, "
+        "b.root, b.tx_hash "
+        "FROM merkle_leaves l LEFT JOIN merkle_batches b ON b.id = l.batch_id "
+        f"WHERE {where} ORDER BY l.id {'DESC' if newest_first else 'ASC'} LIMIT ?",
+        (*params, limit)
+    ).fetchall()
+
+    records = []
+
+    for row in rows:
+        if row["root"] is None:
+            anchor = {"status": "queued"}
+        else:
+            anchor = {
+                "status": "submitted",
+                "root": row["root"],
+                "proof": json.loads(row["proof"]),
+                "leaf": Web3.to_hex(
+                    leaf_hash(patient, row["cid"], row["record_type"])
+                ),
+                "transaction_hash": row["tx_hash"]
+            }
+
+        records.append(
+            (row["id"], row["cid"], row["record_type"], row["queued_at"], anchor)
+        )
+
+    return records
+
+
+# ===============================
+# BATCHER
+# ===============================
+
+class MerkleAnchorer:
+    """
+    Commits queued records every ANCHOR_BATCH_SECONDS.
+
+    `submit(root_hex)` sends the anchoring transaction and returns its
+    hash; if it fails the records stay queued for the next window.
+    """
+
+    def __init__(self, submit):
+
+        self.submit = submit
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def flush(self):
+        """
+        Anchor up to ANCHOR_MAX_BATCH queued records; returns the batch
+        root, or None when nothing was queued
+        """
+
+        with self._lock:
+            conn = get_connection()
+
+            rows = conn.execute(
+                "SELECT id, patient, cid, record_type FROM merkle_leaves "
+                "WHERE batch_id IS NULL ORDER BY id LIMIT ?",
+                (ANCHOR_MAX_BATCH,)
+            ).fetchall()
+
+            if not rows:
+                return None
+
+            leaves = [
+                leaf_hash(r["patient"], r["cid"], r["record_type"])
+                for r in rows
+            ]
+            root, proofs = build_tree(leaves)
+            root_hex = Web3.to_hex(root)
+
+            tx_hash = self.submit(root_hex)
+
+            with conn:
+                batch_id = conn.execute(
+                    "INSERT INTO merkle_batches (root, tx_hash, leaf_count, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (root_hex, tx_hash, len(rows), int(time.time()))
+                ).lastrowid
+
+                conn.executemany(
+                    "UPDATE merkle_leaves SET batch_id = ?, proof = ? WHERE id = ?",
+                    [
+                        (batch_id, json.dumps([Web3.to_hex(p) for p in proof]), r["id"])
+                        for r, proof in zip(rows, proofs)
+                    ]
+                )
+
+            print(f"✅ Anchored {len(rows)} records under {root_hex} ({tx_hash})")
+
+            return root_hex
+
+    def _run(self):
+
+        while not self._stop.wait(ANCHOR_BATCH_SECONDS):
+
+            try:
+                # Drain backlogs larger than one batch straight away
+                while self.flush():
+                    pass
+            except Exception as e:
+                print("❌ Merkle anchoring error:", e)
+
+    def start(self):
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="merkle-anchorer",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+
+        self._stop.set()
+
+        if self._thread:
+            self._thread.join(timeout=10)
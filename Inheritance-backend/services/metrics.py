@@ -0,0 +1,353 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# ===============================
+# METRICS (Prometheus text format)
+# ===============================
+#
+# Counters, gauges and histograms kept in process and rendered on
+# /metrics. Recording is a dict update under a per-metric lock, so it
+# can sit on the upload and view hot paths. Values are per worker
+# process; Prometheus sums them across scrape targets.
+
+# Seconds; covers a local signature up to a slow gateway fetch
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+_registry = []
+
+
+def _escape(value):
+
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+
+    pairs = list(zip(names, values))
+
+    if extra:
+        pairs.append(extra)
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def _format_value(value):
+
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+        # label values -> value
+        self._values = {}
+        self._lock = threading.Lock()
+
+        _registry.append(self)
+
+    def _key(self, labels):
+
+        return tuple(labels[n] for n in self.labels)
+
+    def samples(self):
+        """
+        (suffix, label values, extra label, value) for rendering
+        """
+
+        with self._lock:
+            items = list(self._values.items())
+
+        for key, value in items:
+            yield "", key, None, value
+
+    def render(self):
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+        for suffix, key, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(self.labels, key, extra)} "
+                f"{_format_value(value)}"
+            )
+
+        return lines
+
+
+class Counter(_Metric):
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """
+        Count the block as in flight while it runs
+        """
+
+        self.inc(**labels)
+
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+
+        super().__init__(name, help, labels)
+
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            entry = self._values.get(key)
+
+            if entry is None:
+                # per-bucket counts (+Inf last), sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+
+        for key, (counts, total) in items:
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", key, ("le", _format_value(bound)), cumulative
+
+            yield "_sum", key, None, total
+            yield "_count", key, None, cumulative
+
+
+# ===============================
+# BACKEND METRICS
+# ===============================
+
+STAGE_SECONDS = Histogram(
+    "medblocks_stage_seconds",
+    "Time spent per records pipeline stage",
+    ("stage",)
+)
+
+HTTP_SECONDS = Histogram(
+    "medblocks_http_request_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status")
+)
+
+HTTP_IN_FLIGHT = Gauge(
+    "medblocks_http_in_flight",
+    "HTTP requests being served"
+)
+
+RPC_CALLS = Counter(
+    "medblocks_rpc_calls_total",
+    "JSON-RPC calls by method (batched calls counted one by one)",
+    ("method",)
+)
+
+RPC_ERRORS = Counter(
+    "medblocks_rpc_errors_total",
+    "JSON-RPC requests that no endpoint answered, by method",
+    ("method",)
+)
+
+RPC_SECONDS = Histogram(
+    "medblocks_rpc_seconds",
+    "JSON-RPC request latency through the pool, by method",
+    ("method",)
+)
+
+CACHE_LOOKUPS = Counter(
+    "medblocks_cache_lookups_total",
+    "Cache lookups by cache and result (hit / miss)",
+    ("cache", "result")
+)
+
+IN_FLIGHT = Gauge(
+    "medblocks_in_flight",
+    "Operations in progress by kind",
+    ("kind",)
+)
+
+
+def stage(name):
+    """
+    Time a block as one pipeline stage
+    """
+
+    return STAGE_SECONDS.time(stage=name)
+
+
+def cache_lookup(cache, hit):
+
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class TimedBlocks:
+    """
+    Iterate `blocks` and record the time spent producing them as `stage`
+    once exhausted or closed. Time spent in `inner` (the TimedBlocks this
+    iterator pulls from) is left out, so a decrypt stage fed by a gateway
+    read only counts the decryption itself.
+    """
+
+    def __init__(self, blocks, stage, inner=None):
+
+        self._blocks = iter(blocks)
+        self.stage = stage
+        self.inner = inner
+        self.elapsed = 0.0
+        self._done = False
+
+        # `inner` may already have been read from (e.g. a header)
+        self._inner_before = inner.elapsed if inner else 0.0
+
+    def __iter__(self):
+
+        return self
+
+    def __next__(self):
+
+        started = time.perf_counter()
+
+        try:
+            block = next(self._blocks)
+        except StopIteration:
+            self.elapsed += time.perf_counter() - started
+            self.close()
+            raise
+
+        self.elapsed += time.perf_counter() - started
+
+        return block
+
+    def close(self):
+
+        if self._done:
+            return
+
+        self._done = True
+
+        own = self.elapsed
+
+        if self.inner:
+            own -= self.inner.elapsed - self._inner_before
+
+        STAGE_SECONDS.observe(max(own, 0.0), stage=self.stage)
+
+        close = getattr(self._blocks, "close", None)
+
+        if close:
+            close()
+
+
+# ===============================
+# EXPOSITION
+# ===============================
+
+def _hit_ratios():
+
+    totals = {}
+
+    for (cache, result), count in list(CACHE_LOOKUPS._values.items()):
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (count if result == "hit" else 0), lookups + count)
+
+    lines = [
+        "# HELP medblocks_cache_hit_ratio Cache hits over lookups since start",
+        "# TYPE medblocks_cache_hit_ratio gauge"
+    ]
+
+    for cache, (hits, lookups) in sorted(totals.items()):
+        lines.append(
+            f'medblocks_cache_hit_ratio{{cache="{_escape(cache)}"}} '
+            f"{_format_value(hits / lookups if lookups else 0.0)}"
+        )
+
+    return lines
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format
+    """
+
+    lines = []
+
+    for metric in _registry:
+        lines.extend(metric.render())
+
+    lines.extend(_hit_ratios())
+
+    return "\n".join(lines) + "\n"
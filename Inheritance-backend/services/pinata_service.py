@@ -1,11 +1,13 @@
+import asyncio
 import json
 import time
+import uuid
 import requests
 
-from config import PINATA_API_KEY, PINATA_SECRET_KEY
+from config import PINATA_API_KEY, PINATA_SECRET_KEY, PINATA_API_URL
 
 
-PINATA_PIN_FILE_URL = "https://api.pinata.cloud/pinning/pinFileToIPFS"
+PINATA_PIN_FILE_URL = f"{PINATA_API_URL}/pinning/pinFileToIPFS"
 
 MAX_RETRIES = 3
 TIMEOUT = 60
@@ -25,52 +27,34 @@ def _get_headers():
     }
 
 
-def upload_to_ipfs(
-    file_path: str,
-    metadata: dict | None = None
-) -> str:
-    """
-    Upload file to Pinata IPFS and return CID
-
-    Args:
-        file_path: Path to encrypted file
-        metadata: Optional metadata dict
-    """
-
-    headers = _get_headers()
+def _pinata_payload(name: str, metadata: dict | None) -> dict:
 
     pinata_options = {
         "cidVersion": 1
     }
 
     pinata_metadata = {
-        "name": file_path.split("/")[-1]
+        "name": name
     }
 
     if metadata:
         pinata_metadata["keyvalues"] = metadata
 
-    payload = {
+    return {
         "pinataOptions": json.dumps(pinata_options),
         "pinataMetadata": json.dumps(pinata_metadata)
     }
 
+
+def _post_with_retries(send) -> str:
+    """
+    Run `send()` (one pin request) with retries and return the CID
+    """
+
     for attempt in range(1, MAX_RETRIES + 1):
 
         try:
-            with open(file_path, "rb") as f:
-
-                files = {
-                    "file": f
-                }
-
-                response = _session.post(
-                    PINATA_PIN_FILE_URL,
-                    headers=headers,
-                    files=files,
-                    data=payload,
-                    timeout=TIMEOUT
-                )
+            response = send()
 
             if response.status_code == 200:
                 data = response.json()
@@ -99,3 +83,145 @@ def upload_to_ipfs(
 
 
     raise RuntimeError("Unexpected upload failure")
+
+
+def upload_to_ipfs(
+    file_path: str,
+    metadata: dict | None = None
+) -> str:
+    """
+    Upload file to Pinata IPFS and return CID
+
+    Args:
+        file_path: Path to encrypted file
+        metadata: Optional metadata dict
+    """
+
+    headers = _get_headers()
+    payload = _pinata_payload(file_path.split("/")[-1], metadata)
+
+    def send():
+        with open(file_path, "rb") as f:
+
+            files = {
+                "file": f
+            }
+
+            return _session.post(
+                PINATA_PIN_FILE_URL,
+                headers=headers,
+                files=files,
+                data=payload,
+                timeout=TIMEOUT
+            )
+
+    return _post_with_retries(send)
+
+
+# ===============================
+# STREAMING UPLOAD
+# ===============================
+
+def _quote(value: str) -> str:
+    """
+    Escape a form-data header parameter the way browsers do, so a name
+    cannot end the quoted string or the header line
+    """
+
+    return value.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class _MultipartBody:
+    """
+    multipart/form-data body streamed from an iterator of file blocks.
+
+    Having a length makes requests send Content-Length and stream the
+    iterator instead of buffering it. Also iterable with `async for`.
+    """
+
+    def __init__(self, fields: dict, filename: str, blocks, size: int):
+
+        boundary = uuid.uuid4().hex
+
+        head = b""
+
+        for name, value in fields.items():
+            head += (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{_quote(name)}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode()
+
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{_quote(filename)}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+
+        self._head = head
+        self._tail = f"\r\n--{boundary}--\r\n".encode()
+        self._blocks = blocks
+        self._length = len(head) + size + len(self._tail)
+
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+
+        yield self._head
+        yield from self._blocks
+        yield self._tail
+
+    async def __aiter__(self):
+        """
+        Async streaming (httpx); sync block iterators are advanced on a
+        worker thread so file reads and encryption stay off the loop
+        """
+
+        yield self._head
+
+        if hasattr(self._blocks, "__aiter__"):
+            async for block in self._blocks:
+                yield block
+        else:
+            blocks = iter(self._blocks)
+
+            while (block := await asyncio.to_thread(next, blocks, None)) is not None:
+                yield block
+
+        yield self._tail
+
+
+def upload_stream_to_ipfs(
+    make_blocks,
+    size: int,
+    name: str,
+    metadata: dict | None = None
+) -> str:
+    """
+    Upload a stream to Pinata IPFS without buffering it, return CID
+
+    Args:
+        make_blocks: Callable returning a fresh iterator of the bytes to
+            pin (called again on retry)
+        size: Exact total length of those bytes
+        name: File name shown in Pinata
+        metadata: Optional metadata dict
+    """
+
+    headers = _get_headers()
+    payload = _pinata_payload(name, metadata)
+
+    def send():
+        body = _MultipartBody(payload, name, make_blocks(), size)
+
+        return _session.post(
+            PINATA_PIN_FILE_URL,
+            headers={**headers, "Content-Type": body.content_type},
+            data=body,
+            timeout=TIMEOUT
+        )
+
+    return _post_with_retries(send)
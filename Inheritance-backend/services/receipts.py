@@ -0,0 +1,440 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from web3.exceptions import TransactionNotFound
+
+from services.db import get_connection
+
+
+# ===============================
+# RECEIPT TRACKER
+# ===============================
+
+# Seconds between receipt polls for pending transactions
+POLL_SECONDS = 4
+
+# A transaction pending this long is dropped once the node no longer
+# knows it (eth_getTransactionByHash returns null); until then it is
+# still followed, however slow
+DROP_AFTER_SECONDS = 600
+
+# Replacement attempts per nonce before the transaction is left alone
+MAX_BUMPS = 5
+
+# Finished transactions are kept in memory this long (SQLite keeps them)
+KEEP_SECONDS = 3600
+
+# Receipts requested per JSON-RPC batch
+RECEIPT_BATCH = 100
+
+FINAL_STATUSES = ("mined", "reverted", "dropped", "replaced")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tx_status (
+    tx_hash      TEXT PRIMARY KEY,
+    nonce        INTEGER NOT NULL,
+    status       TEXT NOT NULL,
+    sent_at      REAL NOT NULL,
+    block_number INTEGER,
+    replaces     TEXT,
+    replaced_by  TEXT,
+    bumps        INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_tx_status_pending ON tx_status (status);
+"""
+
+_FIELDS = (
+    "status",
+    "nonce",
+    "sent_at",
+    "block_number",
+    "replaces",
+    "replaced_by",
+    "bumps"
+)
+
+def _to_int(value):
+
+    return int(value, 16) if isinstance(value, str) else value
+
+
+class ReceiptTracker:
+    """
+    Follows sent transactions until they are mined, reverted or dropped,
+    off the request path.
+
+    Pending receipts are fetched in JSON-RPC batches, and every status
+    change is written to SQLite, so statuses survive restarts and
+    pending transactions are picked up again on start.
+    `add_listener(fn)` registers `fn(tx_hash, entry)` for each change.
+
+    A transaction pending for longer than `stuck_after` seconds is handed
+    to `on_stuck(tx_hash, nonce)`, which may send a fee-bumped
+    replacement. Only transactions tracked by this process are bumped
+    (others, e.g. resumed after a restart or sent by another worker,
+    are only followed), and bumps run on their own thread so a slow one
+    does not hold up the polling. All hashes sharing a nonce are
+    followed until one of them is mined; the others then become
+    "replaced".
+    """
+
+    def __init__(self, w3, on_dropped=None, on_stuck=None, stuck_after=None):
+
+        self.w3 = w3
+        self.on_dropped = on_dropped
+        self.on_stuck = on_stuck
+        self.stuck_after = stuck_after
+
+        # tx_hash -> {"status", "nonce", "sent_at", "block_number", ...}
+        self.transactions = {}
+
+        self._listeners = []
+
+        # Hashes sent by this process, the only ones it can replace
+        self._local = set()
+
+        # Hashes with a bump in progress
+        self._bumping = set()
+        self._bumper = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tx-bump")
+
+        self._lock = threading.Lock()
+        self._thread = None
+
+        get_connection().executescript(_SCHEMA)
+
+    # -------------------------------
+    # Persistence
+    # -------------------------------
+
+    def _save(self, changes):
+
+        if not changes:
+            return
+
+        conn = get_connection()
+
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO tx_status "
+                "(tx_hash, nonce, status, sent_at, block_number, "
+                "replaces, replaced_by, bumps) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        h, e["nonce"], e["status"], e["sent_at"],
+                        e["block_number"], e["replaces"],
+                        e["replaced_by"], e["bumps"]
+                    )
+                    for h, e in changes
+                ]
+            )
+
+        for listener in list(self._listeners):
+            for tx_hash, entry in changes:
+                try:
+                    listener(tx_hash, entry)
+                except Exception as e:
+                    print("❌ Receipt listener error:", e)
+
+    def resume(self):
+        """
+        Follow transactions left pending by a previous run
+        """
+
+        rows = get_connection().execute(
+            "SELECT * FROM tx_status WHERE status = 'pending'"
+        ).fetchall()
+
+        with self._lock:
+            for row in rows:
+                self.transactions[row["tx_hash"]] = {
+                    f: row[f] for f in _FIELDS
+                }
+
+        if rows:
+            self._ensure_running()
+
+        return len(rows)
+
+    def add_listener(self, listener):
+
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    # -------------------------------
+    # Tracking
+    # -------------------------------
+
+    def track(self, tx_hash, nonce, replaces=None):
+
+        changes = []
+
+        with self._lock:
+            bumps = 0
+
+            if replaces in self.transactions:
+                old = self.transactions[replaces]
+                old["replaced_by"] = tx_hash
+                bumps = old.get("bumps", 0) + 1
+                changes.append((replaces, dict(old)))
+
+            entry = self.transactions[tx_hash] = {
+                "status": "pending",
+                "nonce": nonce,
+                "sent_at": time.time(),
+                "block_number": None,
+                "replaces": replaces,
+                "replaced_by": None,
+                "bumps": bumps
+            }
+            changes.append((tx_hash, dict(entry)))
+            self._local.add(tx_hash)
+
+        self._save(changes)
+        self._ensure_running()
+
+    def status(self, tx_hash):
+
+        with self._lock:
+            entry = self.transactions.get(tx_hash)
+
+            if entry:
+                return dict(entry)
+
+        row = get_connection().execute(
+            "SELECT * FROM tx_status WHERE tx_hash = ?",
+            (tx_hash,)
+        ).fetchone()
+
+        return {f: row[f] for f in _FIELDS} if row else None
+
+    def _pending(self):
+
+        with self._lock:
+            return [
+                (h, dict(t)) for h, t in self.transactions.items()
+                if t["status"] == "pending"
+            ]
+
+    def _receipts(self, hashes, aged=()):
+        """
+        ({tx_hash: (succeeded, block_number)} for the hashes already
+        mined, set of the `aged` hashes the node no longer knows).
+        Both are asked in the same batch.
+        """
+
+        batch = getattr(self.w3.provider, "make_batch_request", None)
+        found = {}
+        unknown = set()
+
+        if batch is None:
+            # Provider without batching: one call per hash
+            for tx_hash in hashes:
+                try:
+                    r = self.w3.eth.get_transaction_receipt(tx_hash)
+                except Exception:
+                    r = None
+
+                if r is not None:
+                    found[tx_hash] = (r["status"] == 1, r["blockNumber"])
+                    continue
+
+                if tx_hash in aged:
+                    try:
+                        self.w3.eth.get_transaction(tx_hash)
+                    except TransactionNotFound:
+                        unknown.add(tx_hash)
+                    except Exception:
+                        pass
+
+            return found, unknown
+
+        calls = [("eth_getTransactionReceipt", tx_hash) for tx_hash in hashes]
+        calls += [("eth_getTransactionByHash", tx_hash) for tx_hash in aged]
+
+        for start in range(0, len(calls), RECEIPT_BATCH):
+            chunk = calls[start:start + RECEIPT_BATCH]
+
+            replies = batch([
+                (method, [tx_hash])
+                for method, tx_hash in chunk
+            ])
+
+            for reply in replies:
+                method, tx_hash = chunk[reply["id"]]
+                r = reply.get("result")
+
+                if method == "eth_getTransactionByHash":
+                    # null result, not an error: the node dropped it
+                    if r is None and "error" not in reply:
+                        unknown.add(tx_hash)
+
+                elif r:
+                    found[tx_hash] = (
+                        _to_int(r["status"]) == 1,
+                        _to_int(r["blockNumber"])
+                    )
+
+        # Mined between the two lookups
+        return found, unknown - set(found)
+
+    def poll_once(self):
+
+        pending = self._pending()
+
+        if not pending:
+            return
+
+        now = time.time()
+
+        receipts, unknown = self._receipts(
+            [h for h, _ in pending],
+            [h for h, e in pending if now - e["sent_at"] > DROP_AFTER_SECONDS]
+        )
+
+        changes = []
+
+        # Nonces the node no longer knows any pending transaction for
+        dropped_nonces = {
+            e["nonce"] for h, e in pending
+            if h in unknown and e["replaced_by"] is None
+        } - {
+            e["nonce"] for h, e in pending
+            if h not in unknown
+        }
+
+        for tx_hash, entry in pending:
+
+            receipt = receipts.get(tx_hash)
+            update = None
+            latest = entry["replaced_by"] is None
+            age = now - entry["sent_at"]
+
+            if receipt is not None:
+                succeeded, block_number = receipt
+                update = {
+                    "status": "mined" if succeeded else "reverted",
+                    "block_number": block_number
+                }
+            elif tx_hash in unknown and entry["nonce"] in dropped_nonces:
+                # A replaced original is only dropped with its latest
+                # replacement, and neither while a sibling is still known
+                update = {"status": "dropped"}
+            elif (
+                latest
+                and self.on_stuck
+                and self.stuck_after
+                and age > self.stuck_after
+                and entry["bumps"] < MAX_BUMPS
+            ):
+                self._start_bump(tx_hash, entry["nonce"])
+
+            if update is None:
+                continue
+
+            with self._lock:
+                current = self.transactions[tx_hash]
+
+                # Already settled as a sibling of a mined replacement
+                if current["status"] != "pending":
+                    continue
+
+                current.update(update)
+                changes.append((tx_hash, dict(current)))
+
+                # One hash per nonce can be mined: its siblings are done
+                if receipt is not None:
+                    for other_hash, other in self.transactions.items():
+                        if (
+                            other["nonce"] == entry["nonce"]
+                            and other["status"] == "pending"
+                        ):
+                            other["status"] = "replaced"
+                            other["replaced_by"] = tx_hash
+                            changes.append((other_hash, dict(other)))
+
+            if update["status"] == "dropped" and latest and self.on_dropped:
+                self.on_dropped(tx_hash, entry["nonce"])
+
+        self._save(changes)
+
+        cutoff = time.time() - KEEP_SECONDS
+
+        with self._lock:
+            for tx_hash in [
+                h for h, t in self.transactions.items()
+                if t["status"] != "pending" and t["sent_at"] < cutoff
+            ]:
+                del self.transactions[tx_hash]
+                self._local.discard(tx_hash)
+
+    # -------------------------------
+    # Fee bumps
+    # -------------------------------
+
+    def _start_bump(self, tx_hash, nonce):
+
+        with self._lock:
+            if tx_hash not in self._local or tx_hash in self._bumping:
+                return
+
+            self._bumping.add(tx_hash)
+
+        self._bumper.submit(self._bump, tx_hash, nonce)
+
+    def _bump(self, tx_hash, nonce):
+
+        try:
+            self.on_stuck(tx_hash, nonce)
+
+        except Exception as e:
+            print(f"⚠️ Could not replace {tx_hash}:", e)
+
+            # Count the attempt, so a failing bump stops at MAX_BUMPS
+            with self._lock:
+                entry = self.transactions.get(tx_hash)
+
+                if entry:
+                    entry["bumps"] += 1
+
+        finally:
+            with self._lock:
+                self._bumping.discard(tx_hash)
+
+    def _run(self):
+
+        while True:
+
+            # Exit under the lock so track() never misses a running poller
+            with self._lock:
+                if not any(
+                    t["status"] == "pending" for t in self.transactions.values()
+                ):
+                    self._thread = None
+                    return
+
+            try:
+                self.poll_once()
+            except Exception as e:
+                print("❌ Receipt tracker error:", e)
+
+            time.sleep(POLL_SECONDS)
+
+    def _ensure_running(self):
+
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(
+                target=self._run,
+                name="receipt-tracker",
+                daemon=True
+            )
+            self._thread.start()
@@ -0,0 +1,119 @@
+from web3 import Web3
+
+from services.db import get_connection
+
+
+# ===============================
+# SCHEMA
+# ===============================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    block_number INTEGER NOT NULL,
+    log_index    INTEGER NOT NULL,
+    tx_hash      TEXT NOT NULL,
+    patient      TEXT NOT NULL,
+    cid          TEXT NOT NULL,
+    record_type  TEXT NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    added_by     TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+
+CREATE INDEX IF NOT EXISTS records_by_patient
+    ON records (patient, block_number, log_index);
+
+CREATE INDEX IF NOT EXISTS records_by_cid
+    ON records (cid);
+"""
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+# ===============================
+# INDEXER CALLBACKS
+# ===============================
+
+def apply_record_added(conn, event):
+
+    args = event["args"]
+
+    conn.execute(
+        "INSERT OR REPLACE INTO records "
+        "(block_number, log_index, tx_hash, patient, cid, record_type, "
+        "timestamp, added_by) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            event["blockNumber"],
+            event["logIndex"],
+            Web3.to_hex(event["transactionHash"]),
+            args["patient"],
+            args["cid"],
+            args["recordType"],
+            args["timestamp"],
+            args["addedBy"]
+        )
+    )
+
+
+def rollback_records(conn, block):
+
+    conn.execute(
+        "DELETE FROM records WHERE block_number > ?",
+        (block,)
+    )
+
+
+# ===============================
+# QUERIES
+# ===============================
+
+def get_records(patient):
+    """
+    Records of a patient in on-chain order
+    """
+
+    return get_connection().execute(
+        "SELECT cid, record_type, timestamp, added_by FROM records "
+        "WHERE patient = ? ORDER BY block_number, log_index",
+        (patient,)
+    ).fetchall()
+
+
+def count_records(patient):
+
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM records WHERE patient = ?",
+        (patient,)
+    ).fetchone()[0]
+
+
+def get_records_at(patient, positions):
+    """
+    Records at on-chain list positions; {position: record}
+    """
+
+    if not positions:
+        return {}
+
+    first, last = min(positions), max(positions)
+
+    rows = get_connection().execute(
+        "SELECT cid, record_type, timestamp, added_by FROM records "
+        "WHERE patient = ? ORDER BY block_number, log_index "
+        "LIMIT ? OFFSET ?",
+        (patient, last - first + 1, first)
+    ).fetchall()
+
+    return {first + i: row for i, row in enumerate(rows)}
+
+
+def find_record(patient, cid):
+
+    return get_connection().execute(
+        "SELECT cid, record_type, timestamp, added_by FROM records "
+        "WHERE patient = ? AND cid = ? LIMIT 1",
+        (patient, cid)
+    ).fetchone()
@@ -0,0 +1,489 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from web3 import Web3
+
+from config import RELAYER_BATCH_SIZE, RELAYER_POLL_SECONDS
+from services.db import get_connection
+
+
+# ===============================
+# META-TRANSACTION RELAYER
+# ===============================
+#
+# Signed grant/revoke requests are stored in SQLite and sent by a
+# background worker. Before anything costs gas, a request is checked
+# locally: the signature must recover to the patient, and a digest
+# already queued here is a replay. Right before sending, the pending
+# digests of a batch are checked against `usedHashes` in one call.
+#
+# Requests are handed to the single-writer queue without waiting for
+# one another, so nonces are pipelined and a batch is broadcast back to
+# back. Statuses follow the receipts:
+#
+#   queued -> sending -> submitted -> mined | reverted
+#                     -> rejected (already used) | failed (send error)
+#
+# A dropped transaction puts its request back in the queue, and so does
+# submitting a failed request again.
+
+# Claimed requests not submitted after this long (worker died) are
+# queued again; usedHashes keeps a resend from being applied twice
+RECLAIM_SECONDS = 300
+
+ACTIONS = ("grant", "revoke")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS relay_requests (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    action     TEXT NOT NULL,
+    patient    TEXT NOT NULL,
+    doctor     TEXT NOT NULL,
+    permanent  INTEGER NOT NULL,
+    expiry     TEXT NOT NULL,
+    nonce      TEXT NOT NULL,
+    signature  TEXT NOT NULL,
+    digest     TEXT NOT NULL UNIQUE,
+    status     TEXT NOT NULL,
+    tx_hash    TEXT,
+    error      TEXT,
+    claimed_by TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_relay_requests_status ON relay_requests (status, id);
+CREATE INDEX IF NOT EXISTS idx_relay_requests_tx ON relay_requests (tx_hash);
+"""
+
+
+def init_schema():
+
+    get_connection().executescript(_SCHEMA)
+
+
+# ===============================
+# SIGNATURES
+# ===============================
+
+def request_digest(action, patient, doctor, permanent, expiry, nonce, contract):
+    """
+    The hash the patient signs, as built by AccessControl
+    """
+
+    if action == "grant":
+        return Web3.solidity_keccak(
+            ["address", "address", "bool", "uint256", "uint256", "address"],
+            [patient, doctor, permanent, expiry, nonce, contract]
+        )
+
+    return Web3.solidity_keccak(
+        ["address", "address", "uint256", "address"],
+        [patient, doctor, nonce, contract]
+    )
+
+
+def recover_signer(digest, signature):
+    """
+    Address behind an EIP-191 signature of `digest`, None if malformed
+    """
+
+    try:
+        return Account.recover_message(
+            encode_defunct(primitive=digest),
+            signature=signature
+        )
+    except Exception:
+        return None
+
+
+def _view(row):
+
+    return {
+        "id": row["id"],
+        "action": row["action"],
+        "patient": row["patient"],
+        "doctor": row["doctor"],
+        "status": row["status"],
+        "tx_hash": row["tx_hash"],
+        "error": row["error"]
+    }
+
+
+# ===============================
+# RELAYER
+# ===============================
+
+class Relayer:
+    """
+    `send(action, patient, doctor, permanent, expiry, nonce, signature)`
+    queues the contract call and returns a Future for its tx hash;
+    `used(digests)` returns the on-chain usedHashes flag of each digest;
+    `tx_status(tx_hash)` is the receipt tracker's entry for a hash.
+    """
+
+    def __init__(self, contract_address, send, used, tx_status):
+
+        self.contract_address = contract_address
+        self.send = send
+        self.used = used
+        self.tx_status = tx_status
+
+        # Identifies this worker's claims
+        self.worker_id = f"{os.getpid()}-{id(self)}"
+
+        # request id -> Future resolved once the request left the queue
+        self._waiters = {}
+        self._waiters_lock = threading.Lock()
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------------
+    # Intake
+    # -------------------------------
+
+    def _validate(self, request):
+
+        action = request.get("action")
+
+        if action not in ACTIONS:
+            raise ValueError("action must be 'grant' or 'revoke'")
+
+        patient = request.get("patient") or ""
+        doctor = request.get("doctor") or ""
+
+        if not Web3.is_address(patient) or not Web3.is_address(doctor):
+            raise ValueError("Invalid address")
+
+        patient = Web3.to_checksum_address(patient)
+        doctor = Web3.to_checksum_address(doctor)
+
+        try:
+            nonce = int(request["nonce"])
+            permanent = bool(request.get("permanent", True))
+            expiry = int(request.get("expiry", 0))
+            signature = bytes.fromhex(request["signature"].removeprefix("0x"))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError("nonce and signature required")
+
+        if action == "revoke":
+            permanent, expiry = False, 0
+
+        digest = request_digest(
+            action,
+            patient,
+            doctor,
+            permanent,
+            expiry,
+            nonce,
+            self.contract_address
+        )
+
+        if len(signature) != 65 or recover_signer(digest, signature) != patient:
+            raise ValueError("Signature does not match the patient")
+
+        return (
+            action,
+            patient,
+            doctor,
+            int(permanent),
+            str(expiry),
+            str(nonce),
+            Web3.to_hex(signature),
+            Web3.to_hex(digest)
+        )
+
+    def submit(self, requests):
+        """
+        Validate and queue signed requests. One result per request:
+        its status view, "duplicate" with the earlier request's id, or
+        "invalid" with the reason.
+        """
+
+        results = []
+        rows = []
+
+        for request in requests:
+            try:
+                rows.append((len(results), self._validate(request)))
+                results.append(None)
+            except ValueError as e:
+                results.append({"status": "invalid", "error": str(e)})
+
+        conn = get_connection()
+        now = time.time()
+
+        with conn:
+            for position, row in rows:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO relay_requests "
+                    "(action, patient, doctor, permanent, expiry, nonce, "
+                    "signature, digest, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    row + (now, now)
+                )
+
+                if cur.rowcount == 1:
+                    results[position] = {"id": cur.lastrowid, "status": "queued"}
+                    continue
+
+                # Never broadcast (send error): safe to try again
+                retried = conn.execute(
+                    "UPDATE relay_requests SET status = 'queued', signature = ?, "
+                    "error = NULL, claimed_by = NULL, updated_at = ? "
+                    "WHERE digest = ? AND status = 'failed' RETURNING id",
+                    (row[-2], now, row[-1])
+                ).fetchone()
+
+                if retried:
+                    results[position] = {"id": retried["id"], "status": "queued"}
+                    continue
+
+                # Same digest already relayed: a replay, never sent twice
+                existing = conn.execute(
+                    "SELECT id FROM relay_requests WHERE digest = ?",
+                    (row[-1],)
+                ).fetchone()
+
+                results[position] = {
+                    "id": existing["id"],
+                    "status": "duplicate",
+                    "error": "Signature already relayed"
+                }
+
+        if rows:
+            self._wake.set()
+
+        return results
+
+    def status(self, request_id):
+
+        row = get_connection().execute(
+            "SELECT * FROM relay_requests WHERE id = ?",
+            (request_id,)
+        ).fetchone()
+
+        return _view(row) if row else None
+
+    def waiter(self, request_id):
+        """
+        Future resolved with the status view once the request has been
+        sent, rejected or failed
+        """
+
+        with self._waiters_lock:
+            future = self._waiters.setdefault(request_id, Future())
+
+        # Already out of the queue before anyone waited
+        current = self.status(request_id)
+
+        if current and current["status"] not in ("queued", "sending"):
+            self._resolve(request_id, current)
+
+        return future
+
+    def forget_waiter(self, request_id):
+        """
+        Drop the Future of a caller that stopped waiting
+        """
+
+        with self._waiters_lock:
+            self._waiters.pop(request_id, None)
+
+    def _resolve(self, request_id, view):
+
+        with self._waiters_lock:
+            future = self._waiters.pop(request_id, None)
+
+        if future is not None and not future.done():
+            future.set_result(view)
+
+    # -------------------------------
+    # Worker
+    # -------------------------------
+
+    def _update(self, conn, request_id, **fields):
+
+        fields["updated_at"] = time.time()
+
+        conn.execute(
+            "UPDATE relay_requests SET "
+            + ", ".join(f"{k} = ?" for k in fields)
+            + " WHERE id = ?",
+            (*fields.values(), request_id)
+        )
+
+    def _claim(self):
+
+        conn = get_connection()
+
+        with conn:
+            conn.execute(
+                "UPDATE relay_requests SET status = 'queued', claimed_by = NULL "
+                "WHERE status = 'sending' AND updated_at < ?",
+                (time.time() - RECLAIM_SECONDS,)
+            )
+
+            conn.execute(
+                "UPDATE relay_requests SET status = 'sending', claimed_by = ?, "
+                "updated_at = ? WHERE id IN ("
+                "SELECT id FROM relay_requests WHERE status = 'queued' "
+                "ORDER BY id LIMIT ?)",
+                (self.worker_id, time.time(), RELAYER_BATCH_SIZE)
+            )
+
+        return conn.execute(
+            "SELECT * FROM relay_requests "
+            "WHERE status = 'sending' AND claimed_by = ? ORDER BY id",
+            (self.worker_id,)
+        ).fetchall()
+
+    def drain_once(self):
+        """
+        Send one batch of queued requests; returns how many were claimed
+        """
+
+        rows = self._claim()
+
+        if not rows:
+            return 0
+
+        used = self.used([row["digest"] for row in rows])
+        outcomes = []
+        pending = []
+
+        for row, already_used in zip(rows, used):
+
+            if already_used:
+                outcomes.append((row, {
+                    "status": "rejected",
+                    "error": "Signature already used on chain"
+                }))
+                continue
+
+            pending.append((row, self.send(
+                row["action"],
+                row["patient"],
+                row["doctor"],
+                bool(row["permanent"]),
+                int(row["expiry"]),
+                int(row["nonce"]),
+                bytes.fromhex(row["signature"][2:])
+            )))
+
+        # The whole batch is in the writer queue: now collect the hashes.
+        # No transaction is open meanwhile, the writer records receipts.
+        for row, future in pending:
+            try:
+                outcomes.append((row, {
+                    "status": "submitted",
+                    "tx_hash": future.result()
+                }))
+            except Exception as e:
+                outcomes.append((row, {"status": "failed", "error": str(e)}))
+
+        conn = get_connection()
+
+        with conn:
+            for row, fields in outcomes:
+                self._update(conn, row["id"], **fields)
+
+        # Receipts seen before the hashes were stored here
+        for _, fields in outcomes:
+            if fields.get("tx_hash"):
+                self._reconcile(fields["tx_hash"])
+
+        for row in rows:
+            self._resolve(row["id"], self.status(row["id"]))
+
+        return len(rows)
+
+    def _reconcile(self, tx_hash):
+
+        while tx_hash:
+            entry = self.tx_status(tx_hash)
+
+            if entry is None:
+                return
+
+            self.on_tx_status(tx_hash, entry)
+
+            tx_hash = entry["replaced_by"] if entry["status"] in (
+                "pending", "replaced"
+            ) else None
+
+    def on_tx_status(self, tx_hash, entry):
+        """
+        ReceiptTracker listener: follow relayed transactions to the end
+        """
+
+        status = entry["status"]
+        conn = get_connection()
+
+        with conn:
+            if status in ("pending", "replaced") and entry["replaced_by"]:
+                # Fee-bumped: the replacement now carries the request
+                conn.execute(
+                    "UPDATE relay_requests SET tx_hash = ?, updated_at = ? "
+                    "WHERE tx_hash = ? AND status = 'submitted'",
+                    (entry["replaced_by"], time.time(), tx_hash)
+                )
+
+            elif status in ("mined", "reverted"):
+                conn.execute(
+                    "UPDATE relay_requests SET status = ?, updated_at = ? "
+                    "WHERE tx_hash = ? AND status = 'submitted'",
+                    (status, time.time(), tx_hash)
+                )
+
+            elif status == "dropped":
+                cur = conn.execute(
+                    "UPDATE relay_requests SET status = 'queued', tx_hash = NULL, "
+                    "claimed_by = NULL, updated_at = ? "
+                    "WHERE tx_hash = ? AND status = 'submitted'",
+                    (time.time(), tx_hash)
+                )
+
+                if cur.rowcount:
+                    self._wake.set()
+
+    def _run(self):
+
+        while not self._stop.is_set():
+
+            try:
+                if self.drain_once():
+                    continue
+            except Exception as e:
+                print("❌ Relayer error:", e)
+
+            self._wake.wait(RELAYER_POLL_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="relayer",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+
+        self._stop.set()
+        self._wake.set()
+
+        if self._thread:
+            self._thread.join(timeout=10)
@@ -0,0 +1,691 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+
+from config import (
+    RPC_URLS,
+    RPC_TIMEOUT_SECONDS,
+    RPC_POOL_SIZE,
+    RPC_HEDGE_PERCENTILE,
+    RPC_BREAKER_FAILURES,
+    RPC_BREAKER_COOLDOWN_SECONDS
+)
+from services import metrics
+
+
+# ===============================
+# RPC ENDPOINT POOL
+# ===============================
+#
+# Reads go to the healthy endpoint with the best latency / error score
+# and fail over to the next one on transport errors. An `eth_call` that
+# is still running after RPC_HEDGE_PERCENTILE of its endpoint's recent
+# latencies is also sent to the runner-up; the first answer wins.
+#
+# Writes, and the reads a writer depends on (pending nonce, receipts),
+# stay on one endpoint so nonces and mempool state are consistent. The
+# pin only moves when that endpoint's breaker opens or one of these
+# calls had to fail over to another endpoint.
+#
+# After RPC_BREAKER_FAILURES consecutive transport failures an endpoint
+# is skipped for RPC_BREAKER_COOLDOWN_SECONDS, then half-open: a single
+# probe request goes through while the others still skip it. Success
+# closes the breaker, failure opens it for another cooldown.
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# Seconds of latency one failure is worth when ranking endpoints
+ERROR_PENALTY_SECONDS = 5.0
+
+# Recent latencies kept per endpoint for the hedge threshold
+LATENCY_SAMPLES = 200
+
+# Hedge delay until an endpoint has this many samples
+MIN_HEDGE_SAMPLES = 20
+DEFAULT_HEDGE_SECONDS = 0.5
+MIN_HEDGE_SECONDS = 0.02
+
+CONNECT_TIMEOUT = 3.05
+
+# Sent to the write endpoint only
+PINNED_METHODS = {
+    "eth_sendRawTransaction",
+    "eth_sendTransaction",
+    "eth_getTransactionCount",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt"
+}
+
+# Hedged to a second endpoint when slow
+HEDGED_METHODS = {"eth_call"}
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="rpc-hedge")
+
+
+class _Race:
+    """
+    Replies of one hedged request; dropped once it has been answered
+    """
+
+    def __init__(self):
+
+        self.results = queue.Queue()
+        self.won = False
+
+    def report(self, endpoint, content, error):
+
+        if not self.won:
+            self.results.put((endpoint, content, error))
+
+
+class Endpoint:
+
+    def __init__(self, url, rank):
+
+        self.url = url
+        self.rank = rank
+
+        self.latency = None
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+
+        self._lock = threading.Lock()
+
+    def record(self, latency, failed):
+
+        with self._lock:
+            self.requests += 1
+
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += EWMA_ALPHA * (latency - self.latency)
+
+            self.error_rate += EWMA_ALPHA * (float(failed) - self.error_rate)
+
+            if not failed:
+                if self.open_until:
+                    print(f"✅ RPC endpoint {self.url} answered, back in rotation")
+
+                self.samples.append(latency)
+                self.failures = 0
+                self.open_until = 0.0
+                self.probing = False
+                return
+
+            self.errors += 1
+            self.failures += 1
+
+            if self.failures >= RPC_BREAKER_FAILURES:
+                if self.failures == RPC_BREAKER_FAILURES:
+                    print(f"⚠️ RPC endpoint {self.url} failing, taken out of rotation")
+
+                # Also a failed probe: open for another cooldown
+                self.open_until = time.time() + RPC_BREAKER_COOLDOWN_SECONDS
+                self.probing = False
+
+    def available(self):
+        """
+        Closed, or cooled down with no probe in flight
+        """
+
+        if not self.open_until:
+            return True
+
+        return not self.probing and time.time() >= self.open_until
+
+    def allow(self):
+        """
+        Claim a request: always granted while closed; while open, only
+        one probe once the cooldown has passed (half-open)
+        """
+
+        with self._lock:
+            if not self.open_until:
+                return True
+
+            if self.probing or time.time() < self.open_until:
+                return False
+
+            self.probing = True
+
+        return True
+
+    def release(self):
+        """
+        A probe ended without an answer either way (lost a hedge race)
+        """
+
+        with self._lock:
+            self.probing = False
+
+    def score(self):
+
+        return (self.latency or 0.0) + self.error_rate * ERROR_PENALTY_SECONDS
+
+    def hedge_delay(self):
+
+        with self._lock:
+            if len(self.samples) < MIN_HEDGE_SAMPLES:
+                return DEFAULT_HEDGE_SECONDS
+
+            ordered = sorted(self.samples)
+
+        index = min(
+            int(len(ordered) * RPC_HEDGE_PERCENTILE / 100),
+            len(ordered) - 1
+        )
+
+        return max(ordered[index], MIN_HEDGE_SECONDS)
+
+    def stats(self):
+
+        return {
+            "url": self.url,
+            "latency": self.latency,
+            "errorRate": round(self.error_rate, 4),
+            "hedgeDelay": self.hedge_delay(),
+            "open": not self.available(),
+            "probing": self.probing,
+            "requests": self.requests,
+            "errors": self.errors,
+            "hedges": self.hedges
+        }
+
+
+class RpcPool:
+
+    def __init__(self, urls):
+
+        self.endpoints = [Endpoint(url, rank) for rank, url in enumerate(urls)]
+
+        self._writer = self.endpoints[0] if self.endpoints else None
+        self._writer_listeners = []
+        self._lock = threading.Lock()
+
+    def ranked(self):
+        """
+        Available endpoints best first; when every breaker is open, all
+        of them by reopening time, so a request is never refused outright
+        """
+
+        healthy = [e for e in self.endpoints if e.available()]
+
+        if healthy:
+            return sorted(healthy, key=lambda e: (e.score(), e.rank))
+
+        return sorted(self.endpoints, key=lambda e: e.open_until)
+
+    def admit(self, endpoint):
+        """
+        Whether a request may go to `endpoint` now. Refused only while
+        another endpoint is available: with every breaker open requests
+        still go out (see `ranked`), each one a probe.
+        """
+
+        if endpoint.allow():
+            return True
+
+        return not any(e.available() for e in self.endpoints)
+
+    def writer(self):
+        """
+        The endpoint writes are pinned to. Moves (in configuration
+        order) when its breaker opens.
+        """
+
+        current = self._writer
+
+        if current is None or current.available():
+            return current
+
+        healthy = [e for e in self.endpoints if e.available()]
+
+        if healthy:
+            self._move_writer(current, healthy[0])
+
+        return self._writer
+
+    def _move_writer(self, current, endpoint):
+
+        with self._lock:
+            if self._writer is not current:
+                return
+
+            self._writer = endpoint
+
+        print(f"⚠️ RPC writes moved from {current.url} to {endpoint.url}")
+
+        for listener in list(self._writer_listeners):
+            listener()
+
+    def add_writer_listener(self, listener):
+        """
+        `listener()` is called after writes move to another endpoint
+        """
+
+        self._writer_listeners.append(listener)
+
+    def route(self, method):
+        """
+        Endpoints to try for `method`, in order
+        """
+
+        if method not in PINNED_METHODS:
+            return self.ranked()
+
+        writer = self.writer()
+
+        # Failover for pinned calls too; `answered` then moves the pin
+        return [writer] + [e for e in self.ranked() if e is not writer]
+
+    def route_batch(self, methods):
+
+        return self.route(self._pinned(methods))
+
+    def _pinned(self, methods):
+
+        return next((m for m in methods if m in PINNED_METHODS), None)
+
+    def answered(self, methods, endpoint):
+        """
+        A pinned call that had to fail over pins writes to the
+        endpoint that answered it
+        """
+
+        current = self._writer
+
+        if endpoint is not current and self._pinned(methods):
+            self._move_writer(current, endpoint)
+
+    def stats(self):
+
+        return {
+            "writer": self._writer.url if self._writer else None,
+            "endpoints": [e.stats() for e in self.endpoints]
+        }
+
+
+pool = RpcPool(RPC_URLS)
+
+
+def _breaker_open(endpoint):
+
+    return ConnectionError(f"circuit breaker open for {endpoint.url}")
+
+
+def _no_endpoint(errors):
+
+    return ConnectionError(
+        "No RPC endpoint answered: " + ("; ".join(errors) or "none configured")
+    )
+
+
+# ===============================
+# SYNC PROVIDER
+# ===============================
+
+def _measured(methods, started, failed):
+    """
+    Record one request (or batch) in the RPC metrics
+    """
+
+    label = methods[0] if len(methods) == 1 else "batch"
+    metrics.RPC_SECONDS.observe(time.perf_counter() - started, method=label)
+
+    for method in methods:
+        metrics.RPC_CALLS.inc(method=method)
+
+        if failed:
+            metrics.RPC_ERRORS.inc(method=method)
+
+
+class PooledProvider(JSONBaseProvider):
+    """
+    web3 provider over `pool`; a drop-in for HTTPProvider
+    """
+
+    def __init__(self, rpc_pool=pool):
+
+        super().__init__()
+
+        self.pool = rpc_pool
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=RPC_POOL_SIZE
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def __str__(self):
+
+        return f"RPC pool {[e.url for e in self.pool.endpoints]}"
+
+    def _post(self, endpoint, body):
+
+        if not self.pool.admit(endpoint):
+            raise _breaker_open(endpoint)
+
+        started = time.monotonic()
+
+        try:
+            res = self._session.post(
+                endpoint.url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=(CONNECT_TIMEOUT, RPC_TIMEOUT_SECONDS)
+            )
+            res.raise_for_status()
+
+        except Exception:
+            endpoint.record(time.monotonic() - started, True)
+            raise
+
+        endpoint.record(time.monotonic() - started, False)
+
+        return res.content
+
+    def _failover(self, order, body, methods):
+
+        errors = []
+
+        for endpoint in order:
+            try:
+                content = self._post(endpoint, body)
+            except Exception as e:
+                errors.append(f"{endpoint.url}: {e}")
+                continue
+
+            self.pool.answered(methods, endpoint)
+
+            return content
+
+        raise _no_endpoint(errors)
+
+    def _attempt(self, endpoint, body, race):
+
+        # Not started before the other endpoint answered: skip it
+        if race.won:
+            return
+
+        try:
+            race.report(endpoint, self._post(endpoint, body), None)
+        except Exception as e:
+            race.report(endpoint, None, e)
+
+    def _hedged(self, order, body):
+
+        race = _Race()
+        attempts = []
+        launched = 0
+        pending = 0
+        errors = []
+
+        def launch():
+            nonlocal launched, pending
+
+            attempts.append(
+                _executor.submit(self._attempt, order[launched], body, race)
+            )
+            launched += 1
+            pending += 1
+
+        try:
+            while launched < len(order) or pending:
+
+                if pending == 0:
+                    # Nothing in flight (start, or everyone failed): go now
+                    launch()
+
+                # At most one hedge; later endpoints are failover only
+                hedge = launched == 1 and len(order) > 1
+
+                try:
+                    endpoint, content, error = race.results.get(
+                        timeout=order[0].hedge_delay() if hedge else None
+                    )
+                except queue.Empty:
+                    order[1].hedges += 1
+                    launch()
+                    continue
+
+                pending -= 1
+
+                if content is not None:
+                    return content
+
+                errors.append(f"{endpoint.url}: {error}")
+
+        finally:
+            # The loser's POST cannot be interrupted once sent, but it is
+            # cancelled if still queued and its reply is dropped
+            race.won = True
+
+            for attempt in attempts:
+                attempt.cancel()
+
+        raise _no_endpoint(errors)
+
+    def make_request(self, method, params):
+
+        body = self.encode_rpc_request(method, params)
+        order = self.pool.route(method)
+        started = time.perf_counter()
+
+        try:
+            if method in HEDGED_METHODS:
+                content = self._hedged(order, body)
+            else:
+                content = self._failover(order, body, [method])
+        except Exception:
+            _measured([method], started, True)
+            raise
+
+        _measured([method], started, False)
+
+        return self.decode_rpc_response(content)
+
+    def make_batch_request(self, calls):
+        """
+        One JSON-RPC batch of (method, params) calls; replies are
+        returned in request order
+        """
+
+        body = json.dumps([
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]).encode()
+
+        methods = [method for method, _ in calls]
+        order = self.pool.route_batch(methods)
+        started = time.perf_counter()
+
+        try:
+            content = self._failover(order, body, methods)
+        except Exception:
+            _measured(methods, started, True)
+            raise
+
+        _measured(methods, started, False)
+
+        replies = json.loads(content)
+
+        return sorted(replies, key=lambda r: r["id"])
+
+
+# ===============================
+# ASYNC PROVIDER
+# ===============================
+
+class AsyncPooledProvider(AsyncJSONBaseProvider):
+    """
+    Async counterpart of PooledProvider, sharing the same pool (and so
+    the same latency, hedging and breaker state)
+    """
+
+    def __init__(self, rpc_pool=pool):
+
+        super().__init__()
+
+        self.pool = rpc_pool
+        self._session = None
+        self._loop = None
+
+    def __str__(self):
+
+        return f"Async RPC pool {[e.url for e in self.pool.endpoints]}"
+
+    def _get_session(self):
+        """
+        One pooled session per event loop
+        """
+
+        loop = asyncio.get_running_loop()
+
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._loop = loop
+            self._session = ClientSession(
+                connector=TCPConnector(limit=RPC_POOL_SIZE),
+                timeout=ClientTimeout(
+                    total=RPC_TIMEOUT_SECONDS,
+                    connect=CONNECT_TIMEOUT
+                )
+            )
+
+        return self._session
+
+    async def disconnect(self):
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+        self._session = None
+
+    async def _post(self, endpoint, body):
+
+        if not self.pool.admit(endpoint):
+            raise _breaker_open(endpoint)
+
+        started = time.monotonic()
+
+        try:
+            async with self._get_session().post(
+                endpoint.url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                raise_for_status=True
+            ) as res:
+                content = await res.read()
+
+        except asyncio.CancelledError:
+            # Lost a hedge race: neither a success nor a failure
+            endpoint.release()
+            raise
+
+        except Exception:
+            endpoint.record(time.monotonic() - started, True)
+            raise
+
+        endpoint.record(time.monotonic() - started, False)
+
+        return content
+
+    async def _failover(self, order, body, methods):
+
+        errors = []
+
+        for endpoint in order:
+            try:
+                content = await self._post(endpoint, body)
+            except Exception as e:
+                errors.append(f"{endpoint.url}: {e}")
+                continue
+
+            self.pool.answered(methods, endpoint)
+
+            return content
+
+        raise _no_endpoint(errors)
+
+    async def _hedged(self, order, body):
+
+        if len(order) < 2:
+            return await self._failover(order, body, ())
+
+        first = asyncio.ensure_future(self._post(order[0], body))
+
+        done, _ = await asyncio.wait({first}, timeout=order[0].hedge_delay())
+
+        if done and first.exception() is None:
+            return first.result()
+
+        tasks = {first}
+
+        if not done:
+            order[1].hedges += 1
+
+        tasks.add(asyncio.ensure_future(self._post(order[1], body)))
+
+        errors = []
+
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+
+                    errors.append(str(task.exception()))
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Both hedged endpoints failed: the rest are failover only
+        try:
+            return await self._failover(order[2:], body, ())
+        except ConnectionError as e:
+            raise _no_endpoint(errors + [str(e)])
+
+    async def make_request(self, method, params):
+
+        body = self.encode_rpc_request(method, params)
+        order = self.pool.route(method)
+        started = time.perf_counter()
+
+        try:
+            if method in HEDGED_METHODS:
+                content = await self._hedged(order, body)
+            else:
+                content = await self._failover(order, body, [method])
+        except Exception:
+            _measured([method], started, True)
+            raise
+
+        _measured([method], started, False)
+
+        return self.decode_rpc_response(content)
@@ -0,0 +1,255 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from web3 import Web3
+
+from services import metrics
+
+
+# Node errors that mean our idea of the next nonce is wrong (the last
+# one is eth-tester's)
+_NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "replacement transaction underpriced",
+    "invalid transaction nonce"
+)
+
+# Node errors that mean this exact signed transaction is already in the
+# mempool (e.g. a retried send whose first reply was lost): it was sent
+_KNOWN_ERRORS = (
+    "already known",
+    "known transaction"
+)
+
+# Resync-and-retry attempts for a transaction hitting a nonce error
+NONCE_RETRIES = 2
+
+# Sent transactions remembered for fee-bumped replacement
+SENT_HISTORY = 10000
+
+
+def _is_nonce_error(error):
+
+    message = str(error).lower()
+
+    return any(e in message for e in _NONCE_ERRORS)
+
+
+def _is_known_error(error):
+
+    message = str(error).lower()
+
+    return any(e in message for e in _KNOWN_ERRORS)
+
+
+# ===============================
+# NONCE MANAGER
+# ===============================
+
+class NonceManager:
+    """
+    Hands out sequential nonces from memory, one RPC at start-up
+    and after errors instead of one per transaction.
+    """
+
+    def __init__(self, w3, address):
+
+        self.w3 = w3
+        self.address = address
+
+        self._next = None
+        self._lock = threading.Lock()
+
+    def next(self):
+
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(
+                    self.address,
+                    "pending"
+                )
+
+            nonce = self._next
+            self._next += 1
+
+            return nonce
+
+    def reset(self):
+        """
+        Re-read the nonce from the node on next use. Lock-free: it may
+        run inside `next()`, from the provider, when writes move to
+        another endpoint.
+        """
+
+        self._next = None
+
+    def release(self, nonce):
+        """
+        Hand `nonce` out again: the transaction using it was never sent
+        """
+
+        with self._lock:
+            if self._next == nonce + 1:
+                self._next = nonce
+
+    def resync(self):
+
+        with self._lock:
+            self._next = self.w3.eth.get_transaction_count(
+                self.address,
+                "pending"
+            )
+
+
+# ===============================
+# SINGLE-WRITER TRANSACTION QUEUE
+# ===============================
+
+class TxQueue:
+    """
+    Serializes nonce assignment, signing and broadcast for the backend
+    wallet on one thread.
+
+    `submit(build)` returns a Future resolved with the tx hash as soon
+    as the node accepts the transaction; receipts are followed by the
+    tracker, so callers can queue many writes without waiting on blocks.
+    `build(nonce)` must return an unsigned transaction dict.
+
+    `replace(tx_hash, fees)` re-sends a stuck transaction with the same
+    nonce and the fee fields returned by `fees(tx)`.
+    """
+
+    def __init__(self, w3, address, private_key, tracker=None):
+
+        self.w3 = w3
+        self.private_key = private_key
+        self.tracker = tracker
+
+        self.nonces = NonceManager(w3, address)
+
+        # tx_hash -> unsigned tx, for replacements
+        self._sent = OrderedDict()
+
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, build):
+
+        return self._enqueue(lambda: self._send(build))
+
+    def replace(self, tx_hash, fees):
+
+        return self._enqueue(lambda: self._resend(tx_hash, fees))
+
+    def _enqueue(self, job):
+
+        future = Future()
+
+        self._ensure_running()
+        metrics.IN_FLIGHT.inc(kind="tx_queue")
+        self._jobs.put((job, future, time.perf_counter()))
+
+        return future
+
+    def _broadcast(self, tx):
+
+        with metrics.stage("sign"):
+            signed = self.w3.eth.account.sign_transaction(tx, self.private_key)
+
+        with metrics.stage("send_tx"):
+            try:
+                tx_hash = Web3.to_hex(
+                    self.w3.eth.send_raw_transaction(signed.raw_transaction)
+                )
+            except Exception as e:
+                if not _is_known_error(e):
+                    raise
+
+                tx_hash = Web3.to_hex(signed.hash)
+
+        self._sent[tx_hash] = tx
+
+        while len(self._sent) > SENT_HISTORY:
+            self._sent.popitem(last=False)
+
+        return tx_hash
+
+    def _resend(self, tx_hash, fees):
+
+        tx = self._sent.get(tx_hash)
+
+        if tx is None:
+            raise KeyError(f"Unknown transaction {tx_hash}")
+
+        new_hash = self._broadcast({**tx, **fees(tx)})
+
+        return new_hash, tx["nonce"], tx_hash
+
+    def _send(self, build):
+
+        for attempt in range(NONCE_RETRIES + 1):
+
+            with metrics.stage("nonce"):
+                nonce = self.nonces.next()
+
+            try:
+                with metrics.stage("build_tx"):
+                    tx = build(nonce)
+
+                return self._broadcast(tx), nonce, None
+
+            except Exception as e:
+                if not _is_nonce_error(e):
+                    # Rejected before use (e.g. a revert found by gas
+                    # estimation): no RPC needed to avoid a gap
+                    self.nonces.release(nonce)
+                    raise
+
+                # The node disagrees with our nonce: re-read it
+                self.nonces.resync()
+
+                if attempt == NONCE_RETRIES:
+                    raise
+
+    def _run(self):
+
+        while True:
+            job, future, queued_at = self._jobs.get()
+
+            metrics.IN_FLIGHT.dec(kind="tx_queue")
+            metrics.STAGE_SECONDS.observe(
+                time.perf_counter() - queued_at,
+                stage="tx_queue_wait"
+            )
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                tx_hash, nonce, replaces = job()
+            except Exception as e:
+                future.set_exception(e)
+                continue
+
+            if self.tracker:
+                self.tracker.track(tx_hash, nonce, replaces=replaces)
+
+            future.set_result(tx_hash)
+
+    def _ensure_running(self):
+
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._run,
+                name="tx-writer",
+                daemon=True
+            )
+            self._thread.start()
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import PINATA_UPLOAD_CONCURRENCY
+from services import content_index, key_store, metrics
+from services.async_blockchain import add_record
+from services.async_pinata import upload_stream_to_ipfs
+from services.crypto import content_hasher, encrypt_stream, iter_file
+
+
+# ===============================
+# STAGED BULK UPLOAD
+# ===============================
+#
+# encrypt (CPU pool) -> pin (concurrent uploads) -> anchor (tx queue)
+#
+# Stages are joined by bounded queues, so a slow stage holds back the
+# ones before it instead of piling encrypted files up on disk.
+
+ENCRYPT_WORKERS = os.cpu_count() or 2
+
+# Encrypted files waiting for each following stage
+QUEUE_DEPTH = 16
+
+# Encrypted output stays in RAM up to this size, then spills to disk
+SPOOL_BYTES = 8 * 1024 * 1024
+
+_encrypt_pool = ThreadPoolExecutor(
+    max_workers=ENCRYPT_WORKERS,
+    thread_name_prefix="encrypt"
+)
+
+_DONE = object()
+
+
+def _encrypt(job, key, dedupe):
+    """
+    Fingerprint (optional, keyed by `key`) and encrypt one file with the
+    patient's key; runs on the CPU pool
+    """
+
+    src = job["file"]
+
+    if dedupe:
+        src.seek(0)
+        hasher = content_hasher(key)
+
+        with metrics.stage("fingerprint"):
+            for block in iter_file(src):
+                hasher.update(block)
+
+        job["digest"] = hasher.hexdigest()
+        job["cid"] = content_index.find_cid(job["patient"], job["digest"])
+
+        if job["cid"]:
+            return job
+
+    src.seek(0)
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+
+    try:
+        data_key, flags = key_store.encryption_key(job["patient"])
+        read = metrics.TimedBlocks(iter_file(src), "read")
+
+        for block in metrics.TimedBlocks(
+            encrypt_stream(read, data_key, flags=flags),
+            "encrypt",
+            read
+        ):
+            out.write(block)
+
+    except Exception:
+        # Failed item: release the spooled output (a temp file past
+        # SPOOL_BYTES) before the error is reported
+        out.close()
+        raise
+
+    job["encrypted"] = out
+    job["size"] = out.tell()
+
+    return job
+
+
+def _event(job, status, **extra):
+
+    return {
+        "index": job["index"],
+        "filename": job["filename"],
+        "status": status,
+        **extra
+    }
+
+
+async def run(jobs, key, dedupe=False, record_duplicate=False):
+    """
+    Upload many records, yielding one progress event per stage per file
+    and a final summary.
+
+    Each job is a dict with `index`, `file` (seekable), `filename`,
+    `patient` and `record_type`.
+    """
+
+    loop = asyncio.get_running_loop()
+
+    events = asyncio.Queue()
+    to_encrypt = asyncio.Queue()
+    to_pin = asyncio.Queue(QUEUE_DEPTH)
+    to_anchor = asyncio.Queue(QUEUE_DEPTH)
+
+    counts = {"anchored": 0, "duplicate": 0, "failed": 0}
+
+    def fail(job, stage, error):
+        counts["failed"] += 1
+        events.put_nowait(_event(job, "failed", stage=stage, error=str(error)))
+
+    async def encrypt_worker():
+        while (job := await to_encrypt.get()) is not _DONE:
+            try:
+                await loop.run_in_executor(_encrypt_pool, _encrypt, job, key, dedupe)
+            except Exception as e:
+                fail(job, "encrypt", e)
+                continue
+
+            if job.get("cid"):
+                if not record_duplicate:
+                    counts["duplicate"] += 1
+                    events.put_nowait(_event(job, "duplicate", cid=job["cid"]))
+                    continue
+
+                # Reuse the pinned copy, only anchor again
+                await to_anchor.put(job)
+                continue
+
+            events.put_nowait(_event(job, "encrypted", size=job["size"]))
+            await to_pin.put(job)
+
+    async def pin_worker():
+        while (job := await to_pin.get()) is not _DONE:
+            encrypted = job.pop("encrypted")
+
+            def blocks():
+                encrypted.seek(0)
+                return iter_file(encrypted)
+
+            try:
+                job["cid"] = await upload_stream_to_ipfs(
+                    blocks,
+                    job["size"],
+                    # Random name: the original filename must not reach Pinata
+                    str(uuid.uuid4()) + ".enc"
+                )
+            except Exception as e:
+                fail(job, "pin", e)
+                continue
+            finally:
+                encrypted.close()
+
+            events.put_nowait(_event(job, "pinned", cid=job["cid"]))
+            await to_anchor.put(job)
+
+    async def anchor(job):
+        try:
+            tx_hash = await add_record(
+                job["patient"],
+                job["cid"],
+                job["record_type"],
+                job["filename"]
+            )
+
+            if job.get("digest"):
+                await asyncio.to_thread(
+                    content_index.save_cid,
+                    job["patient"],
+                    job["digest"],
+                    job["cid"]
+                )
+
+        except Exception as e:
+            fail(job, "anchor", e)
+            return
+
+        counts["anchored"] += 1
+        events.put_nowait(
+            _event(job, "anchored", cid=job["cid"], transaction_hash=tx_hash)
+        )
+
+    async def anchor_stage():
+        # Submitted in arrival order; the tx queue assigns the nonces
+        pending = []
+
+        while (job := await to_anchor.get()) is not _DONE:
+            pending.append(asyncio.create_task(anchor(job)))
+
+        await asyncio.gather(*pending)
+
+    async def pipeline():
+        for job in jobs:
+            to_encrypt.put_nowait(job)
+
+        encrypters = [
+            asyncio.create_task(encrypt_worker())
+            for _ in range(ENCRYPT_WORKERS)
+        ]
+        pinners = [
+            asyncio.create_task(pin_worker())
+            for _ in range(PINATA_UPLOAD_CONCURRENCY)
+        ]
+        anchorer = asyncio.create_task(anchor_stage())
+
+        stages = encrypters + pinners + [anchorer]
+
+        try:
+            for _ in encrypters:
+                to_encrypt.put_nowait(_DONE)
+            await asyncio.gather(*encrypters)
+
+            for _ in pinners:
+                await to_pin.put(_DONE)
+            await asyncio.gather(*pinners)
+
+            await to_anchor.put(_DONE)
+            await anchorer
+
+        finally:
+            for task in stages:
+                task.cancel()
+
+            # Client gone or crash: drop encrypted files still queued
+            while not to_pin.empty():
+                job = to_pin.get_nowait()
+
+                if job is not _DONE:
+                    job["encrypted"].close()
+
+            events.put_nowait(_DONE)
+
+    task = asyncio.create_task(pipeline())
+
+    try:
+        while (event := await events.get()) is not _DONE:
+            yield event
+
+        await task
+
+        yield {
+            "status": "done",
+            "total": len(jobs),
+            **counts
+        }
+
+    finally:
+        task.cancel()
@@ -0,0 +1,76 @@
+import time
+
+from eth_account import Account
+
+from config import ACCESS_CACHE_TTL_SECONDS, ACCESS_CACHE_NEGATIVE_TTL_SECONDS
+from services.access_cache import AccessCache
+
+
+def _ttl(cache, patient, doctor):
+
+    return cache._entries[(patient, doctor)][1] - time.time()
+
+
+def _near(value, expected):
+
+    return abs(value - expected) < 1
+
+
+def main():
+
+    try:
+        print("=== Access Cache Test ===\n")
+
+        cache = AccessCache()
+        patient = Account.create().address
+        doctors = [Account.create().address for _ in range(5)]
+
+        # Permanent grant: the full TTL
+        if cache.put(patient, doctors[0], True, 0) is not True:
+            raise ValueError("Permanent grant not allowed")
+
+        if not _near(_ttl(cache, patient, doctors[0]), ACCESS_CACHE_TTL_SECONDS):
+            raise ValueError("Permanent grant not cached for ACCESS_CACHE_TTL_SECONDS")
+
+        # Temporary grant: only until it expires
+        cache.put(patient, doctors[1], False, time.time() + 1)
+
+        if cache.get(patient, doctors[1]) is not True:
+            raise ValueError("Temporary grant not cached")
+
+        time.sleep(1.1)
+
+        if cache.get(patient, doctors[1]) is not None:
+            raise ValueError("Expired temporary grant still cached")
+
+        # Refusal: the negative TTL
+        if cache.put(patient, doctors[2], False, 0) is not False:
+            raise ValueError("Missing grant allowed")
+
+        if not _near(_ttl(cache, patient, doctors[2]), ACCESS_CACHE_NEGATIVE_TTL_SECONDS):
+            raise ValueError("Refusal not cached for ACCESS_CACHE_NEGATIVE_TTL_SECONDS")
+
+        print("✅ TTLs follow the grant")
+
+        # Local write: uncached until its transaction is final
+        cache.invalidate(patient, doctors[0], "0xabc")
+        cache.put(patient, doctors[0], True, 0)
+
+        if cache.get(patient, doctors[0]) is not None:
+            raise ValueError("Pair cached while its write is pending")
+
+        cache.on_tx_status("0xabc", {"status": "mined", "replaced_by": None})
+        cache.put(patient, doctors[0], True, 0)
+
+        if cache.get(patient, doctors[0]) is not True:
+            raise ValueError("Pair not cached after its write was mined")
+
+        print("✅ Pending writes bypass the cache")
+
+    except Exception as e:
+        print("❌ Access cache test failed:")
+        print(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import os
 
+from cryptography.fernet import Fernet
+
 from services.crypto import generate_key, encrypt_file, decrypt_file
 
 
@@ -40,6 +42,18 @@ def main():
 
         print("✅ Encryption and Decryption successful")
 
+        # Legacy Fernet files must still decrypt
+        with open(ENC_FILE, "wb") as f:
+            f.write(Fernet(key).encrypt(original))
+
+        decrypt_file(ENC_FILE, DEC_FILE, key)
+
+        with open(DEC_FILE, "rb") as f:
+            if f.read() != original:
+                raise ValueError("Legacy Fernet file does not match original")
+
+        print("✅ Legacy Fernet decryption successful")
+
     except Exception as e:
         print("❌ Crypto test failed:")
         print(str(e))
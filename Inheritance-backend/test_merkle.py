@@ -0,0 +1,52 @@
+from eth_account import Account
+
+from services.merkle_anchor import build_tree, leaf_hash, verify_proof
+
+
+def main():
+
+    try:
+        print("=== Merkle Proof Test ===\n")
+
+        patient = Account.create().address
+
+        # Odd sizes exercise the node carried up unchanged
+        for size in (1, 2, 3, 5, 8, 13):
+
+            leaves = [leaf_hash(patient, f"cid-{i}", "lab") for i in range(size)]
+            root, proofs = build_tree(leaves)
+
+            for leaf, proof in zip(leaves, proofs):
+                if not verify_proof(leaf, proof, root):
+                    raise ValueError(f"Valid proof rejected ({size} leaves)")
+
+            if size > 1:
+                other = leaf_hash(patient, "cid-unknown", "lab")
+
+                if verify_proof(other, proofs[0], root):
+                    raise ValueError(f"Proof accepted for a foreign leaf ({size} leaves)")
+
+                if verify_proof(leaves[0], proofs[0][1:], root):
+                    raise ValueError(f"Shortened proof accepted ({size} leaves)")
+
+        print("✅ Proofs verify against their root")
+
+        # A leaf binds patient, CID and record type
+        base = leaf_hash(patient, "cid", "lab")
+
+        if base in (
+            leaf_hash(Account.create().address, "cid", "lab"),
+            leaf_hash(patient, "cid2", "lab"),
+            leaf_hash(patient, "cid", "scan")
+        ):
+            raise ValueError("Leaf hash ignores one of its fields")
+
+        print("✅ Leaves bind patient, CID and type")
+
+    except Exception as e:
+        print("❌ Merkle test failed:")
+        print(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from services import metrics
+
+
+def main():
+
+    try:
+        print("=== Metrics Test ===\n")
+
+        requests = metrics.Counter("test_requests_total", "Test requests", ("path",))
+        requests.inc(path="/a")
+        requests.inc(2, path='/b"\n')
+
+        latency = metrics.Histogram("test_latency_seconds", "Test latency", buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value)
+
+        metrics.cache_lookup("test", True)
+        metrics.cache_lookup("test", True)
+        metrics.cache_lookup("test", False)
+
+        lines = metrics.render().splitlines()
+
+        expected = [
+            "# TYPE test_requests_total counter",
+            'test_requests_total{path="/a"} 1',
+            'test_requests_total{path="/b\\"\\n"} 2',
+            "# TYPE test_latency_seconds histogram",
+            'test_latency_seconds_bucket{le="0.1"} 1',
+            'test_latency_seconds_bucket{le="1.0"} 2',
+            'test_latency_seconds_bucket{le="+Inf"} 3',
+            "test_latency_seconds_sum 5.55",
+            "test_latency_seconds_count 3",
+            'medblocks_cache_hit_ratio{cache="test"} 0.6666666666666666'
+        ]
+
+        missing = [line for line in expected if line not in lines]
+
+        if missing:
+            raise ValueError("Missing lines: " + "; ".join(missing))
+
+        print("✅ Counters, histograms and hit ratios rendered")
+
+    except Exception as e:
+        print("❌ Metrics test failed:")
+        print(str(e))
+
+
+if __name__ == "__main__":
+    main()
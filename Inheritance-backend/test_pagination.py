@@ -0,0 +1,119 @@
+from services.blockchain import (
+    BACKEND_WALLET,
+    _assemble_page,
+    _format_record,
+    _format_records,
+    _merge_records,
+    _page_window,
+    _parse_cursor
+)
+
+
+# On-chain rows and batched (leaf id, record) pairs, with timestamp ties
+CHAIN = [(f"chain-{i}", "lab", ts, BACKEND_WALLET) for i, ts in enumerate([10, 20, 20, 35, 50])]
+BATCHED = [(i + 1, _format_record(f"leaf-{i}", "scan", ts, BACKEND_WALLET)) for i, ts in enumerate([5, 20, 30, 60])]
+
+
+def _page(chain, batched, cursor, limit, newest_first):
+    """
+    get_records_page over in-memory sources
+    """
+
+    cursor = _parse_cursor(cursor)
+    indices, after_id, before_id = _page_window(len(chain), cursor, limit, newest_first)
+
+    leaves = [
+        entry for entry in batched
+        if entry[0] > after_id and (before_id is None or entry[0] < before_id)
+    ]
+
+    if newest_first:
+        leaves.reverse()
+
+    return _assemble_page(
+        {i: chain[i] for i in indices},
+        leaves[:limit + 1],
+        cursor,
+        limit,
+        newest_first,
+        len(chain),
+        len(chain) + len(batched)
+    )
+
+
+def _all(chain, batched):
+
+    return [r["cid"] for _, r in _merge_records(enumerate(_format_records(chain)), batched)]
+
+
+def _walk(chain, batched, limit, newest_first, grow=None):
+
+    cids = []
+    cursor = None
+
+    while True:
+        page = _page(chain, batched, cursor, limit, newest_first)
+        cids += [r["cid"] for r in page["records"]]
+        cursor = page["next_cursor"]
+
+        if grow:
+            grow()
+            grow = None
+
+        if cursor is None:
+            return cids
+
+
+def main():
+
+    try:
+        print("=== Record Pagination Test ===\n")
+
+        full = _all(CHAIN, BATCHED)
+
+        if full[:3] != ["leaf-0", "chain-0", "chain-1"]:
+            raise ValueError(f"Unexpected merge order: {full}")
+
+        for limit in range(1, len(full) + 2):
+            if _walk(CHAIN, BATCHED, limit, False) != full:
+                raise ValueError(f"Oldest-first pages differ (limit {limit})")
+
+            if _walk(CHAIN, BATCHED, limit, True) != full[::-1]:
+                raise ValueError(f"Newest-first pages differ (limit {limit})")
+
+        print("✅ Pages add up to the full list in both orders")
+
+        # Records added between two pages do not shift the cursor
+        chain, batched = list(CHAIN), list(BATCHED)
+
+        def grow():
+            chain.append(("chain-new", "lab", 70, BACKEND_WALLET))
+            batched.append((len(batched) + 1, _format_record("leaf-new", "scan", 80, BACKEND_WALLET)))
+
+        if _walk(chain, batched, 3, True, grow) != full[::-1]:
+            raise ValueError("Newest-first walk shifted by new records")
+
+        chain, batched = list(CHAIN), list(BATCHED)
+
+        if _walk(chain, batched, 3, False, grow) != _all(chain, batched):
+            raise ValueError("Oldest-first walk missed new records")
+
+        print("✅ Cursors stable while records are added")
+
+        for bad in ("abc", "3", "1.-2", "1.2.3"):
+            try:
+                _parse_cursor(bad)
+            except ValueError:
+                continue
+
+            raise ValueError(f"Cursor {bad!r} accepted")
+
+        print("✅ Invalid cursors rejected")
+
+    except Exception as e:
+        print("❌ Pagination test failed:")
+        print(str(e))
+
+
+if __name__ == "__main__":
+    main()